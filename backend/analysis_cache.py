@@ -0,0 +1,153 @@
+"""
+Content-addressed memoization for ``analyze_products``.
+
+Results are keyed by a hash of the normalized product list, the source URL
+and the scoring fingerprint, held in an in-process LRU and, when
+``ANALYSIS_CACHE_MONGO`` is set, shared with other processes via MongoDB.
+"""
+import copy
+import hashlib
+import json
+import math
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from backend import config
+from backend.products import Product, ProductBatch
+
+# The only product fields analyze_products reads (url matches products to
+# their review features); anything else (e.g. source_url or Mongo ids)
+# must not change the key.
+KEY_FIELDS = ("title", "price", "rating", "reviews", "availability", "url")
+
+# Columns of a product list hashed for its key: text columns, then numbers
+_Columns = Tuple[
+    List[Optional[str]], List[Optional[str]], List[Optional[str]], List[Optional[str]],
+    array, array, array,
+]
+
+
+def _columns(products: Sequence[Any]) -> Optional[_Columns]:
+    """
+    The key columns of a :class:`ProductBatch` (as stored) or of a list of
+    :class:`Product` records; None for other rows (e.g. plain dicts).
+    """
+    if isinstance(products, ProductBatch):
+        return (
+            products.titles, products.price_texts, products.availability, products.urls,
+            products.prices, products.ratings, products.reviews,
+        )
+    if not all(type(p) is Product for p in products):
+        return None
+    return (
+        [p.title for p in products],
+        [p.price_text for p in products],
+        [p.availability for p in products],
+        [p.url for p in products],
+        array("d", [p.price for p in products]),
+        array("d", [math.nan if p.rating is None else p.rating for p in products]),
+        array("q", [-1 if p.reviews is None else p.reviews for p in products]),
+    )
+
+
+def make_key(products: Sequence[Any], source_url: str, scoring: str) -> str:
+    """
+    Stable hash of the analysis inputs (product order matters for ties).
+
+    Product records and batches are hashed column by column (each text
+    column as one joined string plus its lengths, numbers as raw array
+    bytes), which keeps the key a small fraction of the analysis it saves;
+    a list and a batch of the same products share a key.
+    """
+    digest = hashlib.sha256(json.dumps([scoring, str(source_url)]).encode("utf-8"))
+    columns = _columns(products)
+    if columns is None:
+        rows = [[p.get(field) for field in KEY_FIELDS] for p in products]
+        digest.update(b"rows")
+        digest.update(json.dumps(rows, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    digest.update(b"columns")
+    for column in columns:
+        if not isinstance(column, array):
+            # The lengths (-1 for None) delimit the values unambiguously
+            lengths = array("q", [-1 if v is None else len(v) for v in column])
+            digest.update(lengths.tobytes())
+            column = "".join(filter(None, column)).encode("utf-8", "surrogatepass")
+        digest.update(len(column).to_bytes(8, "little"))
+        digest.update(column)
+    return digest.hexdigest()
+
+
+class _LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_memory = _LRU(config.ANALYSIS_CACHE_SIZE)
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Cached analysis for ``key`` (a private copy), or None."""
+    result = _memory.get(key)
+    if result is None and config.ANALYSIS_CACHE_MONGO:
+        try:
+            from backend.database.mongo_db import load_analysis
+
+            result = load_analysis(key)
+        except Exception:
+            # MongoDB is optional – fall back to recomputing
+            result = None
+        if result is not None:
+            _memory.put(key, result)
+    # Callers may mutate what they get back; keep the cached copy intact
+    return copy.deepcopy(result) if result is not None else None
+
+
+def put(key: str, result: Dict[str, Any]) -> None:
+    stored = copy.deepcopy(result)
+    _memory.put(key, stored)
+    if config.ANALYSIS_CACHE_MONGO:
+        try:
+            from backend.database.mongo_db import save_analysis
+
+            save_analysis(key, stored)
+        except Exception:
+            pass
+
+
+def clear() -> None:
+    _memory.clear()
+
+
+def stats() -> Dict[str, int]:
+    return {"hits": _memory.hits, "misses": _memory.misses, "size": len(_memory._data)}
@@ -0,0 +1,277 @@
+"""
+Comparative analysis across many stores.
+
+:func:`compare_stores` profiles every store in parallel: product count,
+average rating and price, price and review distribution, and its best
+products. Large workloads are spread over a process pool. It then derives
+the scoring thresholds from the competitor set instead of the fixed
+values in ``SCORING_CONFIG``:
+
+- ``high_avg_price``: the ``COMPARE_HIGH_PERCENTILE`` of store average prices
+- ``strong_avg_rating``: the same percentile of store average ratings
+- ``high_ticket_price``: the same percentile of the stores' 90th-percentile prices
+- ``bestseller_reviews`` / ``traction_reviews``: the median of the stores'
+  90th / 50th percentile review counts
+
+Each store's insights are then built with these relative thresholds (see
+``recommender.build_insights``), next to its percentile rank within the set
+for every metric. Rating thresholds stay absolute, since ratings already
+share a 0-5 scale.
+"""
+import bisect
+import heapq
+import multiprocessing
+import os
+import statistics
+import threading
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend import config
+from backend.recommender import SCORING_CONFIG, _enrich, build_insights
+
+logger = logging.getLogger(__name__)
+
+# Store metrics compared across the set
+METRICS = ("product_count", "avg_price", "avg_rating", "price_p90", "reviews_p50", "reviews_p90")
+
+# Percentiles reported for each metric
+REPORTED = (10, 25, 50, 75, 90)
+
+# SCORING_CONFIG thresholds replaced by values relative to the set
+RELATIVE_KEYS = (
+    "high_avg_price", "strong_avg_rating", "high_ticket_price",
+    "bestseller_reviews", "traction_reviews",
+)
+
+Store = Tuple[str, List[Dict[str, Any]]]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated ``q``-th percentile (0-100) of sorted values."""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def percentile_rank(sorted_values: List[float], value: float) -> float:
+    """Share (0-100) of the values at or below ``value``."""
+    if not sorted_values:
+        return 0.0
+    return round(100 * bisect.bisect_right(sorted_values, value) / len(sorted_values), 1)
+
+
+def profile_store(source_url: str, products: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregate features of one store. ``avg_*`` and ``top`` are computed as
+    in ``analyze_products``, so absolute thresholds give identical insights.
+    """
+    cfg = SCORING_CONFIG
+    ratings: List[float] = []
+    prices: List[float] = []
+    review_counts: List[int] = []
+    scored = []
+    for p in products:
+        rating, reviews, price = _enrich(p)
+        if rating > 0:
+            ratings.append(rating)
+        if price > 0:
+            prices.append(price)
+        review_counts.append(reviews)
+        scored.append((rating * (1 + reviews / cfg["review_weight"]), rating, reviews, p))
+
+    top = heapq.nlargest(cfg["top_products"], scored, key=lambda x: x[0])
+    prices.sort()
+    review_counts.sort()
+    return {
+        "source_url": source_url,
+        "product_count": len(products),
+        "avg_rating": round(statistics.mean(ratings), 2) if ratings else 0.0,
+        "avg_price": round(statistics.mean(prices), 2) if prices else 0.0,
+        "max_price": prices[-1] if prices else 0.0,
+        "price_p90": round(percentile(prices, 90), 2),
+        "reviews_p50": percentile(review_counts, 50),
+        "reviews_p90": percentile(review_counts, 90),
+        "top": [(rating, reviews, p) for _, rating, reviews, p in top],
+    }
+
+
+def _profile_chunk(stores: List[Store]) -> List[Dict[str, Any]]:
+    # Runs in pool workers: one task per chunk keeps IPC round trips low
+    return [profile_store(url, products) for url, products in stores]
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Executor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Not fork: the API process runs threads (event loops, writers)
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            _pool = ProcessPoolExecutor(
+                max_workers=config.COMPARE_WORKERS or os.cpu_count() or 1,
+                mp_context=context,
+            )
+        return _pool
+
+
+def shutdown() -> None:
+    """Stop the worker processes (they are started on first use)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _chunks_by_size(
+    stores: List[Tuple[int, Store]], parts: int
+) -> List[List[Tuple[int, Store]]]:
+    """Split indexed stores into about ``parts`` chunks of similar product totals."""
+    chunks: List[List[Tuple[int, Store]]] = [[] for _ in range(parts)]
+    loads = [(0, i) for i in range(parts)]
+    # Largest first onto the least loaded chunk
+    for store in sorted(stores, key=lambda s: len(s[1][1]), reverse=True):
+        load, i = heapq.heappop(loads)
+        chunks[i].append(store)
+        heapq.heappush(loads, (load + len(store[1][1]), i))
+    return [c for c in chunks if c]
+
+
+def profile_stores(stores: List[Store]) -> List[Dict[str, Any]]:
+    """:func:`profile_store` for every store, in input order."""
+    total = sum(len(products) for _, products in stores)
+    if total < config.COMPARE_POOL_MIN_PRODUCTS or len(stores) < 2:
+        # Shipping the products to other processes would cost more
+        return _profile_chunk(stores)
+
+    pool = _get_pool()
+    parts = min(len(stores), 4 * (config.COMPARE_WORKERS or os.cpu_count() or 1))
+    chunks = _chunks_by_size(list(enumerate(stores)), parts)
+    futures = [
+        (chunk, pool.submit(_profile_chunk, [store for _, store in chunk]))
+        for chunk in chunks
+    ]
+    by_index: Dict[int, Dict[str, Any]] = {}
+    try:
+        for chunk, future in futures:
+            for (index, _), profile in zip(chunk, future.result()):
+                by_index[index] = profile
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        logger.warning("Comparison worker pool broke; profiling in-process")
+        shutdown()
+        return _profile_chunk(stores)
+    return [by_index[i] for i in range(len(stores))]
+
+
+def relative_config(profiles: List[Dict[str, Any]], high: float) -> Dict[str, Any]:
+    """``SCORING_CONFIG`` with its price and review thresholds set from the set."""
+    def values(metric: str) -> List[float]:
+        return sorted(p[metric] for p in profiles if p["product_count"])
+
+    cfg = dict(SCORING_CONFIG)
+    if not any(p["product_count"] for p in profiles):
+        return cfg
+    cfg["high_avg_price"] = round(percentile(values("avg_price"), high), 2)
+    cfg["strong_avg_rating"] = round(percentile(values("avg_rating"), high), 2)
+    cfg["high_ticket_price"] = round(percentile(values("price_p90"), high), 2)
+    cfg["bestseller_reviews"] = percentile(values("reviews_p90"), 50)
+    cfg["traction_reviews"] = percentile(values("reviews_p50"), 50)
+    return cfg
+
+
+def load_stores(
+    result_ids: List[str] = (), source_urls: List[str] = ()
+) -> Tuple[List[Store], List[str]]:
+    """
+    Products of stored results (``backend.results``) and of stores' current
+    catalogs in MongoDB. Also returns the ids / URLs that were not found.
+    """
+    from backend import results
+
+    stores: List[Store] = []
+    missing: List[str] = []
+    for result_id in result_ids:
+        meta = results.get(result_id)
+        products = results.products(result_id) if meta else None
+        if products is None:
+            missing.append(result_id)
+        else:
+            stores.append((meta["source_url"], products))
+    for url in source_urls:
+        try:
+            from backend.database.mongo_db import load_store_products
+
+            products = load_store_products(url)
+        except Exception:
+            products = []
+        if products:
+            stores.append((url, products))
+        else:
+            missing.append(url)
+    return stores, missing
+
+
+def compare_stores(
+    stores: List[Store], high_percentile: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Analyze ``stores`` (``(source_url, products)`` pairs) against each other.
+
+    Returns the distribution of each metric across stores, the relative
+    thresholds used, and per store its metrics, percentile ranks and
+    insights.
+    """
+    high = config.COMPARE_HIGH_PERCENTILE if high_percentile is None else high_percentile
+    profiles = profile_stores(stores)
+    cfg = relative_config(profiles, high)
+
+    scraped = [p for p in profiles if p["product_count"]]
+    distributions = {m: sorted(p[m] for p in scraped) for m in METRICS}
+
+    results = []
+    for profile in profiles:
+        if not profile["product_count"]:
+            results.append({"source_url": profile["source_url"], "error": "no products"})
+            continue
+        insights = build_insights(
+            profile["source_url"],
+            profile["product_count"],
+            profile["avg_rating"],
+            profile["avg_price"],
+            profile["max_price"] >= cfg["high_ticket_price"],
+            profile["top"],
+            cfg,
+        )
+        results.append({
+            "source_url": profile["source_url"],
+            "metrics": {m: profile[m] for m in METRICS},
+            "percentile_ranks": {
+                m: percentile_rank(distributions[m], profile[m]) for m in METRICS
+            },
+            "insights": insights,
+        })
+
+    return {
+        "store_count": len(scraped),
+        "thresholds": {k: cfg[k] for k in RELATIVE_KEYS},
+        "percentiles": {
+            m: {f"p{q}": round(percentile(values, q), 2) for q in REPORTED}
+            for m, values in distributions.items()
+        },
+        "stores": results,
+    }
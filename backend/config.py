@@ -0,0 +1,211 @@
+"""
+Runtime settings for the backend.
+
+Every value can be overridden through an environment variable of the same
+name, so deployments can tune limits without code changes.
+"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# --- HTTP fetch engine ---------------------------------------------------
+FETCH_TIMEOUT = _env_float("FETCH_TIMEOUT", 15.0)
+# Total sockets across all hosts, and how many requests may hit one host at once
+FETCH_MAX_CONNECTIONS = _env_int("FETCH_MAX_CONNECTIONS", 200)
+FETCH_MAX_PER_HOST = _env_int("FETCH_MAX_PER_HOST", 6)
+FETCH_KEEPALIVE_EXPIRY = _env_float("FETCH_KEEPALIVE_EXPIRY", 30.0)
+FETCH_HTTP2 = _env_bool("FETCH_HTTP2", True)
+
+# --- Batch scraping ------------------------------------------------------
+SCRAPE_BATCH_CONCURRENCY = _env_int("SCRAPE_BATCH_CONCURRENCY", 32)
+SCRAPE_BATCH_MAX_URLS = _env_int("SCRAPE_BATCH_MAX_URLS", 5000)
+
+# --- Background scrape jobs ----------------------------------------------
+# Jobs running at once; further submissions wait in the queue
+JOBS_WORKERS = _env_int("JOBS_WORKERS", 4)
+# Jobs queued or running at once; further submissions are refused (429)
+JOBS_MAX_PENDING = _env_int("JOBS_MAX_PENDING", 200)
+# Finished jobs kept for polling before the oldest are dropped
+JOBS_MAX_RETAINED = _env_int("JOBS_MAX_RETAINED", 1000)
+# A finished job is reused for an identical submission within this window
+JOBS_DEDUPE_SECONDS = _env_float("JOBS_DEDUPE_SECONDS", 300.0)
+
+# --- Category pagination crawl -------------------------------------------
+CRAWL_MAX_PAGES = _env_int("CRAWL_MAX_PAGES", 50)
+CRAWL_MAX_PRODUCTS = _env_int("CRAWL_MAX_PRODUCTS", 5000)
+# Pages of one category fetched at the same time
+CRAWL_CONCURRENCY = _env_int("CRAWL_CONCURRENCY", 8)
+
+# --- Headless browser pool (Selenium fallback) ----------------------------
+BROWSER_POOL_SIZE = _env_int("BROWSER_POOL_SIZE", 4)
+# Browsers started at application startup (0 = start on first use)
+BROWSER_POOL_PREWARM = _env_int("BROWSER_POOL_PREWARM", 0)
+# Recycle a browser after this many pages or once its processes exceed the RSS limit
+BROWSER_MAX_PAGES = _env_int("BROWSER_MAX_PAGES", 50)
+BROWSER_MAX_RSS_MB = _env_int("BROWSER_MAX_RSS_MB", 1024)
+# Seconds to wait for a free browser before giving up
+BROWSER_CHECKOUT_TIMEOUT = _env_float("BROWSER_CHECKOUT_TIMEOUT", 30.0)
+
+# --- On-disk HTTP cache ----------------------------------------------------
+HTTP_CACHE_ENABLED = _env_bool("HTTP_CACHE_ENABLED", True)
+HTTP_CACHE_DIR = os.getenv(
+    "HTTP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "marketing-ai")
+)
+# Compressed bytes kept on disk before least-recently-used entries are evicted
+HTTP_CACHE_MAX_BYTES = _env_int("HTTP_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+# Seconds a cached page is served without revalidation
+HTTP_CACHE_TTL = _env_int("HTTP_CACHE_TTL", 3600)
+# Per-domain overrides, e.g. "shop.example.com=600,books.toscrape.com=86400"
+HTTP_CACHE_DOMAIN_TTLS = os.getenv("HTTP_CACHE_DOMAIN_TTLS", "")
+
+# --- MongoDB persistence ----------------------------------------------------
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB = os.getenv("MONGO_DB", "marketing_ai")
+MONGO_MAX_POOL_SIZE = _env_int("MONGO_MAX_POOL_SIZE", 50)
+# Fail fast when MongoDB is down instead of pymongo's 30 s default
+MONGO_SERVER_TIMEOUT_MS = _env_int("MONGO_SERVER_TIMEOUT_MS", 3000)
+# Upserts per bulk_write round trip
+MONGO_BULK_SIZE = _env_int("MONGO_BULK_SIZE", 1000)
+# Buffer product writes in the background instead of inside the request,
+# flushing every MONGO_BULK_SIZE upserts or MONGO_FLUSH_INTERVAL seconds
+MONGO_WRITE_BEHIND = _env_bool("MONGO_WRITE_BEHIND", True)
+MONGO_FLUSH_INTERVAL = _env_float("MONGO_FLUSH_INTERVAL", 2.0)
+# Products held in memory at most; beyond that, and whenever MongoDB is
+# unreachable, they are spilled to a local NDJSON file and replayed later
+MONGO_BUFFER_MAX = _env_int("MONGO_BUFFER_MAX", 50000)
+MONGO_SPILL_PATH = os.getenv(
+    "MONGO_SPILL_PATH", os.path.join(HTTP_CACHE_DIR, "mongo-spill.ndjson")
+)
+# After a failed write, retries back off from MONGO_FLUSH_INTERVAL up to this
+MONGO_RETRY_MAX_SECONDS = _env_float("MONGO_RETRY_MAX_SECONDS", 60.0)
+# Stores whose last product snapshot is kept in memory for diffing
+SNAPSHOT_CACHE_SIZE = _env_int("SNAPSHOT_CACHE_SIZE", 1024)
+
+# --- analyze_products result cache ------------------------------------------
+ANALYSIS_CACHE_SIZE = _env_int("ANALYSIS_CACHE_SIZE", 256)
+# Larger product lists are analyzed without the cache: hashing them costs
+# too large a share of the analysis a hit would save
+ANALYSIS_CACHE_MAX_PRODUCTS = _env_int("ANALYSIS_CACHE_MAX_PRODUCTS", 100000)
+# Also share cached analyses between API processes through MongoDB
+ANALYSIS_CACHE_MONGO = _env_bool("ANALYSIS_CACHE_MONGO", False)
+# Product count from which analyze_products switches to the NumPy/pandas path
+COLUMNAR_MIN_PRODUCTS = _env_int("COLUMNAR_MIN_PRODUCTS", 20000)
+# Parsed (rating, reviews, price) rows memoized across analyses
+ENRICHED_ROW_CACHE_SIZE = _env_int("ENRICHED_ROW_CACHE_SIZE", 65536)
+
+# --- HTML parsing ---------------------------------------------------------
+# "auto" (fastest installed), "selectolax", "lxml" or "html.parser"
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "auto")
+
+# --- Per-domain extraction profiles -----------------------------------------
+EXTRACTION_PROFILES_ENABLED = _env_bool("EXTRACTION_PROFILES_ENABLED", True)
+EXTRACTION_PROFILES_PATH = os.getenv(
+    "EXTRACTION_PROFILES_PATH", os.path.join(HTTP_CACHE_DIR, "profiles.json")
+)
+# Re-run full selector probing after this many profile-driven scrapes so
+# newly appearing fields (e.g. ratings) are picked up
+EXTRACTION_PROFILE_REPROBE_EVERY = _env_int("EXTRACTION_PROFILE_REPROBE_EVERY", 50)
+
+# --- Metrics ----------------------------------------------------------------
+# Stage timers and counters exposed on GET /metrics (Prometheus text format)
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+# Add a Server-Timing header with per-stage durations to API responses
+SERVER_TIMING_ENABLED = _env_bool("SERVER_TIMING_ENABLED", True)
+
+# --- On-demand request profiling --------------------------------------------
+# Allow ?profile=1 / X-Profile on /scrape (off by default: profiles expose code paths)
+PROFILING_ENABLED = _env_bool("PROFILING_ENABLED", False)
+# If set, the profile flag must carry this value instead of "1"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_DIR = os.getenv("PROFILING_DIR", os.path.join(HTTP_CACHE_DIR, "profiles"))
+# Seconds between stack samples
+PROFILING_INTERVAL = _env_float("PROFILING_INTERVAL", 0.005)
+PROFILING_MAX_KEPT = _env_int("PROFILING_MAX_KEPT", 20)
+
+# --- Streamed scrape responses (POST /scrape/stream) -----------------------
+# Products per NDJSON record
+STREAM_CHUNK_SIZE = _env_int("STREAM_CHUNK_SIZE", 500)
+
+# --- Stored scrape results (GET /results/...) -------------------------------
+# Products of recent results kept in memory across all results
+RESULTS_MEMORY_PRODUCTS = _env_int("RESULTS_MEMORY_PRODUCTS", 200000)
+# Also store results in MongoDB (written in the background), expiring after
+# the TTL. Off by default: it writes every product of every scrape again
+RESULTS_MONGO = _env_bool("RESULTS_MONGO", False)
+RESULTS_TTL_SECONDS = _env_int("RESULTS_TTL_SECONDS", 7 * 24 * 3600)
+# Results waiting for their MongoDB write; beyond that they stay memory-only
+RESULTS_MONGO_QUEUE = _env_int("RESULTS_MONGO_QUEUE", 16)
+# Largest page of products one request may ask for
+RESULTS_PAGE_MAX = _env_int("RESULTS_PAGE_MAX", 1000)
+
+# --- Multi-store comparison (POST /compare) --------------------------------
+# Worker processes profiling stores (0 = one per CPU)
+COMPARE_WORKERS = _env_int("COMPARE_WORKERS", 0)
+# Below this many products in total, stores are profiled in-process
+COMPARE_POOL_MIN_PRODUCTS = _env_int("COMPARE_POOL_MIN_PRODUCTS", 200000)
+# Percentile of the competitor set that counts as "high" price / "strong" rating
+COMPARE_HIGH_PERCENTILE = _env_float("COMPARE_HIGH_PERCENTILE", 75.0)
+COMPARE_MAX_STORES = _env_int("COMPARE_MAX_STORES", 1000)
+
+# --- HTML parse execution -----------------------------------------------------
+# "thread": parse in the API process (worker threads); "process": send pages
+# to a pool of worker processes so parsing does not hold the API's GIL
+PARSE_MODE = os.getenv("PARSE_MODE", "thread")
+PARSE_WORKERS = _env_int("PARSE_WORKERS", 0)  # 0 = one per CPU
+# Worker processes are replaced after this many pages (0 = never)
+PARSE_MAX_TASKS_PER_CHILD = _env_int("PARSE_MAX_TASKS_PER_CHILD", 500)
+# Seconds one page may take; a stuck worker is killed and the pool restarted
+PARSE_TIMEOUT = _env_float("PARSE_TIMEOUT", 30.0)
+# Smaller pages are parsed in-process: shipping them costs more than it saves
+PARSE_PROCESS_MIN_BYTES = _env_int("PARSE_PROCESS_MIN_BYTES", 32768)
+
+# --- Price parsing ------------------------------------------------------------
+# Distinct (price text, locale) pairs whose parse result is memoized
+PRICE_CACHE_SIZE = _env_int("PRICE_CACHE_SIZE", 65536)
+
+# --- Review crawl (POST /reviews/crawl) --------------------------------------
+# Review pages fetched at the same time across all products; pages of one
+# host are still capped by FETCH_MAX_PER_HOST
+REVIEW_CONCURRENCY = _env_int("REVIEW_CONCURRENCY", 32)
+# Review pages followed per product
+REVIEW_MAX_PAGES = _env_int("REVIEW_MAX_PAGES", 20)
+# A review page that takes longer to download and parse is given up on
+REVIEW_PAGE_TIMEOUT = _env_float("REVIEW_PAGE_TIMEOUT", 20.0)
+REVIEW_MAX_URLS = _env_int("REVIEW_MAX_URLS", 5000)
+
+# --- Review features (python -m backend.review_features) ----------------------
+# Scale engagement scores by the precomputed review sentiment of products
+REVIEW_FEATURES_SCORING = _env_bool("REVIEW_FEATURES_SCORING", False)
+# A review counts half as much as one this many days newer
+REVIEW_FEATURES_HALF_LIFE_DAYS = _env_float("REVIEW_FEATURES_HALF_LIFE_DAYS", 180.0)
+# Keyword hash buckets: 2 ** bits (fixed once features are stored)
+REVIEW_FEATURES_HASH_BITS = _env_int("REVIEW_FEATURES_HASH_BITS", 18)
+# Keyword candidates kept per product
+REVIEW_FEATURES_MAX_TERMS = _env_int("REVIEW_FEATURES_MAX_TERMS", 64)
+# Reviews read, scored and written back per chunk
+REVIEW_FEATURES_BATCH = _env_int("REVIEW_FEATURES_BATCH", 20000)
+# Reviews stored less than this long ago wait for the next update run
+REVIEW_FEATURES_LAG_SECONDS = _env_float("REVIEW_FEATURES_LAG_SECONDS", 5.0)
+# Products whose summaries the API keeps in memory, and for how long
+REVIEW_FEATURES_CACHE_SIZE = _env_int("REVIEW_FEATURES_CACHE_SIZE", 100000)
+REVIEW_FEATURES_REFRESH_SECONDS = _env_float("REVIEW_FEATURES_REFRESH_SECONDS", 300.0)
@@ -1,18 +1,851 @@
-from pymongo import MongoClient
+"""
+MongoDB persistence.
 
-client = MongoClient("mongodb://localhost:27017/")
-db = client["marketing_ai"]
+Products are upserted keyed on ``(source_url, product_key)`` so re-scraping
+a store updates its documents instead of duplicating them; writes go out as
+unordered ``bulk_write`` batches. :func:`save_scrape` diffs a scrape against
+the store's last snapshot (see ``backend.database.snapshots``; read from the
+fingerprints on its product documents) and writes only what changed,
+recording price/rating changes in the ``price_history`` time-series
+collection. With ``MONGO_WRITE_BEHIND`` the pipeline hands
+scrapes (and crawled reviews) to a :class:`BulkWriter` that does this in
+the background, so requests never wait on the database.
+
+Nothing connects (or even imports pymongo) until the first database call;
+``client``, ``db`` and the ``*_collection`` names are resolved on first
+access.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend import config, metrics
+from backend.database import snapshots
+
+logger = logging.getLogger(__name__)
+
+# Fields that identify a product within a store, most specific first
+IDENTITY_FIELDS = ("sku", "product_id", "id", "url", "link")
+
+_MISSING = (None, "", "N/A", "Unknown title")
+
+_COLLECTIONS = {
+    "product_collection": "products",
+    "review_collection": "reviews",
+    "analysis_collection": "analysis_cache",
+    "price_history_collection": "price_history",
+    "result_collection": "results",
+    "result_product_collection": "result_products",
+    "review_feature_collection": "review_features",
+}
+
+_client: Any = None
+_db: Any = None
+_client_lock = threading.Lock()
+_indexes_ready = False
+
+
+def get_db() -> Any:
+    """The application database, connecting on first use."""
+    global _client, _db
+    with _client_lock:
+        if _db is None:
+            from pymongo import MongoClient
+
+            _client = MongoClient(
+                config.MONGO_URI,
+                maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+                serverSelectionTimeoutMS=config.MONGO_SERVER_TIMEOUT_MS,
+            )
+            _db = _client[config.MONGO_DB]
+        return _db
+
+
+def __getattr__(name: str) -> Any:
+    # Lazy module attributes: client, db, product_collection, ...
+    if name == "client":
+        get_db()
+        return _client
+    if name == "db":
+        return get_db()
+    if name in _COLLECTIONS:
+        return get_db()[_COLLECTIONS[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _collection(name: str) -> Any:
+    _ensure_indexes_once()
+    return get_db()[name]
+
+
+def product_key(product: Dict[str, Any]) -> str:
+    """Stable identity of a product within its store."""
+    for field in IDENTITY_FIELDS:
+        value = product.get(field)
+        if value not in _MISSING:
+            return f"{field}:{value}"
+    title = product.get("title")
+    if title in _MISSING:
+        # Nothing better to go on; keep untitled products apart by price
+        return f"price:{product.get('price')}"
+    return "title:" + " ".join(str(title).lower().split())
+
+
+def _review_key(review: Any) -> str:
+    payload = json.dumps(review, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _product_docs(data: Iterable[Dict[str, Any]]) -> Dict[Tuple[Any, str], Dict]:
+    """
+    Documents to upsert, one per distinct ``(source_url, product_key)``; a
+    later duplicate in ``data`` wins.
+    """
+    now = time.time()
+    docs: Dict[Tuple[Any, str], Dict] = {}
+    for product in data:
+        doc = {k: v for k, v in product.items() if k != "_id"}
+        doc["product_key"] = product_key(product)
+        doc["last_seen"] = now
+        docs[(doc.get("source_url"), doc["product_key"])] = doc
+    return docs
+
+
+def _product_upserts(docs: Iterable[Dict[str, Any]]) -> List[Any]:
+    from pymongo import UpdateOne
+
+    ops = []
+    for doc in docs:
+        doc = {k: v for k, v in doc.items() if k != "_kind"}
+        ops.append(UpdateOne(
+            {"source_url": doc.get("source_url"), "product_key": doc["product_key"]},
+            {
+                "$set": doc,
+                "$setOnInsert": {"first_seen": doc["last_seen"]},
+                # Back in the catalog after having been removed
+                "$unset": {"removed_at": ""},
+            },
+            upsert=True,
+        ))
+    return ops
+
+
+def _record_ops(records: Iterable[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Group snapshot diff records into bulk operations per collection.
+    (Spill files of older versions may hold ``snapshot`` records; those are
+    no longer written and are skipped.)
+    """
+    from pymongo import InsertOne, UpdateOne
+
+    ops: Dict[str, List[Any]] = {}
+    for record in records:
+        kind = record["_kind"]
+        if kind == "product":
+            ops.setdefault("products", []).extend(_product_upserts([record]))
+        elif kind == "removed":
+            ops.setdefault("products", []).append(UpdateOne(
+                {"source_url": record["source_url"], "product_key": record["product_key"]},
+                {"$set": {"removed_at": record["removed_at"]}},
+            ))
+        elif kind == "price":
+            ops.setdefault("price_history", []).append(InsertOne({
+                "ts": datetime.fromtimestamp(record["ts"], timezone.utc),
+                "meta": record["meta"],
+                "price": record["price"],
+                "rating": record["rating"],
+            }))
+        elif kind == "reviews":
+            ops.setdefault("reviews", []).extend(
+                _review_upserts(record["product"], record["docs"], record["ts"])
+            )
+    return ops
+
+
+def _review_upserts(
+    product_name: str, reviews: Iterable[Any], now: Optional[float] = None
+) -> List[Any]:
+    from pymongo import UpdateOne
+
+    now = time.time() if now is None else now
+    ops: Dict[str, Any] = {}
+    for review in reviews:
+        key = _review_key(review)
+        ops[key] = UpdateOne(
+            {"product": product_name, "review_key": key},
+            {"$setOnInsert": {"review": review, "first_seen": now}},
+            upsert=True,
+        )
+    return list(ops.values())
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    size = max(1, size)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _bulk_write(collection, ops: List[Any]) -> None:
+    for chunk in _chunks(ops, config.MONGO_BULK_SIZE):
+        collection.bulk_write(chunk, ordered=False)
+
+
+def ensure_indexes() -> None:
+    """Create the indexes the upserts rely on (idempotent)."""
+    from pymongo import ASCENDING
+
+    db = get_db()
+    # Partial, so documents written before product_key existed don't
+    # collide on a null key
+    db["products"].create_index(
+        [("source_url", ASCENDING), ("product_key", ASCENDING)],
+        name="source_product",
+        unique=True,
+        partialFilterExpression={"product_key": {"$exists": True}},
+    )
+    db["reviews"].create_index(
+        [("product", ASCENDING), ("review_key", ASCENDING)],
+        name="product_review",
+        unique=True,
+        partialFilterExpression={"review_key": {"$exists": True}},
+    )
+    if not db.list_collection_names(filter={"name": "price_history"}):
+        try:
+            db.create_collection(
+                "price_history",
+                timeseries={"timeField": "ts", "metaField": "meta", "granularity": "hours"},
+            )
+        except Exception:
+            # Created concurrently, or MongoDB < 5.0 (plain collection then)
+            pass
+    db["price_history"].create_index(
+        [("meta.source_url", ASCENDING), ("meta.product_key", ASCENDING), ("ts", ASCENDING)],
+        name="series",
+    )
+    # Stored scrape results (backend.results): one keyset index per sort order
+    db["results"].create_index(
+        "created_at", name="expiry", expireAfterSeconds=config.RESULTS_TTL_SECONDS
+    )
+    db["result_products"].create_index(
+        "_created", name="expiry", expireAfterSeconds=config.RESULTS_TTL_SECONDS
+    )
+    for field in ("_pos", "_price", "_rating", "_reviews"):
+        keys = [("_rid", ASCENDING), (field, ASCENDING)]
+        if field != "_pos":
+            keys.append(("_pos", ASCENDING))
+        db["result_products"].create_index(keys, name=f"result{field}")
+
+
+def _ensure_indexes_once() -> None:
+    # Runs before the first write rather than at startup; retried on the
+    # next write if MongoDB was unreachable
+    global _indexes_ready
+    if not _indexes_ready:
+        ensure_indexes()
+        _indexes_ready = True
 
-product_collection = db["products"]
-review_collection = db["reviews"]
 
 def save_products(data):
     if data:
-        product_collection.insert_many(data)
+        ops = _product_upserts(_product_docs(data).values())
+        _bulk_write(_collection("products"), ops)
+        metrics.inc("mongo_write_records_total", len(ops), outcome="written")
+
 
 def save_reviews(product_name, reviews):
-    for review in reviews:
-        review_collection.insert_one({
-            "product": product_name,
-            "review": review
+    ops = _review_upserts(product_name, reviews)
+    if ops:
+        _bulk_write(_collection("reviews"), ops)
+        metrics.inc("mongo_write_records_total", len(ops), outcome="written")
+
+
+def load_analysis(key):
+    doc = get_db()["analysis_cache"].find_one({"_id": key}, {"result": 1})
+    return doc["result"] if doc else None
+
+
+def save_analysis(key, result):
+    get_db()["analysis_cache"].replace_one(
+        {"_id": key}, {"_id": key, "result": result}, upsert=True
+    )
+
+
+def load_price_history(
+    source_url: str, product_key: Optional[str] = None, since: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """Price/rating points of a store (or one product), oldest first."""
+    query: Dict[str, Any] = {"meta.source_url": source_url}
+    if product_key is not None:
+        query["meta.product_key"] = product_key
+    if since is not None:
+        query["ts"] = {"$gte": since}
+    return list(
+        get_db()["price_history"].find(query, {"_id": 0}).sort("ts", 1)
+    )
+
+
+# --- Stored scrape results ----------------------------------------------------
+
+# Per-row fields used for filtering, sorting and expiry; not returned
+_RESULT_ROW_FIELDS = ("_rid", "_price", "_rating", "_reviews", "_in_stock", "_created")
+
+
+def save_result(meta: Dict[str, Any], rows: List[Dict[str, Any]]) -> None:
+    """Store a result's rows, then its metadata (which makes it visible)."""
+    products = _collection("result_products")
+    for chunk in _chunks(rows, config.MONGO_BULK_SIZE):
+        # insert_many adds _id to the documents; keep the caller's rows clean
+        products.insert_many([dict(r) for r in chunk], ordered=False)
+    _collection("results").replace_one({"_id": meta["_id"]}, meta, upsert=True)
+
+
+def load_result(result_id: str) -> Optional[Dict[str, Any]]:
+    return get_db()["results"].find_one({"_id": result_id})
+
+
+def find_result_products(
+    result_id: str,
+    query: Dict[str, Any],
+    field: str,
+    descending: bool,
+    limit: int,
+    after: Optional[Tuple[Any, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rows of a result ordered by ``(field, _pos)``, starting after the
+    ``(value, pos)`` keyset ``after``; ``limit=0`` returns all of them.
+    """
+    from pymongo import ASCENDING, DESCENDING
+
+    query = {"_rid": result_id, **query}
+    after_op = "$lt" if descending else "$gt"
+    if after is not None:
+        value, pos = after
+        if field == "_pos":
+            query["_pos"] = {after_op: pos}
+        else:
+            query["$or"] = [
+                {field: {after_op: value}},
+                {field: value, "_pos": {after_op: pos}},
+            ]
+    direction = DESCENDING if descending else ASCENDING
+    sort = [(field, direction)] + ([("_pos", direction)] if field != "_pos" else [])
+    projection = {"_id": 0, **{f: 0 for f in _RESULT_ROW_FIELDS if f != field}}
+    return list(
+        get_db()["result_products"].find(query, projection).sort(sort).limit(limit)
+    )
+
+
+def load_store_products(source_url: str) -> List[Dict[str, Any]]:
+    """The current catalog of a store: its products not marked removed."""
+    return list(get_db()["products"].find(
+        {"source_url": source_url, "removed_at": {"$exists": False}}, {"_id": 0}
+    ))
+
+
+def count_result_products(result_id: str, query: Dict[str, Any]) -> int:
+    return get_db()["result_products"].count_documents({"_rid": result_id, **query})
+
+
+# --- Review features (backend.review_features) --------------------------------
+
+_FEATURE_STATE_ID = "_state"
+# Prefix of the documents holding the state's document frequency blocks
+_FEATURE_DF_PREFIX = "_state:df:"
+
+
+def load_reviews_after(after: Any, before: Any, limit: int) -> List[Dict[str, Any]]:
+    """Reviews with ``after < _id < before`` in ``_id`` order (``after`` None: from the start)."""
+    id_range: Dict[str, Any] = {"$lt": before}
+    if after is not None:
+        id_range["$gt"] = after
+    return list(
+        get_db()["reviews"]
+        .find({"_id": id_range}, {"product": 1, "review": 1, "first_seen": 1})
+        .sort("_id", 1)
+        .limit(limit)
+    )
+
+
+def load_review_feature_state() -> Tuple[Optional[Dict[str, Any]], Dict[int, bytes]]:
+    """The features' shared state, and its document frequency blocks by number."""
+    collection = get_db()["review_features"]
+    state = collection.find_one({"_id": _FEATURE_STATE_ID})
+    blocks = {
+        int(doc["_id"][len(_FEATURE_DF_PREFIX):]): doc["df"]
+        for doc in collection.find({"_id": {"$regex": f"^{re.escape(_FEATURE_DF_PREFIX)}"}})
+    }
+    return state, blocks
+
+
+def load_review_features(
+    products: Iterable[str], fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """Feature documents of ``products`` (only ``fields`` of them, if given)."""
+    projection = {f: 1 for f in fields} if fields else None
+    return list(get_db()["review_features"].find(
+        {"_id": {"$in": [p for p in products if not p.startswith(_FEATURE_STATE_ID)]}}, projection
+    ))
+
+
+def save_review_features(
+    docs: List[Dict[str, Any]], state: Dict[str, Any], df_blocks: Dict[int, bytes]
+) -> None:
+    """
+    Replace products' feature documents, then the changed document
+    frequency blocks, then the rest of the shared state.
+    """
+    from pymongo import ReplaceOne
+
+    collection = _collection("review_features")
+    _bulk_write(collection, [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs])
+    _bulk_write(collection, [
+        ReplaceOne(
+            {"_id": f"{_FEATURE_DF_PREFIX}{block}"},
+            {"_id": f"{_FEATURE_DF_PREFIX}{block}", "df": data},
+            upsert=True,
+        )
+        for block, data in df_blocks.items()
+    ])
+    collection.replace_one(
+        {"_id": _FEATURE_STATE_ID}, {**state, "_id": _FEATURE_STATE_ID}, upsert=True
+    )
+
+
+# --- Incremental scrapes ------------------------------------------------------
+
+# Last written snapshot per store, so most diffs need no database read.
+# Updated only once a diff's records are written, so it never runs ahead
+# of the database.
+_snapshots: "OrderedDict[str, snapshots.Snapshot]" = OrderedDict()
+_snapshots_lock = threading.Lock()
+
+
+def _cached_snapshot(source_url: str) -> Optional[snapshots.Snapshot]:
+    with _snapshots_lock:
+        snap = _snapshots.get(source_url)
+        if snap is not None:
+            _snapshots.move_to_end(source_url)
+        return snap
+
+
+def _remember_snapshot(source_url: str, snap: snapshots.Snapshot) -> None:
+    with _snapshots_lock:
+        _snapshots[source_url] = snap
+        _snapshots.move_to_end(source_url)
+        while len(_snapshots) > config.SNAPSHOT_CACHE_SIZE:
+            _snapshots.popitem(last=False)
+
+
+def _forget_snapshot(source_url: str) -> None:
+    with _snapshots_lock:
+        _snapshots.pop(source_url, None)
+
+
+def _scrape_docs(source_url: str, products: Iterable[Dict[str, Any]]) -> Dict:
+    return _product_docs({**p, "source_url": source_url} for p in products)
+
+
+# Product fields a snapshot is rebuilt from
+_SNAPSHOT_QUERY = {"removed_at": {"$exists": False}}
+_SNAPSHOT_PROJECTION = {"_id": 0, "product_key": 1, "fingerprint": 1, "price": 1, "rating": 1}
+
+
+def _snapshot_from_docs(docs: Iterable[Dict[str, Any]]) -> snapshots.Snapshot:
+    # Documents written before fingerprints were stored diff as changed once
+    return {
+        d["product_key"]: [d.get("fingerprint"), d.get("price"), d.get("rating")]
+        for d in docs
+        if "product_key" in d
+    }
+
+
+def _load_snapshot(source_url: str) -> snapshots.Snapshot:
+    snap = _cached_snapshot(source_url)
+    if snap is None:
+        snap = _snapshot_from_docs(get_db()["products"].find(
+            {"source_url": source_url, **_SNAPSHOT_QUERY}, _SNAPSHOT_PROJECTION
+        ))
+    return snap
+
+
+def _write_records(records: List[Dict[str, Any]]) -> None:
+    ops = _record_ops(records)
+    for name in ("products", "price_history", "reviews"):
+        if ops.get(name):
+            _bulk_write(_collection(name), ops[name])
+
+
+def save_scrape(
+    source_url: str, products: List[Dict[str, Any]], complete: bool = False
+) -> int:
+    """
+    Persist a scrape of ``source_url`` incrementally: only new and changed
+    products are written, plus price/rating changes to ``price_history``.
+    Products missing from the scrape are marked removed only if it is
+    ``complete`` (a crawl of the whole listing). Returns the number of
+    records written.
+    """
+    docs = _scrape_docs(source_url, products)
+    records, new = snapshots.diff(
+        source_url, _load_snapshot(source_url), docs, time.time(), complete
+    )
+    _write_records(records)
+    _remember_snapshot(source_url, new)
+    metrics.inc("mongo_write_records_total", len(records), outcome="written")
+    return len(records)
+
+
+# --- Async client -------------------------------------------------------------
+
+# AsyncMongoClient is bound to the loop it first runs on: one per loop
+_async_dbs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _async_db() -> Optional[Any]:
+    try:
+        from pymongo import AsyncMongoClient
+    except ImportError:
+        # pymongo < 4.10
+        return None
+    loop = asyncio.get_running_loop()
+    adb = _async_dbs.get(loop)
+    if adb is None:
+        aclient = AsyncMongoClient(
+            config.MONGO_URI,
+            maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+            serverSelectionTimeoutMS=config.MONGO_SERVER_TIMEOUT_MS,
+        )
+        adb = _async_dbs[loop] = aclient[config.MONGO_DB]
+    return adb
+
+
+async def save_scrape_async(
+    source_url: str, products: List[Dict[str, Any]], complete: bool = False
+) -> int:
+    """:func:`save_scrape` without blocking the event loop."""
+    adb = _async_db()
+    if adb is None or not _indexes_ready:
+        # First write goes through the sync client, which creates the indexes
+        return await asyncio.to_thread(save_scrape, source_url, products, complete)
+
+    docs = _scrape_docs(source_url, products)
+    old = _cached_snapshot(source_url)
+    if old is None:
+        cursor = adb["products"].find(
+            {"source_url": source_url, **_SNAPSHOT_QUERY}, _SNAPSHOT_PROJECTION
+        )
+        old = _snapshot_from_docs(await cursor.to_list(None))
+    records, new = snapshots.diff(source_url, old, docs, time.time(), complete)
+    ops = _record_ops(records)
+    for name in ("products", "price_history"):
+        for chunk in _chunks(ops.get(name, []), config.MONGO_BULK_SIZE):
+            await adb[name].bulk_write(chunk, ordered=False)
+    _remember_snapshot(source_url, new)
+    metrics.inc("mongo_write_records_total", len(records), outcome="written")
+    return len(records)
+
+
+# --- Write-behind buffer ------------------------------------------------------
+
+class BulkWriter:
+    """
+    Buffer scrapes and persist them from a background thread, diffed
+    against the store's snapshot (see :func:`save_scrape`), in batches of
+    ``batch_size`` records or every ``interval`` seconds, whichever comes
+    first.
+
+    At most ``max_buffered`` products are held in memory. The overflow, and
+    every batch that fails to write, is appended to ``spill_path`` (one
+    JSON record per line) and replayed ahead of newer writes once MongoDB
+    accepts writes again. Scrapes that could not even be diffed are
+    spilled as-is and diffed on replay. Reviews (:meth:`add_reviews`) are
+    inserted if new and count against the same limits.
+
+    After a failed write, further attempts back off exponentially (from
+    ``interval`` up to ``MONGO_RETRY_MAX_SECONDS``); meanwhile flushes only
+    append to the spill file. A spill file being replayed is deleted only
+    once its records are written, so a crash mid-replay loses nothing.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = config.MONGO_BULK_SIZE,
+        interval: float = config.MONGO_FLUSH_INTERVAL,
+        max_buffered: int = config.MONGO_BUFFER_MAX,
+        spill_path: str = config.MONGO_SPILL_PATH,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.max_buffered = max(1, max_buffered)
+        self.spill_path = spill_path
+        self.stats = {
+            "queued": 0, "written": 0, "spilled": 0, "replayed": 0, "flushes": 0,
+        }
+        # Raw scrape records, oldest first
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_products = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        # Spills come from request threads (overflow) and the writer thread
+        self._spill_lock = threading.Lock()
+        self._failures = 0
+        self._retry_at = 0.0
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._loop, name="mongo-bulk-writer", daemon=True
+        )
+        self._thread.start()
+
+    def add_scrape(
+        self, source_url: str, products: List[Dict[str, Any]], complete: bool = False
+    ) -> None:
+        self._add({
+            "_kind": "scrape",
+            "source_url": source_url,
+            "ts": time.time(),
+            "complete": complete,
+            "docs": list(_scrape_docs(source_url, products).values()),
         })
+
+    def add_reviews(self, product: str, reviews: List[Any]) -> None:
+        if reviews:
+            self._add({
+                "_kind": "reviews",
+                "product": product,
+                "ts": time.time(),
+                "docs": list(reviews),
+            })
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        overflow: List[Dict[str, Any]] = []
+        with self._cond:
+            self._pending.append(record)
+            self._pending_products += len(record["docs"])
+            self.stats["queued"] += len(record["docs"])
+            while self._pending_products > self.max_buffered and len(self._pending) > 1:
+                oldest = self._pending.pop(0)
+                self._pending_products -= len(oldest["docs"])
+                overflow.append(oldest)
+            if self._pending_products >= self.batch_size:
+                self._cond.notify()
+        if overflow:
+            self._spill(overflow)
+
+    def flush(self, force: bool = False) -> None:
+        """
+        Write everything buffered so far (blocking). While backing off after
+        a failure it is spilled instead, unless ``force`` is set.
+        """
+        with self._flush_lock:
+            with self._cond:
+                scrapes, self._pending = self._pending, []
+                self._pending_products = 0
+            if not force and time.monotonic() < self._retry_at:
+                self._spill(scrapes)
+                return
+            # Older spilled writes go first so they never overwrite newer ones
+            if not self._replay_spill():
+                self._spill(scrapes)
+                return
+            if scrapes:
+                self.stats["flushes"] += 1
+                self._write(scrapes)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush(force=True)
+
+    def _record_outcome(self, ok: bool) -> None:
+        if ok:
+            self._failures = 0
+            self._retry_at = 0.0
+            return
+        self._failures += 1
+        delay = min(self.interval * 2 ** (self._failures - 1), config.MONGO_RETRY_MAX_SECONDS)
+        self._retry_at = time.monotonic() + delay
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed and self._pending_products < self.batch_size:
+                    self._cond.wait(self.interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _diff(
+        self, records: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, snapshots.Snapshot]]:
+        """
+        Expand raw scrape records into diff records (reads snapshots).
+        Also returns the stores' snapshots once these records are written.
+        """
+        out: List[Dict[str, Any]] = []
+        # A store scraped twice in one batch diffs against its first scrape
+        pending: Dict[str, snapshots.Snapshot] = {}
+        for i, record in enumerate(records):
+            if record["_kind"] != "scrape":
+                out.append(record)
+                continue
+            url = record["source_url"]
+            old = pending.get(url)
+            if old is None:
+                try:
+                    old = _load_snapshot(url)
+                except Exception:
+                    # Cannot tell what changed without the snapshot; keep
+                    # the rest raw, in order. The records diffed so far will
+                    # be written later: their stores' snapshots are re-read.
+                    for diffed_url in pending:
+                        _forget_snapshot(diffed_url)
+                    raise _Unwritten(out + records[i:])
+            docs = {(url, d["product_key"]): d for d in record["docs"]}
+            diffed, pending[url] = snapshots.diff(
+                url, old, docs, record["ts"], record.get("complete", False)
+            )
+            out.extend(diffed)
+        return out, pending
+
+    def _write(self, records: List[Dict[str, Any]]) -> bool:
+        """Diff and write ``records``; spill whatever could not be written."""
+        rest = self._write_batch(records)
+        if rest is None:
+            return True
+        self._spill(rest)
+        return False
+
+    def _write_batch(self, records: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Diff and write ``records``; returns those not written, None if all were."""
+        try:
+            records, written = self._diff(records)
+        except _Unwritten as e:
+            logger.warning("MongoDB unavailable; keeping %d records", len(e.records))
+            self._record_outcome(False)
+            return e.records
+        for i, chunk in enumerate(_chunks(records, self.batch_size)):
+            try:
+                _write_records(chunk)
+                self.stats["written"] += len(chunk)
+                metrics.inc("mongo_write_records_total", len(chunk), outcome="written")
+            except Exception as e:
+                rest = records[i * self.batch_size:]
+                logger.warning("MongoDB write failed (%s); keeping %d records", e, len(rest))
+                self._record_outcome(False)
+                # Partly written: the next diff of these stores re-reads them
+                for url in written:
+                    _forget_snapshot(url)
+                return rest
+        for url, snap in written.items():
+            _remember_snapshot(url, snap)
+        self._record_outcome(True)
+        return None
+
+    def _spill(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        # One write per spill, under the lock, so lines never interleave
+        payload = "".join(json.dumps(record, default=str) + "\n" for record in records)
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.write(payload)
+            self.stats["spilled"] += len(records)
+            metrics.inc("mongo_write_records_total", len(records), outcome="spilled")
+        except OSError as e:
+            logger.error(
+                "Dropping %d records: cannot spill to %s (%s)",
+                len(records), self.spill_path, e,
+            )
+
+    def _read_spill(self, path: str) -> List[Dict[str, Any]]:
+        records, bad = [], 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    bad += 1
+        if bad:
+            logger.error("Skipped %d unreadable lines of spill file %s", bad, path)
+        return records
+
+    def _rewrite_spill(self, path: str, records: List[Dict[str, Any]]) -> None:
+        # Atomically replace the replay file with what is still unwritten
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+        os.replace(tmp, path)
+
+    def _replay_spill(self) -> bool:
+        """Write spilled records back; False if MongoDB is still unavailable."""
+        replay = self.spill_path + ".replay"
+        while True:
+            if not os.path.exists(replay):
+                with self._spill_lock:
+                    if not os.path.exists(self.spill_path):
+                        return True
+                    # New spills go to a fresh file while this one replays
+                    os.replace(self.spill_path, replay)
+
+            try:
+                records = self._read_spill(replay)
+            except OSError as e:
+                logger.error("Cannot read spill file %s (%s)", replay, e)
+                return False
+            rest = self._write_batch(records)
+            if rest is not None:
+                # Kept for the next attempt, ahead of anything spilled since
+                try:
+                    self._rewrite_spill(replay, rest)
+                except OSError as e:
+                    logger.error("Cannot update spill file %s (%s)", replay, e)
+                return False
+            os.remove(replay)
+            self.stats["replayed"] += len(records)
+            logger.info("Replayed %d spilled records into MongoDB", len(records))
+
+
+class _Unwritten(Exception):
+    def __init__(self, records: List[Dict[str, Any]]):
+        super().__init__("MongoDB unavailable")
+        self.records = records
+
+
+_writer: Optional[BulkWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> BulkWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = BulkWriter()
+        return _writer
+
+
+def close_writer() -> None:
+    """Flush buffered writes and stop the background writer."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
@@ -0,0 +1,89 @@
+"""
+Per-store product snapshots for incremental persistence.
+
+A snapshot maps each product of a store to ``[fingerprint, price, rating]``
+as of the last scrape. It is not stored as a document of its own: each
+product document carries its ``fingerprint``, so the snapshot is read back
+from the store's products. :func:`diff` compares a new scrape against it
+and returns write records for what actually changed:
+
+- ``product``  -- new or changed product, upserted in full (with its
+  fingerprint),
+- ``removed``  -- product missing from a complete crawl, marked
+  ``removed_at``,
+- ``price``    -- price/rating point for the ``price_history`` time series.
+
+Unchanged products produce no writes at all. Records are plain JSON-able
+dicts (tagged with ``_kind``) so they can be buffered and spilled to disk.
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.products import parse_price, to_float
+
+# Fields whose change makes a product worth rewriting. Kept apart from
+# other modules' field lists: changing it changes every stored fingerprint.
+TRACKED_FIELDS = ("title", "price", "availability", "rating", "reviews")
+
+# product_key -> [fingerprint, raw price, raw rating]
+Snapshot = Dict[str, List[Any]]
+
+
+def fingerprint(product: Dict[str, Any]) -> str:
+    """Hash of the fields a scrape can change."""
+    payload = json.dumps([product.get(f) for f in TRACKED_FIELDS], default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _price_point(
+    source_url: str, key: str, product: Dict[str, Any], ts: float
+) -> Dict[str, Any]:
+    price = parse_price(product.get("price", ""))
+    rating = to_float(product.get("rating"), 0.0)
+    return {
+        "_kind": "price",
+        "ts": ts,
+        "meta": {"source_url": source_url, "product_key": key},
+        "price": price or None,
+        "rating": rating or None,
+    }
+
+
+def diff(
+    source_url: str,
+    old: Optional[Snapshot],
+    docs: Dict[Tuple[Any, str], Dict[str, Any]],
+    now: float,
+    complete: bool = False,
+) -> Tuple[List[Dict[str, Any]], Snapshot]:
+    """
+    Write records turning snapshot ``old`` into the scrape ``docs`` (as
+    built by ``mongo_db._product_docs``), and the new snapshot.
+
+    Only a ``complete`` scrape (a crawl of the whole listing) removes the
+    products it did not see; a partial one (capped, or a single page)
+    leaves them in the snapshot untouched.
+    """
+    old = old or {}
+    new: Snapshot = {} if complete else dict(old)
+    records: List[Dict[str, Any]] = []
+
+    for (_, key), doc in docs.items():
+        fp = fingerprint(doc)
+        price, rating = doc.get("price"), doc.get("rating")
+        new[key] = [fp, price, rating]
+
+        previous = old.get(key)
+        if previous is not None and previous[0] == fp:
+            continue
+        records.append({"_kind": "product", **doc, "fingerprint": fp})
+        if previous is None or previous[1] != price or previous[2] != rating:
+            records.append(_price_point(source_url, key, doc, now))
+
+    for key in old.keys() - new.keys():
+        records.append(
+            {"_kind": "removed", "source_url": source_url, "product_key": key,
+             "removed_at": now}
+        )
+    return records, new
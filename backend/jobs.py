@@ -0,0 +1,261 @@
+"""
+Background scrape jobs.
+
+``POST /jobs`` returns a job id straight away; a bounded number of jobs
+(``JOBS_WORKERS``) run ``scrape_and_analyze_async`` on the API's event loop
+while the rest wait their turn. Each job keeps an event log that clients
+can poll (``GET /jobs/{id}``) or follow as Server-Sent Events
+(``GET /jobs/{id}/events``). Submitting a scrape that is already queued or
+running -- or that finished successfully within ``JOBS_DEDUPE_SECONDS`` --
+returns the existing job instead of starting another one. At most
+``JOBS_MAX_PENDING`` jobs may be queued or running; beyond that
+submissions raise :class:`JobQueueFull`.
+
+Products are only held on a job while it runs. A finished job keeps its
+``result_id`` and insights; its products are paged through
+``GET /results/{result_id}/products`` like any other scrape result.
+"""
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from backend import config
+from backend.pipeline import scrape_and_analyze_async
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are queued or running to accept another one."""
+
+
+def job_key(url: str, options: Dict[str, Any]) -> str:
+    """Identity used to deduplicate submissions."""
+    return json.dumps([url.strip(), options], sort_keys=True)
+
+
+class Job:
+    def __init__(self, url: str, options: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.options = options
+        self.key = job_key(url, options)
+        self.status = QUEUED
+        self.attempts = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.product_count: Optional[int] = None
+        # Products as soon as they are scraped, until the job finishes
+        self.partial: Optional[List[Dict]] = None
+        # result_id and insights of a successful run (no products)
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self._changed = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def emit(self, event: str, **data: Any) -> None:
+        self.events.append({"event": event, "time": time.time(), **data})
+        # Wake every watcher, then re-arm for the next event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def to_dict(self, include_results: bool = True) -> Dict[str, Any]:
+        info: Dict[str, Any] = {
+            "job_id": self.id,
+            "url": self.url,
+            "options": self.options,
+            "status": self.status,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "product_count": self.product_count,
+            "stage": self.events[-1]["event"] if self.events else None,
+        }
+        if self.error:
+            info["error"] = self.error
+        if include_results:
+            if self.result is not None:
+                info.update(self.result)
+            elif self.partial is not None:
+                info["results"] = self.partial
+        return info
+
+    async def watch(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every event of this job (past ones first) until it finishes."""
+        seen = 0
+        while True:
+            changed = self._changed
+            while seen < len(self.events):
+                seen += 1
+                yield self.events[seen - 1]
+            if self.finished:
+                return
+            await changed.wait()
+
+
+class JobManager:
+    def __init__(
+        self,
+        workers: int = config.JOBS_WORKERS,
+        max_retained: int = config.JOBS_MAX_RETAINED,
+        dedupe_seconds: float = config.JOBS_DEDUPE_SECONDS,
+        max_pending: int = config.JOBS_MAX_PENDING,
+    ):
+        self.max_retained = max_retained
+        self.max_pending = max(1, max_pending)
+        self.dedupe_seconds = dedupe_seconds
+        self._slots = asyncio.Semaphore(max(1, workers))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_key: Dict[str, Job] = {}
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    def submit(self, url: str, options: Dict[str, Any]) -> Tuple[Job, bool]:
+        """
+        Start (or reuse) a job; returns ``(job, deduplicated)``. Raises
+        :class:`JobQueueFull` when a new job would exceed ``max_pending``.
+        """
+        existing = self._by_key.get(job_key(url, options))
+        if existing is not None and self._reusable(existing):
+            return existing, True
+
+        self._check_capacity()
+        job = Job(url, options)
+        self._jobs[job.id] = job
+        self._by_key[job.key] = job
+        self._start(job)
+        self._prune()
+        return job, False
+
+    def cancel(self, job: Job) -> bool:
+        if job.finished or job._task is None:
+            return False
+        job._task.cancel()
+        return True
+
+    def retry(self, job: Job) -> Optional[Job]:
+        """
+        Run a failed or cancelled job again under the same id. Returns the
+        job that runs the scrape: ``job``, or another queued or running job
+        for the same scrape (which is left to it). None if ``job`` cannot
+        be retried. Raises :class:`JobQueueFull` like :meth:`submit`.
+        """
+        if job.status not in (FAILED, CANCELLED):
+            return None
+        active = self._by_key.get(job.key)
+        if active is not None and active is not job and active.status in (QUEUED, RUNNING):
+            return active
+        self._check_capacity()
+        job.status = QUEUED
+        job.error = None
+        job.result = job.partial = job.product_count = None
+        job.started_at = job.finished_at = None
+        self._by_key[job.key] = job
+        self._start(job)
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    async def shutdown(self) -> None:
+        tasks = [j._task for j in self._jobs.values() if j._task and not j.finished]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _check_capacity(self) -> None:
+        pending = sum(1 for j in self._jobs.values() if not j.finished)
+        if pending >= self.max_pending:
+            raise JobQueueFull(f"{pending} jobs are already queued or running")
+
+    def _reusable(self, job: Job) -> bool:
+        if job.status in (QUEUED, RUNNING):
+            return True
+        return (
+            job.status == SUCCEEDED
+            and job.finished_at is not None
+            and time.time() - job.finished_at < self.dedupe_seconds
+        )
+
+    def _start(self, job: Job) -> None:
+        job.attempts += 1
+        job.emit(QUEUED, attempt=job.attempts)
+        job._task = asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job: Job) -> None:
+        def progress(stage: str, data: Dict[str, Any]) -> None:
+            if stage == "scraped":
+                job.product_count = data["product_count"]
+                job.partial = data["results"]
+                job.emit(stage, product_count=job.product_count)
+            else:
+                job.emit(stage)
+
+        try:
+            async with self._slots:
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.emit(RUNNING)
+                result = await scrape_and_analyze_async(
+                    job.url, progress=progress, **job.options
+                )
+            job.result = {"result_id": result["result_id"], "insights": result["insights"]}
+            job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            # Blocking work already handed to a thread finishes on its own;
+            # its result is discarded
+            job.status = CANCELLED
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+        # Retained jobs must not pin their products; see /results/{result_id}
+        job.partial = None
+        job.finished_at = time.time()
+        job.emit(job.status, **({"error": job.error} if job.error else {}))
+
+    def _prune(self) -> None:
+        # Drop the oldest finished jobs beyond the retention limit
+        excess = len(self._jobs) - self.max_retained
+        for job_id in [j.id for j in self._jobs.values() if j.finished][:max(0, excess)]:
+            job = self._jobs.pop(job_id)
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+
+_manager: Optional[JobManager] = None
+
+
+def get_manager() -> JobManager:
+    """Job manager of the running API process."""
+    global _manager
+    if _manager is None:
+        _manager = JobManager()
+    return _manager
+
+
+def sse(event: Dict[str, Any]) -> str:
+    """Format one job event as a Server-Sent Events message."""
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -1,17 +1,146 @@
-from fastapi import FastAPI
+# Imported first so the import time of everything below is measured
+from backend import startup  # isort: skip
+
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.datastructures import MutableHeaders
+
+from backend import analysis_cache, comparison, config, jobs, metrics, profiling, results
+from backend.database import mongo_db
+from backend.pipeline import (
+    crawl_and_save_reviews,
+    scrape_and_analyze,
+    scrape_and_analyze_stream,
+    scrape_batch,
+    scrape_options,
+)
+from backend.scraper import browser_pool, fetcher, parse_pool
+from backend.scraper.http_cache import get_cache
+from backend.scraper.profiles import get_store
+
+startup.mark("imports")
+
+logger = logging.getLogger(__name__)
+
+
+async def _warm_browsers() -> None:
+    # Resolve chromedriver once (and optionally start warm browsers)
+    try:
+        with startup.phase("browser_warmup"):
+            await asyncio.to_thread(browser_pool.startup)
+    except Exception:
+        # No browser on this machine – the Selenium fallback will just fail
+        logger.info("Browser warm-up skipped", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Browsers warm up in the background: the API serves requests meanwhile,
+    # and MongoDB connects on first write
+    warmup = asyncio.create_task(_warm_browsers())
+    startup.mark("ready")
+    yield
+    # Stop background jobs, then release pooled connections and browsers
+    await jobs.get_manager().shutdown()
+    await warmup
+    await fetcher.aclose()
+    await asyncio.to_thread(browser_pool.shutdown)
+    await asyncio.to_thread(mongo_db.close_writer)
+    await asyncio.to_thread(comparison.shutdown)
+    await asyncio.to_thread(parse_pool.shutdown)
 
-from backend.scraper.generic_scraper import generic_scrape
-from backend.recommender import analyze_products
-from backend.database.mongo_db import save_products
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id"],
+)
+
+
+# Streamed responses send their headers before the work is done, so a
+# Server-Timing header could only describe the time to the first byte
+_STREAMED_TYPES = ("application/x-ndjson", "text/event-stream")
+
+
+class RequestTimer:
+    """
+    Record request latency and report per-stage timings as Server-Timing.
+
+    A plain ASGI middleware rather than ``@app.middleware("http")``, which
+    returns as soon as the headers are sent: latency is observed when the
+    last body chunk goes out, so streamed responses are timed in full, and
+    requests that raise are recorded as 500s.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        timings, token = metrics.begin_request()
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                streamed = headers.get("content-type", "").startswith(_STREAMED_TYPES)
+                if config.SERVER_TIMING_ENABLED and not streamed:
+                    total = [("total", time.perf_counter() - started)]
+                    headers["Server-Timing"] = metrics.server_timing(timings + total)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            metrics.end_request(token)
+            # Label by route template (/jobs/{job_id}), not the raw path
+            route = scope.get("route")
+            metrics.observe(
+                "http_request_seconds", time.perf_counter() - started,
+                method=scope["method"],
+                path=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+
+app.add_middleware(RequestTimer)
+
+
+def _cache_stats() -> dict:
+    cache = get_cache()
+    profiles = get_store()
+    sources = {
+        "http": cache.stats if cache is not None else {},
+        "analysis": analysis_cache.stats(),
+        "profiles": profiles.stats if profiles is not None else {},
+    }
+    return {
+        (("cache", name), ("stat", stat)): value
+        for name, stats in sources.items()
+        for stat, value in stats.items()
+    }
+
+
+metrics.register_gauge("cache_stats", "Cache counters and sizes (as on /cache/stats)", _cache_stats)
+metrics.register_gauge(
+    "scrape_jobs", "Scrape jobs by status",
+    lambda: {(("status", k),): v for k, v in jobs.get_manager().stats().items()},
 )
 
 
@@ -20,30 +149,343 @@ def home():
     return {"status": "running"}
 
 
+@app.get("/startup")
+def startup_timings():
+    """Milliseconds from process import to each startup milestone."""
+    return startup.report()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage timers, counters and cache stats in the Prometheus text format."""
+    # async: job stats are read on the event loop that mutates them
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def _require_profiling() -> None:
+    if not config.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="profiling is disabled")
+
+
+@app.get("/profiles")
+def list_profiles():
+    """Stored request profiles, newest first."""
+    _require_profiling()
+    return {"profiles": profiling.list_profiles()}
+
+
+@app.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, format: str = "collapsed"):
+    """
+    Download a profile: ``format=collapsed`` (folded stacks for
+    flamegraph.pl / speedscope) or ``format=pstats`` (cProfile data).
+    """
+    _require_profiling()
+    path = profiling.profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    return FileResponse(
+        path,
+        media_type="text/plain" if format == "collapsed" else "application/octet-stream",
+        filename=profile_id + profiling.FORMATS[format],
+    )
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    cache = get_cache()
+    profiles = get_store()
+    return {
+        "http": cache.summary() if cache is not None else {"enabled": False},
+        "analysis": analysis_cache.stats(),
+        "profiles": profiles.stats if profiles is not None else {"enabled": False},
+    }
+
+
+def _scrape(url: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return scrape_and_analyze(url, **options)
+    except Exception as e:
+        return {"error": str(e)}
+
+
 @app.post("/scrape")
-def scrape_site(data: dict):
+def scrape_site(
+    data: dict,
+    response: Response,
+    profile: Optional[str] = None,
+    x_profile: Optional[str] = Header(None),
+):
+    """
+    Scrape and analyze one store.
+
+    Body: ``{"url": ...}``; add ``"crawl": true`` (optionally with
+    ``max_pages`` / ``max_products``, capped by ``CRAWL_MAX_PAGES`` /
+    ``CRAWL_MAX_PRODUCTS``) to follow category pagination.
+
+    With ``?profile=1`` or an ``X-Profile: 1`` header (and
+    ``PROFILING_ENABLED``), the request is profiled; the ``X-Profile-Id``
+    response header names the profile to fetch from ``/profiles/{id}``.
+    """
     url = data.get("url")
     if not url:
         return {"error": "URL not provided"}
 
     try:
-        products = generic_scrape(url)
+        options = scrape_options(data)
+    except (TypeError, ValueError):
+        return {"error": "max_pages and max_products must be integers"}
 
-        # Persist raw product data for later analysis / reuse
-        try:
-            # attach source URL to each product document
-            to_save = [{**p, "source_url": url} for p in products]
-            save_products(to_save)
-        except Exception:
-            # MongoDB is optional – ignore persistence errors
-            pass
-
-        # Run heuristic AI-style marketing analysis
-        insights = analyze_products(products, url)
-
-        return {
-            "results": products,
-            "insights": insights,
-        }
-    except Exception as e:
-        return {"error": str(e)}
+    try:
+        profiled = profiling.check_access(profile or x_profile)
+    except profiling.ProfilingUnavailable as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if not profiled:
+        return _scrape(url, options)
+
+    try:
+        with profiling.profile(url) as prof:
+            result = _scrape(url, options)
+    except profiling.ProfilingUnavailable as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    response.headers["X-Profile-Id"] = prof.id
+    return result
+
+
+@app.post("/scrape/stream")
+async def scrape_site_stream(data: dict):
+    """
+    :func:`scrape_site` as newline-delimited JSON: ``products`` records as
+    soon as each page is parsed, then one ``insights`` record (or an
+    ``error`` record). Takes the same body as ``/scrape``.
+    """
+    url = data.get("url")
+    if not url:
+        return {"error": "URL not provided"}
+    try:
+        options = scrape_options(data)
+    except (TypeError, ValueError):
+        return {"error": "max_pages and max_products must be integers"}
+
+    async def lines():
+        async for record in scrape_and_analyze_stream(url, **options):
+            yield json.dumps(record, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/results/{result_id}")
+def get_result(result_id: str):
+    """Metadata and insights of a stored scrape result (see ``result_id``)."""
+    result = results.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="result not found")
+    return result
+
+
+@app.get("/results/{result_id}/products")
+def get_result_products(
+    result_id: str,
+    sort: str = "position",
+    order: str = "asc",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+):
+    """
+    One page of a stored result's products.
+
+    ``sort`` is ``position`` (scrape order), ``price``, ``rating`` or
+    ``reviews``; pass the returned ``next_cursor`` back as ``cursor`` (with
+    the same sort and filters) for the next page. The first page also
+    reports how many products match the filters.
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    filters = results.Filters(min_price, max_price, min_rating, in_stock)
+    try:
+        page = results.query(result_id, sort, order == "desc", filters, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="result not found")
+    return page
+
+
+@app.post("/compare")
+def compare(data: dict):
+    """
+    Compare stores against each other.
+
+    Body: ``{"result_ids": [...], "source_urls": [...]}``. ``result_ids``
+    are stored scrape results; ``source_urls`` name stores whose current
+    catalog is read from MongoDB. Optional ``high_percentile`` (0-100)
+    overrides ``COMPARE_HIGH_PERCENTILE``.
+    """
+    result_ids = data.get("result_ids") or []
+    source_urls = data.get("source_urls") or []
+    if not isinstance(result_ids, list) or not isinstance(source_urls, list):
+        return {"error": "result_ids and source_urls must be lists"}
+    if not result_ids and not source_urls:
+        return {"error": "result_ids or source_urls not provided"}
+    if len(result_ids) + len(source_urls) > config.COMPARE_MAX_STORES:
+        return {"error": f"Too many stores (max {config.COMPARE_MAX_STORES})"}
+    high = data.get("high_percentile")
+    if high is not None and not (isinstance(high, (int, float)) and 0 <= high <= 100):
+        return {"error": "high_percentile must be a number between 0 and 100"}
+
+    stores, missing = comparison.load_stores(
+        [str(r) for r in result_ids], [str(u) for u in source_urls]
+    )
+    return {**comparison.compare_stores(stores, high), "missing": missing}
+
+
+@app.post("/scrape/batch")
+async def scrape_site_batch(data: dict):
+    """
+    Scrape many stores concurrently.
+
+    Body: ``{"urls": [...], "concurrency": 32}``; ``concurrency`` is optional
+    and capped by ``SCRAPE_BATCH_CONCURRENCY``. The crawl options of
+    ``/scrape`` apply to every URL.
+    """
+    urls = data.get("urls")
+    if not urls or not isinstance(urls, list):
+        return {"error": "URLs not provided"}
+    if len(urls) > config.SCRAPE_BATCH_MAX_URLS:
+        return {"error": f"Too many URLs (max {config.SCRAPE_BATCH_MAX_URLS})"}
+
+    try:
+        concurrency = int(data.get("concurrency") or config.SCRAPE_BATCH_CONCURRENCY)
+        options = scrape_options(data)
+    except (TypeError, ValueError):
+        return {"error": "concurrency, max_pages and max_products must be integers"}
+    concurrency = max(1, min(concurrency, config.SCRAPE_BATCH_CONCURRENCY))
+
+    results = await scrape_batch([str(u) for u in urls], concurrency, **options)
+    failed = sum(1 for r in results if "error" in r)
+    return {
+        "results": results,
+        "succeeded": len(results) - failed,
+        "failed": failed,
+    }
+
+
+@app.post("/reviews/crawl")
+async def crawl_product_reviews(data: dict):
+    """
+    Crawl the reviews of many products into MongoDB.
+
+    Body: ``{"urls": [...], "max_pages": 20, "concurrency": 32}``; the
+    options are optional and capped by ``REVIEW_MAX_PAGES`` and
+    ``REVIEW_CONCURRENCY``. Reviews are written as they are crawled; the
+    response counts them per product.
+    """
+    urls = data.get("urls")
+    if not urls or not isinstance(urls, list):
+        return {"error": "URLs not provided"}
+    if len(urls) > config.REVIEW_MAX_URLS:
+        return {"error": f"Too many URLs (max {config.REVIEW_MAX_URLS})"}
+
+    try:
+        max_pages = int(data.get("max_pages") or config.REVIEW_MAX_PAGES)
+        concurrency = int(data.get("concurrency") or config.REVIEW_CONCURRENCY)
+    except (TypeError, ValueError):
+        return {"error": "max_pages and concurrency must be integers"}
+    max_pages = max(1, min(max_pages, config.REVIEW_MAX_PAGES))
+    concurrency = max(1, min(concurrency, config.REVIEW_CONCURRENCY))
+
+    return await crawl_and_save_reviews([str(u) for u in urls], max_pages, concurrency)
+
+
+def _job_or_404(job_id: str) -> jobs.Job:
+    job = jobs.get_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/jobs")
+async def submit_job(data: dict):
+    """
+    Queue a scrape in the background and return its job id immediately.
+
+    Body: same as ``/scrape``. An identical scrape that is queued, running
+    or recently finished is returned instead (``"deduplicated": true``).
+    Responds 429 while ``JOBS_MAX_PENDING`` jobs are queued or running.
+    """
+    url = data.get("url")
+    if not url:
+        return {"error": "URL not provided"}
+    try:
+        options = scrape_options(data)
+    except (TypeError, ValueError):
+        return {"error": "max_pages and max_products must be integers"}
+
+    try:
+        job, deduplicated = jobs.get_manager().submit(str(url), options)
+    except jobs.JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {**job.to_dict(include_results=False), "deduplicated": deduplicated}
+
+
+@app.get("/jobs")
+async def list_jobs():
+    manager = jobs.get_manager()
+    return {
+        "jobs": [j.to_dict(include_results=False) for j in manager.jobs()],
+        "counts": manager.stats(),
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Job status. Includes products as soon as they are scraped; once the job
+    has succeeded, its ``result_id`` and insights instead (products are
+    paged through ``/results/{result_id}/products``).
+    """
+    return _job_or_404(job_id).to_dict()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Follow a job's progress as Server-Sent Events until it finishes."""
+    job = _job_or_404(job_id)
+
+    async def stream():
+        async for event in job.watch():
+            yield jobs.sse(event)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = _job_or_404(job_id)
+    if not jobs.get_manager().cancel(job):
+        return {"error": f"Job is already {job.status}"}
+    return {"job_id": job.id, "status": "cancelling"}
+
+
+@app.post("/jobs/{job_id}/retry")
+async def retry_job(job_id: str):
+    """
+    Run a failed or cancelled job again. If an identical scrape is already
+    queued or running, that job is returned instead (``"deduplicated": true``).
+    """
+    job = _job_or_404(job_id)
+    try:
+        running = jobs.get_manager().retry(job)
+    except jobs.JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    if running is None:
+        return {"error": f"Only failed or cancelled jobs can be retried (job is {job.status})"}
+    return {**running.to_dict(include_results=False), "deduplicated": running is not job}
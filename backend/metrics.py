@@ -0,0 +1,242 @@
+"""
+Stage timers and counters for the scrape -> analyze path.
+
+Counters and latency histograms live in a small in-process registry that
+``GET /metrics`` renders in the Prometheus text format. :func:`stage` also
+adds its duration to the current request's ``Server-Timing`` header: the
+API middleware opens a per-request collection with :func:`begin_request`,
+and because it is a context variable, work done in worker threads
+(``asyncio.to_thread``, the threadpool of sync endpoints) and on the
+fetcher's background loop is attributed to the request that started it.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from backend import config
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "scrape_requests_total": ("counter", "Scrapes started, by entry point"),
+    "scrape_products_total": ("counter", "Products returned by scrapes"),
+    "scrape_extraction_total": ("counter", "Pages with products, by winning extraction path"),
+    "scrape_selenium_fallback_total": ("counter", "Scrapes that fell back to Selenium"),
+    "scrape_selenium_renders_total": ("counter", "Pages rendered by Selenium (cache misses)"),
+    "scrape_stage_seconds": ("histogram", "Time spent per pipeline stage"),
+    "fetch_requests_total": ("counter", "Page fetches, by where the body came from"),
+    "fetch_bytes_total": ("counter", "Bytes of page bodies fetched, by source"),
+    "mongo_write_records_total": ("counter", "Records written to MongoDB, by outcome"),
+    "analysis_runs_total": ("counter", "analyze_products calls, by path"),
+    "parse_tasks_total": ("counter", "Pages parsed in the parse process pool, by outcome"),
+    "review_pages_total": ("counter", "Review pages crawled, by outcome"),
+    "reviews_scraped_total": ("counter", "Reviews extracted from crawled pages"),
+    "http_request_seconds": ("histogram", "API request latency"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Labels], float] = {}
+_histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+
+# Extra gauges read at scrape time: name -> (help, callable returning {labels: value})
+_gauges: Dict[str, Tuple[str, Callable[[], Dict[Labels, float]]]] = {}
+
+# (stage, seconds) entries of the current request, or None outside one
+_request_timings: "contextvars.ContextVar[Optional[List[Tuple[str, float]]]]" = (
+    contextvars.ContextVar("request_timings", default=None)
+)
+
+# Inside capture(): (kind, name, value, labels) events to replay elsewhere
+Event = Tuple[str, str, float, Dict[str, object]]
+_captured: "contextvars.ContextVar[Optional[List[Event]]]" = (
+    contextvars.ContextVar("captured_metrics", default=None)
+)
+
+
+def _label_value(value: object) -> str:
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, _label_value(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels: object) -> None:
+    if not config.METRICS_ENABLED:
+        return
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(("inc", name, value, labels))
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name: str, seconds: float, **labels: object) -> None:
+    if not config.METRICS_ENABLED:
+        return
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(("observe", name, seconds, labels))
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = _Histogram()
+        hist.observe(seconds)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """Add to the current request's Server-Timing entries (if any)."""
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(("timing", name, seconds, {}))
+        return
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into ``scrape_stage_seconds`` and Server-Timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe("scrape_stage_seconds", elapsed, stage=name)
+        record_timing(name, elapsed)
+
+
+@contextmanager
+def capture() -> Iterator[List[Event]]:
+    """
+    Collect the metrics of the ``with`` block instead of recording them,
+    e.g. in a worker process; pass the events to :func:`replay` where they
+    should count.
+    """
+    events: List[Event] = []
+    token = _captured.set(events)
+    try:
+        yield events
+    finally:
+        _captured.reset(token)
+
+
+def replay(events: List[Event]) -> None:
+    for kind, name, value, labels in events:
+        if kind == "inc":
+            inc(name, value, **labels)
+        elif kind == "observe":
+            observe(name, value, **labels)
+        else:
+            record_timing(name, value)
+
+
+def register_gauge(
+    name: str, help_text: str, read: Callable[[], Dict[Labels, float]]
+) -> None:
+    """Expose values read from elsewhere (e.g. cache stats) on /metrics."""
+    _gauges[name] = (help_text, read)
+
+
+def begin_request() -> Tuple[List[Tuple[str, float]], contextvars.Token]:
+    timings: List[Tuple[str, float]] = []
+    return timings, _request_timings.set(timings)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _request_timings.reset(token)
+
+
+def server_timing(timings: List[Tuple[str, float]]) -> str:
+    """``Server-Timing`` value; repeated stages (e.g. crawl fetches) are summed."""
+    totals: Dict[str, float] = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _value(value: float) -> str:
+    # Full precision: ":g" would round large counters to 6 digits
+    return repr(float(value))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {
+            key: (list(h.buckets), h.sum, h.count) for key, h in _histograms.items()
+        }
+
+    lines: List[str] = []
+    for name, (kind, help_text) in HELP.items():
+        if kind == "counter":
+            series = [(labels, v) for (n, labels), v in counters.items() if n == name]
+            if not series:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for labels, value in sorted(series):
+                lines.append(f"{name}{_format_labels(labels)} {_value(value)}")
+        else:
+            series_h = [(labels, h) for (n, labels), h in histograms.items() if n == name]
+            if not series_h:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for labels, (buckets, total, count) in sorted(series_h):
+                for bound, cumulative in zip(BUCKETS, buckets):
+                    le = (("le", f"{bound:g}"),)
+                    lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                inf = (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{_format_labels(labels, inf)} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    for name, (help_text, read) in _gauges.items():
+        try:
+            values = read()
+        except Exception:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{name}{_format_labels(labels)} {_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
@@ -0,0 +1,245 @@
+"""
+Scrape -> persist -> analyze pipeline shared by the API endpoints, and
+the review crawl -> persist path.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from backend.scraper.generic_scraper import (
+    generic_scrape,
+    generic_scrape_async,
+    generic_scrape_stream,
+)
+from backend.scraper.review_scraper import crawl_reviews
+from backend.recommender import IncrementalAnalyzer, analyze_products
+from backend import config, metrics, results
+from backend.products import Product, ProductBatch, to_dicts
+from backend.database.mongo_db import get_writer, save_reviews, save_scrape, save_scrape_async
+
+logger = logging.getLogger(__name__)
+
+
+def _complete(products: Sequence[Product]) -> bool:
+    # Only a crawl that reached the end of the listing may mark products removed
+    return bool(getattr(products, "complete", False))
+
+
+def _persist(url: str, products: Sequence[Product], complete: bool = False) -> None:
+    # Persist what changed since the store's last scrape
+    try:
+        with metrics.stage("persist"):
+            if config.MONGO_WRITE_BEHIND:
+                # Diffed and written in the background; never waits on the database
+                get_writer().add_scrape(url, products, complete)
+            else:
+                save_scrape(url, products, complete)
+    except Exception:
+        # MongoDB is optional – the scrape still succeeds without it
+        logger.warning("Could not persist products for %s", url, exc_info=True)
+
+
+async def _persist_async(url: str, products: Sequence[Product], complete: bool = False) -> None:
+    if config.MONGO_WRITE_BEHIND:
+        # Diffing every product (and a possible spill to disk) must not
+        # block the event loop
+        await asyncio.to_thread(_persist, url, products, complete)
+        return
+    try:
+        with metrics.stage("persist"):
+            await save_scrape_async(url, products, complete)
+    except Exception:
+        logger.warning("Could not persist products for %s", url, exc_info=True)
+
+
+def _store_result(url: str, products: Sequence[Product], insights: Dict[str, Any]) -> Optional[str]:
+    # Kept server-side so clients can page through it (GET /results/{id})
+    try:
+        return results.save(url, products, insights)
+    except Exception:
+        logger.warning("Could not store the result for %s", url, exc_info=True)
+        return None
+
+
+def _review_features(products: Sequence[Product]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Precomputed review features of ``products``, with ``REVIEW_FEATURES_SCORING``."""
+    if not config.REVIEW_FEATURES_SCORING:
+        return None
+    try:
+        from backend import review_features
+
+        return review_features.lookup(products)
+    except Exception:
+        logger.warning("Review features unavailable, scoring without them", exc_info=True)
+        return None
+
+
+def _analyze(url: str, products: Sequence[Product]) -> Dict[str, Any]:
+    return analyze_products(products, url, review_features=_review_features(products))
+
+
+# Request option -> the config value it may not exceed
+_CRAWL_LIMITS = {"max_pages": "CRAWL_MAX_PAGES", "max_products": "CRAWL_MAX_PRODUCTS"}
+
+
+def scrape_options(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pick the scrape options (crawl mode and its caps) out of a request body.
+    The caps are clamped to ``CRAWL_MAX_PAGES`` / ``CRAWL_MAX_PRODUCTS``;
+    raises ``ValueError`` if one is not an integer.
+    """
+    options: Dict[str, Any] = {"crawl": bool(data.get("crawl"))}
+    for key, limit in _CRAWL_LIMITS.items():
+        value = data.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f"{key} must be an integer")
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValueError(f"{key} must be an integer") from None
+        options[key] = max(1, min(value, getattr(config, limit)))
+    return options
+
+
+def scrape_and_analyze(url: str, **options: Any) -> Dict[str, Any]:
+    """
+    Scrape one store, persist the products and run the marketing analysis.
+    ``options`` are passed through to ``generic_scrape``.
+    """
+    products = generic_scrape(url, **options)
+    _persist(url, products, _complete(products))
+
+    # Run heuristic AI-style marketing analysis
+    insights = _analyze(url, products)
+
+    return {
+        "result_id": _store_result(url, products, insights),
+        "results": to_dicts(products),
+        "insights": insights,
+    }
+
+
+# Called as progress(stage, data) after each pipeline stage
+Progress = Callable[[str, Dict[str, Any]], None]
+
+
+async def scrape_and_analyze_async(
+    url: str, progress: Optional[Progress] = None, **options: Any
+) -> Dict[str, Any]:
+    """
+    Asyncio variant of :func:`scrape_and_analyze`. ``progress``, if given,
+    is told about each finished stage ("scraped", "persisted", "analyzed").
+    """
+    products = await generic_scrape_async(url, **options)
+    if progress:
+        progress("scraped", {"product_count": len(products), "results": to_dicts(products)})
+    await _persist_async(url, products, _complete(products))
+    if progress:
+        progress("persisted", {})
+    insights = await asyncio.to_thread(_analyze, url, products)
+    if progress:
+        progress("analyzed", {})
+
+    return {
+        "result_id": await asyncio.to_thread(_store_result, url, products, insights),
+        "results": to_dicts(products),
+        "insights": insights,
+    }
+
+
+async def scrape_and_analyze_stream(url: str, **options: Any) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of :func:`scrape_and_analyze_async`. Yields
+    ``{"event": "products", "products": [...]}`` records as pages are
+    parsed (at most ``STREAM_CHUNK_SIZE`` products each), then a single
+    ``{"event": "insights", ...}`` record once everything is persisted and
+    analyzed. A failure ends the stream with ``{"event": "error", ...}``.
+    """
+    products = ProductBatch()
+    # Analysis runs page by page while later pages are still being fetched
+    features: Optional[Dict[str, Dict[str, Any]]] = {} if config.REVIEW_FEATURES_SCORING else None
+    analyzer = IncrementalAnalyzer(url, review_features=features)
+    size = max(1, config.STREAM_CHUNK_SIZE)
+    outcome: Dict[str, Any] = {}
+    try:
+        async for page in generic_scrape_stream(url, outcome=outcome, **options):
+            for i in range(0, len(page), size):
+                yield {"event": "products", "products": to_dicts(page[i:i + size])}
+            products.extend(page)
+            if features is not None:
+                features.update(await asyncio.to_thread(_review_features, page) or {})
+            with metrics.stage("analyze"):
+                await asyncio.to_thread(analyzer.extend, page)
+        await _persist_async(url, products, outcome.get("complete", False))
+        insights = analyzer.insights()
+        result_id = await asyncio.to_thread(_store_result, url, products, insights)
+    except Exception as e:
+        yield {"event": "error", "error": str(e)}
+        return
+
+    yield {
+        "event": "insights",
+        "result_id": result_id,
+        "product_count": len(products),
+        "insights": insights,
+    }
+
+
+async def scrape_batch(
+    urls: List[str], concurrency: int, **options: Any
+) -> List[Dict[str, Any]]:
+    """
+    Run :func:`scrape_and_analyze_async` over many URLs, at most
+    ``concurrency`` at a time. Results keep the input order; a failing
+    store yields an ``{"url", "error"}`` entry instead of aborting the batch.
+    """
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(url: str) -> Dict[str, Any]:
+        async with limit:
+            try:
+                return {"url": url, **(await scrape_and_analyze_async(url, **options))}
+            except Exception as e:
+                return {"url": url, "error": str(e)}
+
+    return await asyncio.gather(*(run_one(u) for u in urls))
+
+
+async def _persist_reviews(product_url: str, reviews: List[Dict[str, Any]]) -> None:
+    try:
+        with metrics.stage("persist"):
+            if config.MONGO_WRITE_BEHIND:
+                get_writer().add_reviews(product_url, reviews)
+            else:
+                await asyncio.to_thread(save_reviews, product_url, reviews)
+    except Exception:
+        logger.warning("Could not persist reviews for %s", product_url, exc_info=True)
+
+
+async def crawl_and_save_reviews(
+    urls: List[str], max_pages: Optional[int] = None, concurrency: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Crawl the reviews of many products, persisting each page's reviews as
+    it comes in rather than once at the end. Returns per product (in input
+    order) the pages and reviews collected, and the error that stopped its
+    crawl, if any.
+    """
+    summary = {url: {"url": url, "pages": 0, "reviews": 0} for url in urls}
+    async for event in crawl_reviews(list(summary), max_pages, concurrency):
+        entry = summary[event["product_url"]]
+        if "error" in event:
+            entry["error"] = f"{event['page_url']}: {event['error']}"
+            continue
+        entry["pages"] += 1
+        entry["reviews"] += len(event["reviews"])
+        if event["reviews"]:
+            await _persist_reviews(event["product_url"], event["reviews"])
+    products = list(summary.values())
+    return {
+        "products": products,
+        "reviews": sum(p["reviews"] for p in products),
+        "failed": sum(1 for p in products if "error" in p),
+    }
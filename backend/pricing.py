@@ -0,0 +1,369 @@
+"""
+Price normalization.
+
+One parser for every price the scrapers see, from ``19.99`` to
+``1.299,00 €``, ``Rs. 1,29,999`` or ``Sale $19.99 Regular $29.99``:
+
+- Numbers are found with precompiled patterns. Grouping and decimal
+  separators are told apart per number: with both ``.`` and ``,`` the last
+  one is the decimal separator. A lone separator followed by exactly three
+  digits is the page locale's decimal separator if it is that (``12.500``
+  is 12.5 on an English page and 12500 on a German one), and otherwise
+  groups thousands, unless the currency has three minor digits (KWD, BHD,
+  ...). Without a locale, ``.`` is the decimal separator and ``,`` groups.
+  Spaces, no-break spaces and apostrophes group thousands (``1 299,00``,
+  ``1'299.50``). Numbers whose groups do not fit a grouping (``1.2.3``,
+  dates such as ``10.05.2024``) are ambiguous and skipped.
+- The currency comes from symbols (``€``, ``£``, ``₹``, ``R$``, ``kr``...)
+  or ISO codes next to the number. Ambiguous symbols (``$``, ``¥``,
+  ``kr``) and bare numbers are resolved with the page's locale, e.g.
+  ``<html lang="en-CA">`` makes ``$`` CAD. :func:`page_locale` reads it and
+  :func:`using_locale` applies it to the parsing done in a block.
+- When a text holds several prices (sale and list price, or a range), the
+  lowest is the price and the highest is returned as ``list_price``.
+  Savings ("Save $10", "20% off") are skipped, and so are bare numbers
+  when some price carries a currency.
+
+Machine-readable prices (schema.org ``price`` in JSON-LD or microdata
+``content``) always use ``.`` as the decimal separator; :func:`parse_decimal`
+reads them without any of the above.
+
+Results are memoized per (text, locale). :func:`parse_many` and
+:func:`amounts` parse whole columns, each distinct text once.
+"""
+import contextvars
+import math
+import re
+from array import array
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from backend import config
+
+# Symbol / marker -> ISO 4217 code; None = depends on the locale (_AMBIGUOUS)
+SYMBOLS: Dict[str, Optional[str]] = {
+    "US$": "USD", "CA$": "CAD", "C$": "CAD", "AU$": "AUD", "A$": "AUD",
+    "NZ$": "NZD", "HK$": "HKD", "S$": "SGD", "MX$": "MXN", "R$": "BRL",
+    "CN¥": "CNY", "RMB": "CNY", "元": "CNY", "円": "JPY",
+    "€": "EUR", "£": "GBP", "₹": "INR", "Rs.": "INR", "Rs": "INR",
+    "₩": "KRW", "₽": "RUB", "₺": "TRY", "₫": "VND", "฿": "THB", "₱": "PHP",
+    "₪": "ILS", "₦": "NGN", "₴": "UAH", "zł": "PLN", "Kč": "CZK", "Ft": "HUF",
+    "lei": "RON", "CHF": "CHF", "Fr.": "CHF", "RM": "MYR", "Rp": "IDR",
+    "AED": "AED", "SAR": "SAR", "KD": "KWD",
+    "$": None, "¥": None, "kr": None, "kr.": None,
+}
+
+# ISO codes recognized when written out ("EUR 19,99", "19.99 USD")
+CODES = (
+    "USD", "EUR", "GBP", "INR", "JPY", "CNY", "CAD", "AUD", "NZD", "HKD", "SGD",
+    "CHF", "SEK", "NOK", "DKK", "ISK", "PLN", "CZK", "HUF", "RON", "BGN", "TRY",
+    "RUB", "UAH", "BRL", "MXN", "ARS", "CLP", "COP", "PEN", "ZAR", "NGN", "KES",
+    "EGP", "AED", "SAR", "QAR", "KWD", "BHD", "OMR", "JOD", "ILS", "KRW", "TWD",
+    "THB", "VND", "PHP", "IDR", "MYR", "PKR", "BDT", "LKR",
+)
+
+# Currencies whose minor unit is not 2 digits
+MINOR_DIGITS = {
+    "JPY": 0, "KRW": 0, "VND": 0, "CLP": 0, "ISK": 0, "IDR": 0,
+    "KWD": 3, "BHD": 3, "OMR": 3, "JOD": 3, "TND": 3, "LYD": 3, "IQD": 3,
+}
+
+# Ambiguous symbol -> {language or language-region: code}, plus a default
+_AMBIGUOUS: Dict[str, Dict[str, Optional[str]]] = {
+    "$": {
+        "en-ca": "CAD", "fr-ca": "CAD", "en-au": "AUD", "en-nz": "NZD",
+        "es-mx": "MXN", "en-hk": "HKD", "zh-hk": "HKD", "en-sg": "SGD",
+        "es-ar": "ARS", "es-cl": "CLP", "es-co": "COP", "zh-tw": "TWD",
+        "": "USD",
+    },
+    "¥": {"zh": "CNY", "": "JPY"},
+    "kr": {"sv": "SEK", "da": "DKK", "nb": "NOK", "nn": "NOK", "no": "NOK", "is": "ISK", "": None},
+}
+_AMBIGUOUS["kr."] = _AMBIGUOUS["kr"]
+
+# Region (or language, for single-country ones) -> currency of bare numbers
+_LOCALE_CURRENCY = {
+    "us": "USD", "gb": "GBP", "uk": "GBP", "ie": "EUR", "in": "INR", "ca": "CAD",
+    "au": "AUD", "nz": "NZD", "sg": "SGD", "hk": "HKD", "jp": "JPY", "ja": "JPY",
+    "cn": "CNY", "tw": "TWD", "kr": "KRW", "ko": "KRW", "de": "EUR", "at": "EUR",
+    "fr": "EUR", "es": "EUR", "it": "EUR", "nl": "EUR", "be": "EUR", "pt": "EUR",
+    "fi": "EUR", "gr": "EUR", "ch": "CHF", "se": "SEK", "sv": "SEK", "no": "NOK",
+    "nb": "NOK", "dk": "DKK", "da": "DKK", "pl": "PLN", "cz": "CZK", "cs": "CZK",
+    "hu": "HUF", "ro": "RON", "tr": "TRY", "ru": "RUB", "ua": "UAH", "uk-ua": "UAH",
+    "br": "BRL", "mx": "MXN", "ar": "ARS", "za": "ZAR", "ae": "AED", "sa": "SAR",
+    "il": "ILS", "he": "ILS", "th": "THB", "vn": "VND", "vi": "VND", "ph": "PHP",
+    "id": "IDR", "my": "MYR",
+}
+
+# Locale (or its language) -> decimal separator of the numbers it writes
+_DECIMAL_SEPARATOR = {
+    "en": ".", "ja": ".", "zh": ".", "ko": ".", "th": ".", "he": ".", "hi": ".",
+    "ms": ".", "tl": ".", "fil": ".", "de-ch": ".", "fr-ch": ".", "it-ch": ".",
+    "es-mx": ".", "es-us": ".",
+    "de": ",", "fr": ",", "es": ",", "it": ",", "pt": ",", "nl": ",", "pl": ",",
+    "cs": ",", "sk": ",", "ru": ",", "uk": ",", "tr": ",", "sv": ",", "da": ",",
+    "nb": ",", "nn": ",", "no": ",", "fi": ",", "is": ",", "hu": ",", "ro": ",",
+    "bg": ",", "el": ",", "hr": ",", "sl": ",", "sr": ",", "lt": ",", "lv": ",",
+    "et": ",", "id": ",", "vi": ",",
+}
+
+
+def _marker_pattern() -> str:
+    markers = []
+    for marker in sorted(list(SYMBOLS) + list(CODES), key=len, reverse=True):
+        escaped = re.escape(marker)
+        # Letters must stand alone: "kr" but not "kraft", "RM" but not "RMB"
+        if marker[0].isalpha():
+            escaped = r"(?<![^\W\d_])" + escaped
+        if marker[-1].isalpha():
+            escaped += r"(?![^\W\d_])"
+        markers.append(escaped)
+    return "|".join(markers)
+
+
+_MARKER = _marker_pattern()
+
+# A number with optional currency before / after it
+_PRICE_RE = re.compile(
+    rf"(?:(?P<pre>{_MARKER})\s*)?"
+    r"(?P<num>\d{1,3}(?:[ \u00a0\u202f']\d{3})+(?:[.,]\d+)?(?!\d)|\d[\d.,]*\d|\d)"
+    # ...but not the marker of the next price: "£30.00 £40.00"
+    rf"(?:\s*(?P<post>{_MARKER})(?!\s*\d))?"
+)
+_SAVING_BEFORE_RE = re.compile(r"(?:save|saving|savings|discount)\W{0,3}$", re.I)
+_SAVING_AFTER_RE = re.compile(r"\s*(?:%|off\b|percent)", re.I)
+# Between the two ends of a range: "10 - 20 €", "$10 to $20"
+_RANGE_RE = re.compile(r"\s*(?:-|–|—|to|bis|à|a)\s*", re.I)
+# Bare "19.99" (most JSON-LD prices): no marker, no separator to decide on
+_PLAIN_RE = re.compile(r"\d+(?:\.\d{1,2})?")
+# A machine-readable decimal: "12.500", "1299", ".5"
+_DECIMAL_RE = re.compile(r"\s*(\d*\.?\d+)\s*")
+_GROUPING_RE = re.compile(r"[ \u00a0\u202f']")
+_LANG_RE = re.compile(r"<html\b[^>]*?\blang\s*=\s*[\"']?([A-Za-z]{2,3}(?:[-_][A-Za-z0-9]{2,8})?)", re.I)
+
+
+class Price:
+    """A parsed price. Shared through the memo: treat it as read-only."""
+
+    __slots__ = ("amount", "currency", "list_price", "text")
+
+    def __init__(
+        self,
+        amount: float,
+        currency: Optional[str] = None,
+        list_price: Optional[float] = None,
+        text: Optional[str] = None,
+    ):
+        self.amount = amount  # 0.0 when no price was found
+        self.currency = currency
+        self.list_price = list_price  # the higher of two prices, if any
+        self.text = text  # the matched price, e.g. "$19.99"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Price) and (
+            (self.amount, self.currency, self.list_price, self.text)
+            == (other.amount, other.currency, other.list_price, other.text)
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Price({self.amount!r}, {self.currency!r}, "
+            f"list_price={self.list_price!r}, text={self.text!r})"
+        )
+
+
+NO_PRICE = Price(0.0)
+
+# Locale used by parse() when none is passed (see using_locale)
+_locale: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar(
+    "price_locale", default=None
+)
+
+
+def page_locale(html: str) -> Optional[str]:
+    """Normalized ``lang`` of a page's ``<html>`` tag, e.g. ``"en-ca"``."""
+    m = _LANG_RE.search(html, 0, 4096)
+    return m.group(1).lower().replace("_", "-") if m else None
+
+
+@contextmanager
+def using_locale(locale: Optional[str]) -> Iterator[None]:
+    """Resolve currencies with ``locale`` for parsing done in the block."""
+    token = _locale.set(locale)
+    try:
+        yield
+    finally:
+        _locale.reset(token)
+
+
+def _resolve(marker: Optional[str], locale: Optional[str]) -> Optional[str]:
+    if marker is None:
+        if not locale:
+            return None
+        lang, _, region = locale.partition("-")
+        return _LOCALE_CURRENCY.get(locale) or _LOCALE_CURRENCY.get(region) or (
+            _LOCALE_CURRENCY.get(lang) if not region else None
+        )
+    if marker in SYMBOLS and SYMBOLS[marker] is not None:
+        return SYMBOLS[marker]
+    if marker in _AMBIGUOUS:
+        by_locale = _AMBIGUOUS[marker]
+        if locale:
+            lang = locale.partition("-")[0]
+            if locale in by_locale:
+                return by_locale[locale]
+            if lang in by_locale:
+                return by_locale[lang]
+            # Canadian / Australian... stores in other languages
+            region = locale.partition("-")[2]
+            for key, code in by_locale.items():
+                if region and key.endswith("-" + region):
+                    return code
+        return by_locale[""]
+    return marker  # ISO code
+
+
+def _grouped(parts: List[str]) -> str:
+    """Digits of ``1,299,999`` or ``1,29,999`` split on the grouping separator."""
+    middle = {len(part) for part in parts[1:-1]}
+    if not 1 <= len(parts[0]) <= 3 or len(parts[-1]) != 3 or len(middle) > 1 or middle - {2, 3}:
+        raise ValueError(f"ambiguous number: {'?'.join(parts)}")
+    return "".join(parts)
+
+
+def _decimal_separator(locale: Optional[str]) -> Optional[str]:
+    if not locale:
+        return None
+    return _DECIMAL_SEPARATOR.get(locale) or _DECIMAL_SEPARATOR.get(locale.partition("-")[0])
+
+
+def _amount(number: str, minor_digits: int, decimal: Optional[str] = None) -> float:
+    """
+    Value of a matched number, deciding which separator is the decimal one.
+    ``decimal`` is the locale's decimal separator, if known. Raises
+    ValueError when the separators do not say.
+    """
+    s = _GROUPING_RE.sub("", number)
+    dots, commas = s.count("."), s.count(",")
+    if not dots and not commas:
+        return float(s)
+    if dots and commas:
+        # 1,299.00 / 1.299,00: the last separator is the decimal one, and
+        # the only one of its kind
+        decimal = "." if s.rfind(".") > s.rfind(",") else ","
+        group = "," if decimal == "." else "."
+        head, _, tail = s.partition(decimal)
+        if decimal in tail:
+            raise ValueError(f"ambiguous number: {number}")
+        return float(_grouped(head.split(group)) + "." + tail)
+    separator = "." if dots else ","
+    parts = s.split(separator)
+    if len(parts) > 2:
+        # 1.299.000 / 1,29,999 group thousands
+        return float(_grouped(parts))
+    head, tail = parts
+    # 1,299 groups thousands; 19,99 / 1.5 do not, nor does 1.299 in a
+    # currency with three minor digits or where "." is the decimal separator
+    if len(tail) == 3 and minor_digits != 3 and separator != (decimal or "."):
+        return float(_grouped(parts))
+    return float((head or "0") + "." + tail)
+
+
+@lru_cache(maxsize=config.PRICE_CACHE_SIZE)
+def _parse(text: str, locale: Optional[str]) -> Price:
+    if _PLAIN_RE.fullmatch(text):
+        return Price(float(text), _resolve(None, locale), None, text)
+    matches = [
+        m for m in _PRICE_RE.finditer(text)
+        if not _SAVING_BEFORE_RE.search(text, max(0, m.start() - 12), m.start())
+        and not _SAVING_AFTER_RE.match(text, m.end("num"))
+    ]
+    markers = [m.group("pre") or m.group("post") for m in matches]
+    spans = [m.span() for m in matches]
+    # The low end of "1,299 - 1,599 ₹" takes the currency of the high end,
+    # and its text is the whole range
+    for i in range(len(matches) - 1):
+        if markers[i] is None and markers[i + 1] is not None and _RANGE_RE.fullmatch(
+            text, matches[i].end(), matches[i + 1].start()
+        ):
+            markers[i] = markers[i + 1]
+            spans[i] = (spans[i][0], spans[i + 1][1])
+
+    decimal = _decimal_separator(locale)
+    found = []  # (amount, currency, has_marker, matched text)
+    for m, marker, (start, end) in zip(matches, markers, spans):
+        currency = _resolve(marker, locale)
+        try:
+            amount = _amount(
+                m.group("num"),
+                MINOR_DIGITS.get(currency or "", 2),
+                decimal,
+            )
+        except ValueError:
+            continue
+        if math.isfinite(amount):
+            found.append((amount, currency, marker is not None, text[start:end].strip()))
+
+    if any(has_marker for _, _, has_marker, _ in found):
+        found = [f for f in found if f[2]]
+    if not found:
+        return NO_PRICE
+    amount, currency, _, matched = min(found, key=lambda f: f[0])
+    highest = max(f[0] for f in found)
+    return Price(amount, currency, highest if highest > amount else None, matched)
+
+
+def parse(value, locale: Optional[str] = None) -> Price:
+    """
+    Parse one price text (numbers are taken as they are). ``locale``
+    defaults to the one set with :func:`using_locale`.
+    """
+    if value is None:
+        return NO_PRICE
+    if locale is None:
+        locale = _locale.get()
+    if type(value) is int or type(value) is float:
+        return Price(float(value), _resolve(None, locale)) if math.isfinite(value) else NO_PRICE
+    try:
+        return _parse(str(value), locale)
+    except TypeError:
+        return NO_PRICE
+
+
+def parse_decimal(value, locale: Optional[str] = None) -> Price:
+    """
+    Parse a machine-readable price, where ``.`` is always the decimal
+    separator. Anything else (a price text where a number was expected) is
+    left to :func:`parse`.
+    """
+    if isinstance(value, str):
+        m = _DECIMAL_RE.fullmatch(value)
+        if m:
+            if locale is None:
+                locale = _locale.get()
+            return Price(float(m.group(1)), _resolve(None, locale), None, m.group(1))
+    return parse(value, locale)
+
+
+def parse_many(values: Iterable, locale: Optional[str] = None) -> List[Price]:
+    """:func:`parse` over a column, parsing each distinct value once."""
+    if locale is None:
+        locale = _locale.get()
+    seen: Dict = {}
+    out = []
+    for value in values:
+        try:
+            price = seen.get(value)
+        except TypeError:  # unhashable
+            out.append(parse(value, locale))
+            continue
+        if price is None:
+            price = seen[value] = parse(value, locale)
+        out.append(price)
+    return out
+
+
+def amounts(values: Iterable, locale: Optional[str] = None) -> array:
+    """Amounts of a column of prices (0.0 where none was found)."""
+    return array("d", (p.amount for p in parse_many(values, locale)))
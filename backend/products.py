@@ -0,0 +1,306 @@
+"""
+Compact product records.
+
+Scrapers used to hand around one dict per product with every field as a
+string ("4.5", "N/A"), and analysis, persistence and the result store
+parsed the numbers back out again. Here numbers are parsed once, when a
+product is extracted:
+
+- :class:`Product` is a ``__slots__`` record with the numeric ``price``,
+  ``rating`` and ``reviews`` next to the original price text, and the
+  price's currency and list price as found by ``backend.pricing``. It is
+  also a read-only mapping that presents the JSON / MongoDB form of the
+  product (``{"title", "price", "availability", "rating", "reviews",
+  "currency", "list_price", "url"}`` with "N/A" placeholders), so code
+  written against product dicts keeps working. ``url`` is the product's
+  page, where its reviews are crawled from.
+- :class:`ProductBatch` holds many products in columns: the numbers in
+  typed arrays (usable by NumPy without copying) and the repetitive price
+  and availability texts interned per batch. Large crawls are collected
+  into one.
+
+:func:`to_dicts` converts either to plain dicts at the API boundary.
+"""
+import math
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from backend import pricing
+from backend.pricing import Price
+
+# Placeholders of the JSON form for missing values
+MISSING = "N/A"
+UNKNOWN_TITLE = "Unknown title"
+UNKNOWN_AVAILABILITY = "Unknown"
+
+FIELDS = ("title", "price", "availability", "rating", "reviews", "currency", "list_price", "url")
+
+
+def to_float(value, default: float = 0.0) -> float:
+    try:
+        if value is None:
+            return default
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return default
+
+
+def to_int(value, default: int = 0) -> int:
+    try:
+        if value is None:
+            return default
+        return int(float(str(value).strip()))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_price(value) -> float:
+    """Amount of a price text (see ``backend.pricing``); 0.0 if there is none."""
+    return pricing.parse(value).amount
+
+
+def _optional(value: Any, parse, default=None):
+    # None for missing / placeholder / unparsable values
+    if value is None or value == MISSING:
+        return default
+    if type(value) is int or type(value) is float:
+        return parse(value, None) if math.isfinite(value) else default
+    parsed = parse(value, None)
+    if parsed is None or (isinstance(parsed, float) and math.isnan(parsed)):
+        return default
+    return parsed
+
+
+class Product(Mapping):
+    """One product, with its numbers parsed."""
+
+    __slots__ = (
+        "title", "price_text", "availability", "price", "rating", "reviews",
+        "currency", "list_price", "url",
+    )
+
+    def __init__(
+        self,
+        title: str,
+        price_text: Optional[str],
+        availability: Optional[str],
+        price: float,
+        rating: Optional[float],
+        reviews: Optional[int],
+        currency: Optional[str] = None,
+        list_price: Optional[float] = None,
+        url: Optional[str] = None,
+    ):
+        self.title = title
+        self.price_text = price_text
+        self.availability = availability
+        self.price = price  # 0.0 when the price text has no number
+        self.rating = rating  # 0-5 scale
+        self.reviews = reviews
+        self.currency = currency  # ISO 4217 code, None if unknown
+        self.list_price = list_price  # regular price next to a sale price
+        self.url = url  # the product's own page
+
+    @classmethod
+    def from_raw(
+        cls,
+        title: Optional[str] = None,
+        price: Any = None,
+        availability: Optional[str] = None,
+        rating: Any = None,
+        reviews: Any = None,
+        parsed: Optional[Price] = None,
+        url: Optional[str] = None,
+    ) -> "Product":
+        """
+        Build from extracted values (text or numbers, None if absent).
+        ``parsed`` is the price already parsed by the caller.
+        """
+        price_text = None if price is None or price == MISSING else str(price)
+        if parsed is None:
+            parsed = pricing.parse(price_text) if price_text else pricing.NO_PRICE
+        return cls(
+            title or UNKNOWN_TITLE,
+            price_text,
+            availability or None,
+            parsed.amount,
+            _optional(rating, to_float),
+            _optional(reviews, to_int),
+            parsed.currency,
+            parsed.list_price,
+            None if url is None or url == MISSING else str(url),
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Product":
+        """Inverse of :meth:`to_dict` (also accepts older string-valued dicts)."""
+        if isinstance(data, Product):
+            return data
+        product = cls.from_raw(
+            data.get("title"),
+            data.get("price"),
+            None if data.get("availability") == UNKNOWN_AVAILABILITY else data.get("availability"),
+            data.get("rating"),
+            data.get("reviews"),
+            url=data.get("url") or data.get("link"),
+        )
+        # Stored values win over what the price text alone says
+        currency = data.get("currency")
+        if currency and currency != MISSING:
+            product.currency = str(currency)
+        if "list_price" in data:
+            product.list_price = _optional(data["list_price"], to_float)
+        return product
+
+    def numbers(self) -> Tuple[float, int, float]:
+        """``(rating, reviews, price)`` with 0 for missing values."""
+        return (
+            self.rating if self.rating is not None else 0.0,
+            self.reviews if self.reviews is not None else 0,
+            self.price,
+        )
+
+    def to_dict(self) -> Dict[str, str]:
+        """JSON / MongoDB form."""
+        return {
+            "title": self.title,
+            "price": self.price_text or MISSING,
+            "availability": self.availability or UNKNOWN_AVAILABILITY,
+            "rating": MISSING if self.rating is None else str(self.rating),
+            "reviews": MISSING if self.reviews is None else str(self.reviews),
+            "currency": self.currency or MISSING,
+            "list_price": MISSING if self.list_price is None else str(self.list_price),
+            "url": self.url or MISSING,
+        }
+
+    def __getitem__(self, key: str) -> str:
+        if key == "title":
+            return self.title
+        if key == "price":
+            return self.price_text or MISSING
+        if key == "availability":
+            return self.availability or UNKNOWN_AVAILABILITY
+        if key == "rating":
+            return MISSING if self.rating is None else str(self.rating)
+        if key == "reviews":
+            return MISSING if self.reviews is None else str(self.reviews)
+        if key == "currency":
+            return self.currency or MISSING
+        if key == "list_price":
+            return MISSING if self.list_price is None else str(self.list_price)
+        if key == "url":
+            return self.url or MISSING
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __repr__(self) -> str:
+        return f"Product({self.to_dict()!r})"
+
+
+class ProductBatch:
+    """
+    Products stored column-wise. Missing ratings and list prices are NaN and
+    missing review counts -1 in the arrays; indexing and iteration yield
+    :class:`Product`.
+
+    ``complete`` is True when the batch holds a store's whole listing (a
+    crawl that reached its end), so products missing from it can be taken
+    as removed from the store.
+    """
+
+    def __init__(self, products: Iterable[Union[Product, Dict[str, Any]]] = ()):
+        self.titles: List[str] = []
+        self.price_texts: List[Optional[str]] = []
+        self.availability: List[Optional[str]] = []
+        self.prices = array("d")
+        self.ratings = array("d")
+        self.reviews = array("q")
+        self.currencies: List[Optional[str]] = []
+        self.list_prices = array("d")
+        self.urls: List[Optional[str]] = []
+        self._strings: Dict[str, str] = {}
+        self.complete = False
+        self.extend(products)
+
+    def append(self, product: Union[Product, Dict[str, Any]]) -> None:
+        self.extend((product,))
+
+    def extend(self, products: Iterable[Union[Product, Dict[str, Any]]]) -> "ProductBatch":
+        # Column by column: one pass per column is much cheaper than eight
+        # appends per product
+        items = [Product.from_dict(p) for p in products]
+        intern = self._strings.setdefault
+        self.titles.extend([p.title for p in items])
+        self.price_texts.extend([p.price_text and intern(p.price_text, p.price_text) for p in items])
+        self.availability.extend([p.availability and intern(p.availability, p.availability) for p in items])
+        self.prices.extend([p.price for p in items])
+        self.ratings.extend([math.nan if p.rating is None else p.rating for p in items])
+        self.reviews.extend([-1 if p.reviews is None else p.reviews for p in items])
+        self.currencies.extend([p.currency and intern(p.currency, p.currency) for p in items])
+        self.list_prices.extend([math.nan if p.list_price is None else p.list_price for p in items])
+        self.urls.extend([p.url for p in items])
+        return self
+
+    def _product(self, i: int) -> Product:
+        rating = self.ratings[i]
+        reviews = self.reviews[i]
+        list_price = self.list_prices[i]
+        return Product(
+            self.titles[i],
+            self.price_texts[i],
+            self.availability[i],
+            self.prices[i],
+            None if math.isnan(rating) else rating,
+            None if reviews < 0 else reviews,
+            self.currencies[i],
+            None if math.isnan(list_price) else list_price,
+            self.urls[i],
+        )
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Product, "ProductBatch"]:
+        if isinstance(index, slice):
+            return ProductBatch(self._product(i) for i in range(len(self))[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("product index out of range")
+        return self._product(index)
+
+    def __iter__(self) -> Iterator[Product]:
+        for i in range(len(self)):
+            yield self._product(i)
+
+    def __bool__(self) -> bool:
+        return bool(self.titles)
+
+    def to_dicts(self) -> List[Dict[str, str]]:
+        return [p.to_dict() for p in self]
+
+
+def review_keys(product: Mapping) -> List[str]:
+    """
+    Names a product's stored reviews may be filed under, most specific
+    first: its page URL (review crawls file reviews by product URL), then
+    its title (the name ``mongo_db.save_reviews`` was historically called
+    with).
+    """
+    keys = []
+    for field in ("url", "link", "title"):
+        value = product.get(field)
+        if value and value not in (MISSING, UNKNOWN_TITLE):
+            keys.append(str(value))
+    return keys
+
+
+def to_dicts(products: Iterable[Union[Product, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """JSON form of ``products`` (dicts are passed through as they are)."""
+    return [p.to_dict() if isinstance(p, Product) else p for p in products]
@@ -0,0 +1,194 @@
+"""
+On-demand profiling of single API requests.
+
+A profiled request runs under :func:`profile`. Two profiles are captured.
+
+- A wall-clock sampling profile. Every ``PROFILING_INTERVAL`` seconds, the
+  stack of each thread currently executing ``backend`` code is recorded.
+  This includes crawl pages parsed in worker threads. It is saved in the
+  collapsed ("folded") stack format that ``flamegraph.pl``, speedscope and
+  inferno read.
+- A deterministic cProfile of the request thread, saved as a pstats file
+  (``python -m pstats``, snakeviz). It also covers C calls such as regex
+  matching and lxml/selectolax selectors, which the sampler cannot see.
+
+Profiles are kept in ``PROFILING_DIR``; only the newest
+``PROFILING_MAX_KEPT`` are retained. Samples come from every thread that
+runs backend code, so concurrent requests show up in each other's
+flamegraphs. Profile one request at a time; the profiler enforces this.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from backend import config
+
+# File suffix per download format
+FORMATS = {"collapsed": ".collapsed", "pstats": ".prof"}
+
+# Only one profile at a time: cProfile cannot run in two threads at once
+# on Python 3.12+, and overlapping samplers would double count
+_busy = threading.Lock()
+
+
+class ProfilingUnavailable(Exception):
+    """Profiling is disabled, not authorized, or already running."""
+
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{frame.f_globals.get('__name__', '?')}:{name}:{code.co_firstlineno}"
+
+
+class Sampler:
+    """Collect wall-clock stack samples of threads running ``backend`` code."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack: List[str] = []
+                relevant = False
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    relevant = relevant or frame.f_globals.get("__name__", "").startswith("backend.")
+                    frame = frame.f_back
+                # Idle pool threads and the event loop waiting in select()
+                if not relevant:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def check_access(flag: Optional[str]) -> bool:
+    """
+    Whether a request asked for profiling (``?profile=`` or ``X-Profile``).
+    Raises :class:`ProfilingUnavailable` if it did but may not.
+    """
+    if not flag or flag.lower() in ("0", "false", "no"):
+        return False
+    if not config.PROFILING_ENABLED:
+        raise ProfilingUnavailable("profiling is disabled (PROFILING_ENABLED)")
+    if config.PROFILING_TOKEN and flag != config.PROFILING_TOKEN:
+        raise ProfilingUnavailable("invalid profiling token")
+    return True
+
+
+class Profile:
+    def __init__(self, label: str):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.started = time.time()
+        self.duration = 0.0
+        self.samples = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "started": self.started,
+            "duration_ms": round(self.duration * 1000, 1),
+            "samples": self.samples,
+        }
+
+
+@contextmanager
+def profile(label: str) -> Iterator[Profile]:
+    """Profile the ``with`` block and save the result under ``Profile.id``."""
+    if not _busy.acquire(blocking=False):
+        raise ProfilingUnavailable("another request is being profiled")
+    try:
+        prof = Profile(label)
+        sampler = Sampler(config.PROFILING_INTERVAL).start()
+        cprof = cProfile.Profile()
+        started = time.perf_counter()
+        cprof.enable()
+        try:
+            yield prof
+        finally:
+            cprof.disable()
+            prof.duration = time.perf_counter() - started
+            sampler.stop()
+            prof.samples = sampler.samples
+            _save(prof, sampler, cprof)
+    finally:
+        _busy.release()
+
+
+def _path(profile_id: str, suffix: str) -> str:
+    return os.path.join(config.PROFILING_DIR, profile_id + suffix)
+
+
+def _save(prof: Profile, sampler: Sampler, cprof: cProfile.Profile) -> None:
+    os.makedirs(config.PROFILING_DIR, exist_ok=True)
+    with open(_path(prof.id, FORMATS["collapsed"]), "w", encoding="utf-8") as f:
+        f.write(sampler.collapsed())
+    cprof.dump_stats(_path(prof.id, FORMATS["pstats"]))
+    with open(_path(prof.id, ".json"), "w", encoding="utf-8") as f:
+        json.dump(prof.to_dict(), f)
+    _prune()
+
+
+def _prune() -> None:
+    for old in list_profiles()[config.PROFILING_MAX_KEPT:]:
+        for suffix in list(FORMATS.values()) + [".json"]:
+            try:
+                os.remove(_path(old["id"], suffix))
+            except OSError:
+                pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Metadata of the stored profiles, newest first."""
+    if not os.path.isdir(config.PROFILING_DIR):
+        return []
+    found = []
+    for name in os.listdir(config.PROFILING_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(config.PROFILING_DIR, name), encoding="utf-8") as f:
+                found.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(found, key=lambda p: p["started"], reverse=True)
+
+
+def profile_path(profile_id: str, fmt: str) -> Optional[str]:
+    """File of a stored profile in ``fmt`` (see ``FORMATS``), if it exists."""
+    if fmt not in FORMATS or not profile_id.isalnum():
+        return None
+    path = _path(profile_id, FORMATS[fmt])
+    return path if os.path.exists(path) else None
@@ -1,29 +1,152 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Mapping, Optional, Tuple
+import hashlib
+import heapq
+import itertools
+import json
+import math
 import statistics
+from functools import lru_cache
 
+from backend import analysis_cache, config, metrics
+from backend.products import (
+    Product,
+    ProductBatch,
+    parse_price as _parse_price,
+    review_keys as _review_keys,
+    to_float as _to_float,
+    to_int as _to_int,
+)
 
-def _to_float(value, default: float = 0.0) -> float:
-    try:
-        if value is None:
-            return default
-        return float(str(value).strip())
-    except (TypeError, ValueError):
-        return default
+# Thresholds and weights used by the heuristics below. Cached analyses are
+# keyed on these values (and on SCORING_VERSION), so editing them
+# invalidates earlier results automatically.
+SCORING_CONFIG: Dict[str, Any] = {
+    # engagement score = rating * (1 + reviews / review_weight)
+    "review_weight": 10.0,
+    # with review features: score *= 1 + review_sentiment_weight * sentiment
+    # * n / (n + review_sentiment_prior), n = recency-weighted review count
+    "review_sentiment_weight": 0.3,
+    "review_sentiment_prior": 5.0,
+    "top_products": 5,
+    "ad_captions": 3,
+    "high_avg_price": 80,
+    "high_ticket_price": 100,
+    "strong_avg_rating": 4.2,
+    "bestseller_rating": 4.5,
+    "bestseller_reviews": 20,
+    "traction_rating": 4.0,
+    "traction_reviews": 5,
+}
+
+# Bump when a change to the scoring code (or to the number parsing in
+# backend.products / backend.pricing) changes analysis results: cached
+# analyses, including those shared through MongoDB, are keyed on it.
+SCORING_VERSION = 1
+
+
+def scoring_fingerprint(cfg: Optional[Dict[str, Any]] = None) -> str:
+    """Identify the scoring rules (config values + version) for cache keys."""
+    payload = json.dumps([cfg or SCORING_CONFIG, SCORING_VERSION], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# (rating, reviews, product) of a product picked for promotion
+TopProduct = Tuple[float, int, Dict[str, Any]]
+
+# Review feature summaries by product (see backend.review_features.lookup)
+ReviewFeatures = Mapping[str, Dict[str, Any]]
+
+
+def review_summary(p: Dict[str, Any], review_features: ReviewFeatures) -> Optional[Dict[str, Any]]:
+    for key in _review_keys(p):
+        summary = review_features.get(key)
+        if summary:
+            return summary
+    return None
 
 
-def _to_int(value, default: int = 0) -> int:
+def review_factor(p: Dict[str, Any], review_features: ReviewFeatures, cfg: Dict[str, Any]) -> float:
+    """
+    Multiplier of a product's engagement score from its review sentiment
+    (1.0 without features). Few or old reviews move it less.
+    """
+    summary = review_summary(p, review_features)
+    if not summary:
+        return 1.0
+    n = summary.get("weighted_reviews") or 0.0
+    confidence = n / (n + cfg["review_sentiment_prior"]) if n > 0 else 0.0
+    return 1.0 + cfg["review_sentiment_weight"] * (summary.get("sentiment") or 0.0) * confidence
+
+
+def _features_fingerprint(fingerprint: str, review_features: Optional[ReviewFeatures]) -> str:
+    if not review_features:
+        return fingerprint
+    payload = fingerprint + json.dumps(review_features, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=config.ENRICHED_ROW_CACHE_SIZE)
+def _enrich_values(rating: Any, reviews: Any, price: Any) -> Tuple[float, int, float]:
+    return _to_float(rating, 0.0), _to_int(reviews, 0), _parse_price(price)
+
+
+def _enrich(p: Dict[str, Any]) -> Tuple[float, int, float]:
+    """
+    Numeric ``(rating, reviews, price)`` of a product. :class:`Product`
+    records carry them already; dict rows are parsed and memoized on their
+    raw values, so re-analyzing a store whose products are mostly unchanged
+    skips re-parsing them.
+    """
+    if type(p) is Product:
+        return p.numbers()
+    raw = (p.get("rating"), p.get("reviews"), p.get("price", ""))
     try:
-        if value is None:
-            return default
-        return int(float(str(value).strip()))
-    except (TypeError, ValueError):
-        return default
+        return _enrich_values(*raw)
+    except TypeError:
+        # Unhashable raw value (e.g. a list)
+        return _enrich_values.__wrapped__(*raw)
+
+
+def _empty_insights() -> Dict[str, Any]:
+    return {
+        "summary": {"message": "No products found for analysis."},
+        "top_products": [],
+        "platform_recommendations": [],
+        "discount_suggestions": [],
+        "ad_captions": [],
+    }
 
 
-def analyze_products(products: List[Dict[str, Any]], source_url: str) -> Dict[str, Any]:
+def analyze_products(
+    products: Iterable[Dict[str, Any]],
+    source_url: str,
+    use_cache: bool = True,
+    mode: str = "auto",
+    review_features: Optional[ReviewFeatures] = None,
+) -> Dict[str, Any]:
     """
     Lightweight heuristic-based analysis over scraped products.
 
+    Identical inputs (same products, URL and scoring rules) are answered
+    from ``backend.analysis_cache`` instead of being recomputed; pass
+    ``use_cache=False`` to force a fresh run. Lists of more than
+    ``ANALYSIS_CACHE_MAX_PRODUCTS`` products are never cached.
+
+    ``mode`` selects the implementation: ``"rows"`` (pure Python),
+    ``"columnar"`` (NumPy/pandas, see ``backend.recommender_columnar``) or
+    ``"auto"``, which switches to columnar from
+    ``COLUMNAR_MIN_PRODUCTS`` products when pandas is installed. Both
+    produce the same output.
+
+    ``products`` may also be a generator or other iterator; it is then
+    consumed once through :class:`IncrementalAnalyzer` (no caching).
+
+    ``review_features`` optionally maps products (by URL or title, see
+    ``backend.products.review_keys``) to their precomputed review features
+    (``backend.review_features``); their sentiment then scales the
+    engagement scores, and the top products show them. Without it the
+    output is unchanged.
+
     Returns:
         {
           "summary": {...},
@@ -33,78 +156,145 @@ def analyze_products(products: List[Dict[str, Any]], source_url: str) -> Dict[st
           "ad_captions": [...]
         }
     """
+    with metrics.stage("analyze"):
+        return _analyze_products(products, source_url, use_cache, mode, review_features)
+
+
+def _analyze_products(
+    products: Iterable[Dict[str, Any]],
+    source_url: str,
+    use_cache: bool,
+    mode: str,
+    review_features: Optional[ReviewFeatures] = None,
+) -> Dict[str, Any]:
+    if not isinstance(products, (list, tuple, ProductBatch)):
+        metrics.inc("analysis_runs_total", path="incremental")
+        analyzer = IncrementalAnalyzer(source_url, review_features=review_features)
+        return analyzer.extend(products).insights()
+
     if not products:
-        return {
-            "summary": {"message": "No products found for analysis."},
-            "top_products": [],
-            "platform_recommendations": [],
-            "discount_suggestions": [],
-            "ad_captions": [],
-        }
+        metrics.inc("analysis_runs_total", path="empty")
+        return _empty_insights()
 
-    # Compute simple numeric features
-    enriched = []
-    for p in products:
-        rating = _to_float(p.get("rating"), 0.0)  # expected 0–5
-        reviews = _to_int(p.get("reviews"), 0)
-
-        # crude price parsing: strip currency and commas
-        raw_price = str(p.get("price", "")).replace(",", "")
-        price_num = 0.0
-        for ch in raw_price:
-            if ch.isdigit() or ch in ".-":
-                continue
-        try:
-            # pull first number substring if present
-            import re
-
-            m = re.search(r"\d+(\.\d+)?", raw_price)
-            if m:
-                price_num = float(m.group(0))
-        except Exception:
-            price_num = 0.0
+    key: Optional[str] = None
+    if use_cache and len(products) <= config.ANALYSIS_CACHE_MAX_PRODUCTS:
+        fingerprint = _features_fingerprint(scoring_fingerprint(), review_features)
+        key = analysis_cache.make_key(products, source_url, fingerprint)
+        cached = analysis_cache.get(key)
+        if cached is not None:
+            metrics.inc("analysis_runs_total", path="cache")
+            return cached
 
-        # engagement / priority score
-        score = rating * (1 + reviews / 10.0)
+    if _use_columnar(mode, len(products)):
+        from backend.recommender_columnar import analyze_columnar
 
-        enriched.append(
-            {
-                **p,
-                "_rating_num": rating,
-                "_reviews_num": reviews,
-                "_price_num": price_num,
-                "_score": score,
-            }
-        )
+        metrics.inc("analysis_runs_total", path="columnar")
+        result = analyze_columnar(products, source_url, SCORING_CONFIG, review_features)
+    else:
+        metrics.inc("analysis_runs_total", path="rows")
+        result = _analyze(products, source_url, SCORING_CONFIG, review_features)
 
-    # Sort by score (best products to promote)
-    top_products = sorted(enriched, key=lambda x: x["_score"], reverse=True)[:5]
+    if key is not None:
+        analysis_cache.put(key, result)
+    return result
 
-    # Summary stats
-    ratings = [p["_rating_num"] for p in enriched if p["_rating_num"] > 0]
-    prices = [p["_price_num"] for p in enriched if p["_price_num"] > 0]
+
+def _use_columnar(mode: str, count: int) -> bool:
+    if mode == "rows":
+        return False
+    if mode == "columnar":
+        return True
+    if count < config.COLUMNAR_MIN_PRODUCTS:
+        return False
+    try:
+        import numpy  # noqa: F401
+        import pandas  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _analyze(
+    products: List[Dict[str, Any]],
+    source_url: str,
+    cfg: Dict[str, Any],
+    review_features: Optional[ReviewFeatures] = None,
+) -> Dict[str, Any]:
+    review_weight = cfg["review_weight"]
+
+    # Compute simple numeric features in a single pass
+    scored = []
+    ratings = []
+    prices = []
+    high_ticket = False
+    for p in products:
+        rating, reviews, price_num = _enrich(p)  # rating expected 0–5
+
+        if rating > 0:
+            ratings.append(rating)
+        if price_num > 0:
+            prices.append(price_num)
+        if price_num >= cfg["high_ticket_price"]:
+            high_ticket = True
+
+        # engagement / priority score
+        score = rating * (1 + reviews / review_weight)
+        if review_features:
+            score *= review_factor(p, review_features, cfg)
+        scored.append((score, rating, reviews, p))
+
+    # Best products to promote; nlargest keeps sorted()'s order for ties
+    top = heapq.nlargest(cfg["top_products"], scored, key=lambda x: x[0])
 
     avg_rating = round(statistics.mean(ratings), 2) if ratings else 0.0
     avg_price = round(statistics.mean(prices), 2) if prices else 0.0
 
+    return build_insights(
+        source_url,
+        len(products),
+        avg_rating,
+        avg_price,
+        high_ticket,
+        [(rating, reviews, p) for _, rating, reviews, p in top],
+        cfg,
+        review_features,
+    )
+
+
+def build_insights(
+    source_url: str,
+    product_count: int,
+    avg_rating: float,
+    avg_price: float,
+    high_ticket: bool,
+    top_products: List[TopProduct],
+    cfg: Dict[str, Any],
+    review_features: Optional[ReviewFeatures] = None,
+) -> Dict[str, Any]:
+    """
+    Turn the aggregate features of a product set into the insights dict.
+    ``high_ticket`` tells whether any product is priced at or above
+    ``high_ticket_price``; ``top_products`` is ranked best first. Top
+    products found in ``review_features`` list theirs.
+    """
     summary = {
         "source_url": source_url,
-        "product_count": len(products),
+        "product_count": product_count,
         "avg_rating": avg_rating,
         "avg_price": avg_price,
     }
 
     # Platform recommendations (very simple rules)
     platforms = []
-    if avg_price >= 80 or any(p["_price_num"] >= 100 for p in enriched):
+    if avg_price >= cfg["high_avg_price"] or high_ticket:
         platforms.append(
             "Instagram & Google Ads: Visual, higher-ticket products perform well here."
         )
-    if avg_price < 80:
+    if avg_price < cfg["high_avg_price"]:
         platforms.append(
             "Facebook & WhatsApp: Good for mid- to low-priced, impulse-friendly items."
         )
-    if avg_rating >= 4.2:
+    if avg_rating >= cfg["strong_avg_rating"]:
         platforms.append(
             "Email campaigns: Leverage strong reviews to upsell and cross-sell bestsellers."
         )
@@ -115,16 +305,14 @@ def analyze_products(products: List[Dict[str, Any]], source_url: str) -> Dict[st
 
     # Discount suggestions for top products
     discount_suggestions = []
-    for p in top_products:
-        rating = p["_rating_num"]
-        reviews = p["_reviews_num"]
+    for rating, reviews, p in top_products:
         title = p.get("title") or "This product"
 
-        if rating >= 4.5 and reviews >= 20:
+        if rating >= cfg["bestseller_rating"] and reviews >= cfg["bestseller_reviews"]:
             suggestion = (
                 f"{title}: bestseller — run a 5–10% limited-time discount and highlight reviews."
             )
-        elif rating >= 4.0 and reviews >= 5:
+        elif rating >= cfg["traction_rating"] and reviews >= cfg["traction_reviews"]:
             suggestion = (
                 f"{title}: good traction — try a 10–15% discount or bundle with related items."
             )
@@ -137,7 +325,7 @@ def analyze_products(products: List[Dict[str, Any]], source_url: str) -> Dict[st
 
     # Simple AI-like ad captions for top products
     ad_captions = []
-    for p in top_products[:3]:
+    for _, _, p in top_products[: cfg["ad_captions"]]:
         title = p.get("title") or "this product"
         price = p.get("price") or ""
         rating = p.get("rating") or ""
@@ -159,20 +347,124 @@ def analyze_products(products: List[Dict[str, Any]], source_url: str) -> Dict[st
             }
         )
 
+    top = []
+    for _, _, p in top_products:
+        entry = {
+            "title": p.get("title"),
+            "price": p.get("price"),
+            "rating": p.get("rating"),
+            "reviews": p.get("reviews"),
+            "availability": p.get("availability"),
+        }
+        features = review_summary(p, review_features) if review_features else None
+        if features:
+            entry["review_features"] = features
+        top.append(entry)
+
     return {
         "summary": summary,
-        "top_products": [
-            {
-                "title": p.get("title"),
-                "price": p.get("price"),
-                "rating": p.get("rating"),
-                "reviews": p.get("reviews"),
-                "availability": p.get("availability"),
-            }
-            for p in top_products
-        ],
+        "top_products": top,
         "platform_recommendations": platforms,
         "discount_suggestions": discount_suggestions,
         "ad_captions": ad_captions,
     }
 
+
+class _ExactSum:
+    """
+    Running float sum without accumulated rounding error (Shewchuk's
+    algorithm, as in ``math.fsum``), so online means match batch ones.
+    """
+
+    def __init__(self):
+        self._partials: List[float] = []
+        self.count = 0
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        i = 0
+        for y in self._partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                self._partials[i] = lo
+                i += 1
+            x = hi
+        self._partials[i:] = [x]
+
+    def mean(self) -> float:
+        return round(math.fsum(self._partials) / self.count, 2) if self.count else 0.0
+
+
+class IncrementalAnalyzer:
+    """
+    Online version of :func:`analyze_products` for product streams.
+
+    Feed products one at a time with :meth:`add` or in chunks with
+    :meth:`extend`; :meth:`insights` returns the insights dict for what has
+    been seen so far and can be called at any point. Memory stays constant:
+    only running sums, the high-ticket flag and a bounded heap of the best
+    products are kept.
+    """
+
+    def __init__(
+        self,
+        source_url: str,
+        cfg: Optional[Dict[str, Any]] = None,
+        review_features: Optional[ReviewFeatures] = None,
+    ):
+        self.source_url = source_url
+        self.cfg = cfg or SCORING_CONFIG
+        # May be filled in as products arrive: it is read on each add()
+        self.review_features = review_features
+        self.count = 0
+        self._ratings = _ExactSum()
+        self._prices = _ExactSum()
+        self._high_ticket = False
+        # min-heap of (score, -seq, rating, reviews, product); -seq makes an
+        # earlier product win ties, like the stable sort in analyze_products
+        self._top: List[Tuple[float, int, float, int, Dict[str, Any]]] = []
+        self._seq = itertools.count()
+
+    def add(self, p: Dict[str, Any]) -> None:
+        cfg = self.cfg
+        rating, reviews, price_num = _enrich(p)
+
+        self.count += 1
+        if rating > 0:
+            self._ratings.add(rating)
+        if price_num > 0:
+            self._prices.add(price_num)
+        if price_num >= cfg["high_ticket_price"]:
+            self._high_ticket = True
+
+        score = rating * (1 + reviews / cfg["review_weight"])
+        if self.review_features:
+            score *= review_factor(p, self.review_features, cfg)
+        entry = (score, -next(self._seq), rating, reviews, p)
+        if len(self._top) < cfg["top_products"]:
+            heapq.heappush(self._top, entry)
+        elif cfg["top_products"] > 0:
+            heapq.heappushpop(self._top, entry)
+
+    def extend(self, products: Iterable[Dict[str, Any]]) -> "IncrementalAnalyzer":
+        for p in products:
+            self.add(p)
+        return self
+
+    def insights(self) -> Dict[str, Any]:
+        if not self.count:
+            return _empty_insights()
+        ranked = sorted(self._top, reverse=True)
+        return build_insights(
+            self.source_url,
+            self.count,
+            self._ratings.mean(),
+            self._prices.mean(),
+            self._high_ticket,
+            [(rating, reviews, p) for _, _, rating, reviews, p in ranked],
+            self.cfg,
+            self.review_features,
+        )
@@ -0,0 +1,117 @@
+"""
+Columnar (NumPy/pandas) implementation of ``analyze_products``.
+
+Used for large catalogs: price, rating and reviews are parsed in bulk (or,
+for ``backend.products`` records, read straight from the batch's typed
+arrays), scores and summary stats are array operations, and the top-k products are
+found by partial selection (``np.partition``) instead of a full sort.
+Produces the same insights as the row-by-row path in ``backend.recommender``.
+"""
+import math
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend import pricing
+from backend.products import Product, ProductBatch
+from backend.recommender import ReviewFeatures, build_insights, review_factor
+
+
+def _parse_unique(
+    values: List[Any], parse: Callable[[pd.Series], pd.Series]
+) -> np.ndarray:
+    """
+    Parse each distinct value once and broadcast back: catalogs repeat the
+    same price / rating / review strings many times over. Missing values
+    (None) become 0.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    parsed = parse(pd.Series(uniques, dtype=object)).fillna(0.0).to_numpy(dtype=np.float64)
+    # code -1 (missing) picks the trailing 0
+    return np.append(parsed, 0.0)[codes]
+
+
+def _to_numbers(values: pd.Series) -> pd.Series:
+    return pd.to_numeric(values, errors="coerce")
+
+
+def _numeric(values: List[Any]) -> np.ndarray:
+    """Vectorized ``_to_float``: anything unparsable becomes 0."""
+    return _parse_unique(values, _to_numbers)
+
+
+def _prices(values: List[Any]) -> np.ndarray:
+    """``_parse_price`` over a column (``pricing.amounts`` parses each text once)."""
+    return np.frombuffer(pricing.amounts(values), dtype=np.float64)
+
+
+def _batch_columns(batch: ProductBatch):
+    """``(rating, reviews, price)`` arrays of a batch, missing values as 0."""
+    rating = np.nan_to_num(np.frombuffer(batch.ratings, dtype=np.float64), nan=0.0)
+    reviews = np.maximum(np.frombuffer(batch.reviews, dtype=np.int64), 0).astype(np.float64)
+    return rating, reviews, np.frombuffer(batch.prices, dtype=np.float64)
+
+
+def _mean(values: np.ndarray) -> float:
+    return round(math.fsum(values) / len(values), 2) if len(values) else 0.0
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the ``k`` highest scores, best first, ties broken by
+    position -- the same order as a stable descending sort, but in
+    O(n + k log k).
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth = np.partition(scores, n - k)[n - k]
+    candidates = np.flatnonzero(scores >= kth)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][:k]
+
+
+def analyze_columnar(
+    products: List[Dict[str, Any]],
+    source_url: str,
+    cfg: Dict[str, Any],
+    review_features: Optional[ReviewFeatures] = None,
+) -> Dict[str, Any]:
+    if isinstance(products, ProductBatch):
+        rating, reviews, price = _batch_columns(products)
+    elif all(type(p) is Product for p in products):
+        # Already parsed: just gather the columns
+        rating = np.array([p.rating or 0.0 for p in products], dtype=np.float64)
+        reviews = np.array([p.reviews or 0 for p in products], dtype=np.float64)
+        price = np.array([p.price for p in products], dtype=np.float64)
+    else:
+        rating = _numeric([p.get("rating") for p in products])
+        # int(float(x)) truncates toward zero
+        reviews = np.trunc(_numeric([p.get("reviews") for p in products]))
+        price = _prices([p.get("price", "") for p in products])
+
+    score = rating * (1 + reviews / cfg["review_weight"])
+    if review_features:
+        score *= np.fromiter(
+            (review_factor(p, review_features, cfg) for p in products),
+            dtype=np.float64,
+            count=len(products),
+        )
+
+    top = [
+        (float(rating[i]), int(reviews[i]), products[i])
+        for i in top_k_indices(score, cfg["top_products"])
+    ]
+
+    return build_insights(
+        source_url,
+        len(products),
+        _mean(rating[rating > 0]),
+        _mean(price[price > 0]),
+        bool((price >= cfg["high_ticket_price"]).any()),
+        top,
+        cfg,
+        review_features,
+    )
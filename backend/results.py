@@ -0,0 +1,338 @@
+"""
+Server-side store of scrape results.
+
+Each scrape's products and insights are kept under a result id, so clients
+such as the Streamlit dashboard can page through them instead of holding
+the whole catalog. Recent results are served from an in-process LRU
+bounded by product count (``RESULTS_MEMORY_PRODUCTS``). With
+``RESULTS_MONGO`` (off by default) they are also written, in the
+background, to the ``results`` and ``result_products`` collections, which
+expire after ``RESULTS_TTL_SECONDS``; at most ``RESULTS_MONGO_QUEUE``
+results wait for that write, and further ones stay memory-only. Lookups
+fall back to MongoDB once a result has left memory or was stored by
+another API process.
+
+Product pages are sorted by scrape position, price, rating or review
+count, optionally filtered by price range, minimum rating and
+availability, and paginated with an opaque keyset cursor (the last row's
+sort value and position). Paging therefore costs the same at row 50,000
+as at row 0, and both backends return identical pages.
+"""
+import base64
+import bisect
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend import config
+from backend.recommender import _enrich
+
+logger = logging.getLogger(__name__)
+
+# Public sort name -> per-row field (scrape order is "position")
+SORT_FIELDS = {"position": "_pos", "price": "_price", "rating": "_rating", "reviews": "_reviews"}
+
+
+def in_stock(availability: Any) -> Optional[bool]:
+    """Best-effort availability flag; None when the store does not say."""
+    text = "".join(str(availability or "").lower().split())
+    if not text:
+        return None
+    return not any(word in text for word in ("outofstock", "soldout", "unavailable"))
+
+
+def _rows(result_id: str, products: List[Dict[str, Any]], created: datetime) -> List[Dict]:
+    rows = []
+    for pos, p in enumerate(products):
+        rating, reviews, price = _enrich(p)
+        rows.append({
+            **{k: v for k, v in p.items() if k != "_id"},
+            "_rid": result_id,
+            "_pos": pos,
+            "_price": price,
+            "_rating": rating,
+            "_reviews": reviews,
+            "_in_stock": in_stock(p.get("availability")),
+            "_created": created,
+        })
+    return rows
+
+
+def _public(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in row.items() if not k.startswith("_")}
+
+
+class Filters:
+    """Row filters shared by the memory and MongoDB backends."""
+
+    def __init__(
+        self,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        available: Optional[bool] = None,
+    ):
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_rating = min_rating
+        self.available = available
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        if self.min_price is not None and row["_price"] < self.min_price:
+            return False
+        if self.max_price is not None and row["_price"] > self.max_price:
+            return False
+        if self.min_rating is not None and row["_rating"] < self.min_rating:
+            return False
+        if self.available is not None and row["_in_stock"] is not self.available:
+            return False
+        return True
+
+    def mongo(self) -> Dict[str, Any]:
+        query: Dict[str, Any] = {}
+        price: Dict[str, float] = {}
+        if self.min_price is not None:
+            price["$gte"] = self.min_price
+        if self.max_price is not None:
+            price["$lte"] = self.max_price
+        if price:
+            query["_price"] = price
+        if self.min_rating is not None:
+            query["_rating"] = {"$gte": self.min_rating}
+        if self.available is not None:
+            query["_in_stock"] = self.available
+        return query
+
+
+def encode_cursor(value: Any, pos: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, pos]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Inverse of :func:`encode_cursor`; raises ValueError if malformed."""
+    try:
+        value, pos = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(pos)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+class _Stored:
+    """One result held in memory, with lazily built sort orders."""
+
+    def __init__(self, meta: Dict[str, Any], rows: List[Dict[str, Any]]):
+        self.meta = meta
+        self.rows = rows
+        # (field, descending) -> ascending list of (signed value, signed pos)
+        self._orders: Dict[Tuple[str, bool], List[Tuple[float, int]]] = {}
+        self._lock = threading.Lock()
+
+    def order(self, field: str, descending: bool) -> List[Tuple[float, int]]:
+        with self._lock:
+            keys = self._orders.get((field, descending))
+            if keys is None:
+                sign = -1 if descending else 1
+                keys = sorted((sign * r[field], sign * r["_pos"]) for r in self.rows)
+                self._orders[(field, descending)] = keys
+            return keys
+
+    def page(
+        self,
+        field: str,
+        descending: bool,
+        filters: Filters,
+        limit: int,
+        after: Optional[Tuple[Any, int]],
+    ) -> List[Dict[str, Any]]:
+        sign = -1 if descending else 1
+        keys = self.order(field, descending)
+        start = 0
+        if after is not None:
+            start = bisect.bisect_right(keys, (sign * after[0], sign * after[1]))
+        page = []
+        for _, signed_pos in keys[start:]:
+            row = self.rows[sign * signed_pos]
+            if filters.matches(row):
+                page.append(row)
+                if len(page) >= limit:
+                    break
+        return page
+
+
+class _MemoryStore:
+    """LRU of results, bounded by the total number of products held."""
+
+    def __init__(self, max_products: int):
+        self.max_products = max_products
+        self._data: "OrderedDict[str, _Stored]" = OrderedDict()
+        self._products = 0
+        self._lock = threading.Lock()
+
+    def get(self, result_id: str) -> Optional[_Stored]:
+        with self._lock:
+            stored = self._data.get(result_id)
+            if stored is not None:
+                self._data.move_to_end(result_id)
+            return stored
+
+    def put(self, result_id: str, stored: _Stored) -> None:
+        if len(stored.rows) > self.max_products:
+            return
+        with self._lock:
+            self._data[result_id] = stored
+            self._products += len(stored.rows)
+            while self._products > self.max_products:
+                _, old = self._data.popitem(last=False)
+                self._products -= len(old.rows)
+
+
+_memory = _MemoryStore(config.RESULTS_MEMORY_PRODUCTS)
+
+# MongoDB writes happen off the request path, one result at a time; the
+# slots bound how many results (and their rows) may wait for a write
+_mongo_writes = ThreadPoolExecutor(max_workers=1, thread_name_prefix="results-writer")
+_mongo_slots = threading.BoundedSemaphore(max(1, config.RESULTS_MONGO_QUEUE))
+
+
+def _write_mongo(meta: Dict[str, Any], rows: List[Dict[str, Any]]) -> None:
+    try:
+        from backend.database.mongo_db import save_result
+
+        save_result(meta, rows)
+    except Exception as e:
+        # The result stays available from memory while it is held there
+        logger.warning("Could not store result %s in MongoDB (%s)", meta["_id"], e)
+    finally:
+        _mongo_slots.release()
+
+
+def _queue_mongo(meta: Dict[str, Any], rows: List[Dict[str, Any]]) -> None:
+    if not _mongo_slots.acquire(blocking=False):
+        # MongoDB is slow or down and the queue is full: memory only
+        logger.warning("Result write queue full; %s is not stored in MongoDB", meta["_id"])
+        return
+    _mongo_writes.submit(_write_mongo, meta, rows)
+
+
+def save(source_url: str, products: List[Dict[str, Any]], insights: Dict[str, Any]) -> str:
+    """Store a scrape's products and insights; returns the new result id."""
+    result_id = uuid.uuid4().hex
+    created = datetime.now(timezone.utc)
+    meta = {
+        "_id": result_id,
+        "source_url": source_url,
+        "created_at": created,
+        "product_count": len(products),
+        "insights": insights,
+    }
+    rows = _rows(result_id, products, created)
+    _memory.put(result_id, _Stored(meta, rows))
+    if config.RESULTS_MONGO:
+        _queue_mongo(meta, rows)
+    return result_id
+
+
+def _describe(meta: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "result_id": meta["_id"],
+        "source_url": meta["source_url"],
+        "created_at": meta["created_at"],
+        "product_count": meta["product_count"],
+        "insights": meta["insights"],
+    }
+
+
+def get(result_id: str) -> Optional[Dict[str, Any]]:
+    """Metadata and insights of a stored result, or None."""
+    stored = _memory.get(result_id)
+    if stored is not None:
+        return _describe(stored.meta)
+    if not config.RESULTS_MONGO:
+        return None
+    try:
+        from backend.database.mongo_db import load_result
+
+        meta = load_result(result_id)
+    except Exception:
+        return None
+    return _describe(meta) if meta else None
+
+
+def products(result_id: str) -> Optional[List[Dict[str, Any]]]:
+    """All products of a stored result in scrape order, or None."""
+    stored = _memory.get(result_id)
+    if stored is not None:
+        return [_public(r) for r in stored.rows]
+    if not config.RESULTS_MONGO:
+        return None
+    try:
+        from backend.database import mongo_db
+
+        if mongo_db.load_result(result_id) is None:
+            return None
+        rows = mongo_db.find_result_products(result_id, {}, "_pos", False, 0)
+    except Exception:
+        logger.warning("Could not read result %s from MongoDB", result_id, exc_info=True)
+        return None
+    return [_public(r) for r in rows]
+
+
+def query(
+    result_id: str,
+    sort: str = "position",
+    descending: bool = False,
+    filters: Optional[Filters] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    One page of a result's products: ``{"items", "next_cursor"}``, plus
+    ``"matched"`` (the filtered total) on the first page. None if the
+    result is unknown. Raises ValueError for a bad sort or cursor.
+    """
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_FIELDS)}")
+    field = SORT_FIELDS[sort]
+    filters = filters or Filters()
+    limit = max(1, min(limit, config.RESULTS_PAGE_MAX))
+    after = decode_cursor(cursor) if cursor else None
+
+    stored = _memory.get(result_id)
+    if stored is not None:
+        rows = stored.page(field, descending, filters, limit, after)
+        matched = (
+            sum(1 for r in stored.rows if filters.matches(r)) if cursor is None else None
+        )
+    else:
+        if not config.RESULTS_MONGO:
+            return None
+        try:
+            from backend.database import mongo_db
+
+            if mongo_db.load_result(result_id) is None:
+                return None
+            rows = mongo_db.find_result_products(
+                result_id, filters.mongo(), field, descending, limit, after
+            )
+            matched = (
+                mongo_db.count_result_products(result_id, filters.mongo())
+                if cursor is None else None
+            )
+        except Exception:
+            logger.warning("Could not read result %s from MongoDB", result_id, exc_info=True)
+            return None
+
+    page: Dict[str, Any] = {
+        "items": [_public(r) for r in rows],
+        "next_cursor": (
+            encode_cursor(rows[-1][field], rows[-1]["_pos"]) if len(rows) == limit else None
+        ),
+    }
+    if matched is not None:
+        page["matched"] = matched
+    return page
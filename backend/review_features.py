@@ -0,0 +1,518 @@
+"""
+Review features for product scoring.
+
+An offline batch stage over the stored reviews (the ``reviews``
+collection, filled by ``backend.scraper.review_scraper``). It keeps, per
+product:
+
+- a sentiment score: each review is scored against a small built-in
+  lexicon, with negation ("not good") flipping what follows it, and
+  normalized to -1..1;
+- keywords: review words hashed into ``2 ** REVIEW_FEATURES_HASH_BITS``
+  buckets, ranked by tf-idf across all reviews;
+- recency weighting: a review counts half as much as one
+  ``REVIEW_FEATURES_HALF_LIFE_DAYS`` newer, so the sentiment follows what
+  recent buyers say. Weights are relative to the product's newest review.
+
+A chunk of reviews is tokenized in one regex pass, and scored and
+aggregated with NumPy array operations. Nothing leaves the machine.
+
+Updates are incremental: :func:`update` reads only the reviews stored
+since its last run (by ``_id``, which MongoDB assigns in insertion order).
+It folds them into the running sums of the products they belong to and
+writes those products back, chunk by chunk, to the ``review_features``
+collection, along with the blocks of corpus-wide document frequencies the
+chunk changed. Every product records the last review it includes, so a run
+that is interrupted and repeated counts nothing twice. Run it periodically:
+
+    python -m backend.review_features
+
+:func:`lookup` serves the precomputed summaries to the API, cached for
+``REVIEW_FEATURES_REFRESH_SECONDS``. With ``REVIEW_FEATURES_SCORING`` the
+pipeline passes them to ``analyze_products``, which scales each product's
+engagement score by its review sentiment (see ``recommender``).
+"""
+import argparse
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from backend import config
+from backend.products import review_keys
+
+logger = logging.getLogger(__name__)
+
+# Word -> valence (-3..3); a compact, review-oriented sentiment lexicon
+LEXICON: Dict[str, float] = {
+    # positive
+    "amazing": 2.8, "awesome": 3.0, "beautiful": 2.9, "best": 3.0, "brilliant": 2.8,
+    "comfortable": 2.0, "comfy": 2.0, "cute": 2.0, "delighted": 2.8, "durable": 1.8,
+    "easy": 1.5, "elegant": 2.1, "excellent": 3.0, "fantastic": 2.9, "fast": 1.0,
+    "favorite": 2.0, "favourite": 2.0, "fine": 0.8, "fits": 1.0, "flawless": 2.6,
+    "glad": 2.0, "good": 1.9, "gorgeous": 3.0, "great": 3.0, "happy": 2.7,
+    "helpful": 1.8, "impressed": 2.2, "incredible": 2.8, "lovely": 2.8, "love": 3.0,
+    "loved": 2.9, "loves": 2.7, "nice": 1.8, "perfect": 2.7, "perfectly": 2.5,
+    "pleased": 2.2, "quality": 1.0, "recommend": 1.5, "recommended": 1.5, "reliable": 1.8,
+    "satisfied": 1.8, "soft": 1.0, "solid": 1.2, "sturdy": 1.6, "stylish": 2.0,
+    "superb": 3.0, "thanks": 1.5, "useful": 1.6, "value": 0.8, "well": 1.1,
+    "wonderful": 2.7, "worth": 1.5, "wow": 2.8,
+    # negative
+    "annoying": -1.9, "awful": -2.8, "bad": -2.5, "broke": -2.2, "broken": -2.3,
+    "cheap": -1.0, "cheaply": -1.3, "complaint": -1.8, "crap": -2.6, "damaged": -2.2,
+    "defective": -2.6, "difficult": -1.5, "disappointed": -2.3, "disappointing": -2.2,
+    "disappointment": -2.3, "faulty": -2.3, "flimsy": -1.9, "garbage": -2.8, "hate": -2.7,
+    "horrible": -2.9, "junk": -2.5, "late": -1.0, "leaks": -1.6, "mediocre": -1.3,
+    "missing": -1.5, "overpriced": -1.8, "poor": -2.1, "poorly": -2.0, "problem": -1.7,
+    "problems": -1.7, "refund": -1.5, "return": -0.8, "returned": -1.5, "ripped": -2.0,
+    "rude": -2.0, "scratched": -1.8, "slow": -1.2, "small": -0.5, "smells": -1.5,
+    "terrible": -3.0, "tight": -0.8, "torn": -2.0, "trash": -2.6, "ugly": -2.3,
+    "uncomfortable": -2.0, "unhappy": -2.2, "unusable": -2.6, "useless": -2.6,
+    "waste": -2.5, "worse": -2.3, "worst": -3.0, "wrong": -2.1,
+}
+
+# A negator flips (and damps) the valence of the next few words
+NEGATORS = frozenset((
+    "not", "no", "never", "nothing", "hardly", "barely", "without", "nor",
+    "don't", "doesn't", "didn't", "isn't", "wasn't", "aren't", "weren't",
+    "won't", "wouldn't", "can't", "couldn't", "shouldn't", "haven't", "hasn't",
+    "dont", "doesnt", "didnt", "isnt", "wasnt", "cant", "wont",
+))
+_NEGATION_SCOPE = 3
+_NEGATION_FACTOR = -0.74
+# Normalizes a review's valence sum to -1..1: s / sqrt(s * s + alpha)
+_ALPHA = 15.0
+
+# Words never used as keywords
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been
+before being below between both but by could did do does doing down during each
+few for from further get got had has have having he her here hers him his how
+i if in into is it its itself just me more most my myself of off on once only
+or other our out over own same she should so some such than that the their
+them then there these they this those through to too under until up very was
+we were what when where which while who whom why will with would you your
+yours one two really much even still bought buy product item order ordered
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z]+(?:'[a-z]+)?|\x00")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# Keywords reported per product
+KEYWORDS = 8
+
+# Document frequencies are stored in blocks of this many buckets (as bits);
+# a chunk rewrites only the blocks whose counts it changed
+DF_BLOCK_BITS = 12
+
+# One review to fold in: (review _id, product, text, timestamp, rating or None)
+Row = Tuple[Any, str, str, float, Optional[float]]
+
+
+@lru_cache(maxsize=1 << 18)
+def _hash(word: str) -> int:
+    # Stable across processes, unlike hash()
+    return zlib.crc32(word.encode("utf-8"))
+
+
+class Tokens:
+    """The words of a batch of texts, as arrays over one shared vocabulary."""
+
+    __slots__ = ("words", "ids", "doc")
+
+    def __init__(self, texts: Sequence[str]):
+        # One regex pass over all texts; "\x00" marks where each one starts
+        joined = "\x00".join(t.replace("\x00", " ") for t in texts).lower()
+        tokens = _TOKEN_RE.findall(joined)
+        vocab: Dict[str, int] = {}
+        ids = np.fromiter(
+            (vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int64, count=len(tokens)
+        )
+        separator = vocab.get("\x00", -1)
+        starts = ids == separator
+        self.words: List[str] = list(vocab)
+        self.ids = ids[~starts]
+        # Index into texts of every token
+        self.doc = np.cumsum(starts)[~starts]
+
+    def per_word(self, value, dtype) -> np.ndarray:
+        """``value(word)`` for every token, computed once per distinct word."""
+        return np.fromiter((value(w) for w in self.words), dtype=dtype, count=len(self.words))[self.ids]
+
+
+def sentiment(tokens: Tokens, count: int) -> np.ndarray:
+    """Lexicon sentiment (-1..1) of each of the ``count`` texts."""
+    valence = tokens.per_word(lambda w: LEXICON.get(w, 0.0), np.float64)
+    if not len(valence):
+        return np.zeros(count)
+    negator = tokens.per_word(lambda w: w in NEGATORS, bool)
+    pos = np.arange(len(valence))
+    # Position of the last negator before each token (-1 if none)
+    last = np.maximum.accumulate(np.where(negator, pos, -1))
+    before = np.concatenate(([-1], last[:-1]))
+    negated = (before >= 0) & (pos - before <= _NEGATION_SCOPE)
+    negated &= tokens.doc[np.maximum(before, 0)] == tokens.doc
+    valence = np.where(negated, valence * _NEGATION_FACTOR, valence)
+    total = np.bincount(tokens.doc, weights=valence, minlength=count)
+    return total / np.sqrt(total * total + _ALPHA)
+
+
+def _timestamp(date: Any) -> Optional[float]:
+    m = _DATE_RE.match(str(date)) if date else None
+    if not m:
+        return None
+    try:
+        return datetime.strptime(m.group(0), "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def _row(doc: Dict[str, Any]) -> Row:
+    """A stored review document as a :data:`Row`."""
+    review = doc.get("review")
+    rating = None
+    date = None
+    if isinstance(review, dict):
+        text = review.get("text") or ""
+        rating = review.get("rating")
+        date = review.get("date")
+    else:
+        # Reviews saved as plain text
+        text = str(review or "")
+    ts = _timestamp(date) or float(doc.get("first_seen") or 0.0)
+    if not isinstance(rating, (int, float)) or not math.isfinite(rating):
+        rating = None
+    return doc["_id"], str(doc.get("product")), text, ts, rating
+
+
+class ProductFeatures:
+    """
+    Running review sums of one product. Sums are weighted relative to
+    ``ref``, the time of its newest review: a review at ``t`` weighs
+    ``2 ** ((t - ref) / half_life)``.
+    """
+
+    __slots__ = ("product", "upto", "ref", "count", "weight", "sentiment", "rated", "rating", "terms")
+
+    def __init__(self, product: str):
+        self.product = product
+        self.upto: Any = None  # _id of the last review included
+        self.ref = 0.0
+        self.count = 0
+        self.weight = 0.0
+        self.sentiment = 0.0
+        self.rated = 0.0  # weight of the reviews with a rating
+        self.rating = 0.0
+        # bucket -> [weight, a word hashed to it]
+        self.terms: Dict[int, List[Any]] = {}
+
+    def rebase(self, ref: float, half_life: float) -> None:
+        """Move the reference time forward to ``ref``, decaying the sums."""
+        if ref <= self.ref:
+            return
+        if self.count:
+            decay = 2.0 ** ((self.ref - ref) / half_life)
+            self.weight *= decay
+            self.sentiment *= decay
+            self.rated *= decay
+            self.rating *= decay
+            for term in self.terms.values():
+                term[0] *= decay
+        self.ref = ref
+
+    def prune(self, max_terms: int) -> None:
+        if len(self.terms) > max_terms:
+            keep = heapq.nlargest(max_terms, self.terms.items(), key=lambda kv: kv[1][0])
+            self.terms = dict(keep)
+
+    def summary(self, idf: np.ndarray) -> Dict[str, Any]:
+        """What scoring and the API see."""
+        keywords = heapq.nlargest(
+            KEYWORDS, self.terms.items(), key=lambda kv: kv[1][0] * idf[kv[0] & (len(idf) - 1)]
+        )
+        return {
+            "reviews": self.count,
+            "weighted_reviews": round(self.weight, 4),
+            "sentiment": round(self.sentiment / self.weight, 4) if self.weight else 0.0,
+            "rating": round(self.rating / self.rated, 2) if self.rated else None,
+            "keywords": [term[1] for _, term in keywords],
+            "latest": datetime.fromtimestamp(self.ref, timezone.utc).date().isoformat(),
+        }
+
+    def to_doc(self, idf: np.ndarray) -> Dict[str, Any]:
+        return {
+            "_id": self.product,
+            "upto": self.upto,
+            "ref": self.ref,
+            "count": self.count,
+            "weight": self.weight,
+            "sentiment": self.sentiment,
+            "rated": self.rated,
+            "rating": self.rating,
+            "terms": [[bucket, w, word] for bucket, (w, word) in self.terms.items()],
+            "summary": self.summary(idf),
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "ProductFeatures":
+        features = cls(doc["_id"])
+        for field in ("upto", "ref", "count", "weight", "sentiment", "rated", "rating"):
+            setattr(features, field, doc.get(field, getattr(features, field)))
+        features.terms = {int(b): [w, word] for b, w, word in doc.get("terms", [])}
+        return features
+
+
+class FeatureState:
+    """
+    Corpus-wide statistics: document frequency per hash bucket. The counts
+    are stored apart from the rest, in blocks of ``2 ** DF_BLOCK_BITS``
+    buckets, and ``dirty`` holds the blocks changed since the last save.
+    """
+
+    def __init__(self, hash_bits: int = config.REVIEW_FEATURES_HASH_BITS):
+        self.hash_bits = hash_bits
+        self.block_bits = min(DF_BLOCK_BITS, hash_bits)
+        self.df = np.zeros(1 << hash_bits, dtype=np.int64)
+        self.reviews = 0
+        self.watermark: Any = None  # _id of the last review read
+        self.dirty: Set[int] = set()
+
+    def idf(self) -> np.ndarray:
+        return np.log((1 + self.reviews) / (1 + self.df)) + 1.0
+
+    def count(self, buckets: np.ndarray) -> None:
+        """Add one document to the frequency of each of ``buckets``."""
+        self.df += np.bincount(buckets, minlength=len(self.df))
+        self.dirty.update(np.unique(buckets >> self.block_bits).tolist())
+
+    def to_doc(self) -> Dict[str, Any]:
+        return {"hash_bits": self.hash_bits, "reviews": self.reviews, "watermark": self.watermark}
+
+    def df_blocks(self) -> Dict[int, bytes]:
+        """The changed blocks of document frequencies, by block number."""
+        size = 1 << self.block_bits
+        return {
+            block: self.df[block * size:(block + 1) * size].astype("<i8").tobytes()
+            for block in sorted(self.dirty)
+        }
+
+    @classmethod
+    def from_doc(
+        cls, doc: Optional[Dict[str, Any]], blocks: Optional[Dict[int, bytes]] = None
+    ) -> "FeatureState":
+        if not doc:
+            return cls()
+        state = cls(doc["hash_bits"])
+        if "df" in doc:
+            # Stored whole by earlier versions: rewrite it as blocks
+            state.df = np.frombuffer(bytes(doc["df"]), dtype="<i8").astype(np.int64)
+            state.dirty = set(range(len(state.df) >> state.block_bits))
+        size = 1 << state.block_bits
+        for block, data in (blocks or {}).items():
+            state.df[block * size:(block + 1) * size] = np.frombuffer(bytes(data), dtype="<i8")
+        state.reviews = doc.get("reviews", 0)
+        state.watermark = doc.get("watermark")
+        return state
+
+
+def apply(
+    rows: List[Row],
+    products: Dict[str, ProductFeatures],
+    state: FeatureState,
+    half_life_days: float = config.REVIEW_FEATURES_HALF_LIFE_DAYS,
+    max_terms: int = config.REVIEW_FEATURES_MAX_TERMS,
+) -> Set[str]:
+    """
+    Fold ``rows`` (in ``_id`` order) into ``products`` (missing ones are
+    created) and ``state``. Rows a product already includes are skipped.
+    Returns the products that changed.
+    """
+    for row in rows:
+        if row[1] not in products:
+            products[row[1]] = ProductFeatures(row[1])
+    rows = [r for r in rows if products[r[1]].upto is None or r[0] > products[r[1]].upto]
+    if not rows:
+        return set()
+
+    keys = list(dict.fromkeys(r[1] for r in rows))
+    index = {key: i for i, key in enumerate(keys)}
+    product = np.fromiter((index[r[1]] for r in rows), dtype=np.int64, count=len(rows))
+    ts = np.fromiter((r[3] for r in rows), dtype=np.float64, count=len(rows))
+    rating = np.fromiter(
+        (np.nan if r[4] is None else r[4] for r in rows), dtype=np.float64, count=len(rows)
+    )
+
+    # Recency weights, relative to each product's (new) newest review
+    half_life = max(half_life_days, 1e-6) * 86400.0
+    newest = np.full(len(keys), -np.inf)
+    np.maximum.at(newest, product, ts)
+    for key, ref in zip(keys, newest):
+        products[key].rebase(float(ref), half_life)
+    ref = np.fromiter((products[k].ref for k in keys), dtype=np.float64, count=len(keys))
+    weight = np.exp2((ts - ref[product]) / half_life)
+
+    tokens = Tokens([r[2] for r in rows])
+    scores = sentiment(tokens, len(rows))
+    rated = ~np.isnan(rating)
+
+    n = len(keys)
+    sums = {
+        "weight": np.bincount(product, weights=weight, minlength=n),
+        "sentiment": np.bincount(product, weights=weight * scores, minlength=n),
+        "rated": np.bincount(product, weights=np.where(rated, weight, 0.0), minlength=n),
+        "rating": np.bincount(product, weights=np.where(rated, weight * rating, 0.0), minlength=n),
+    }
+    counts = np.bincount(product, minlength=n)
+    for i, key in enumerate(keys):
+        features = products[key]
+        features.count += int(counts[i])
+        for field, values in sums.items():
+            setattr(features, field, getattr(features, field) + float(values[i]))
+    for r in rows:
+        products[r[1]].upto = r[0]
+
+    # Keywords: weighted term frequency per (product, bucket)...
+    keyword = tokens.per_word(lambda w: len(w) > 2 and w not in STOPWORDS and w not in NEGATORS, bool)
+    buckets = tokens.per_word(_hash, np.int64)[keyword] & ((1 << state.hash_bits) - 1)
+    doc = tokens.doc[keyword]
+    ids = tokens.ids[keyword]
+    if len(doc):
+        pair = product[doc] * (1 << state.hash_bits) + buckets
+        uniq, first, inverse = np.unique(pair, return_index=True, return_inverse=True)
+        tf = np.bincount(inverse, weights=weight[doc], minlength=len(uniq))
+        for pair_key, w, word_id in zip(uniq.tolist(), tf.tolist(), ids[first].tolist()):
+            p, bucket = divmod(pair_key, 1 << state.hash_bits)
+            term = products[keys[p]].terms.get(bucket)
+            if term is None:
+                products[keys[p]].terms[bucket] = [w, tokens.words[word_id]]
+            else:
+                term[0] += w
+        # ...and document frequency of each bucket across all reviews
+        per_review = np.unique(doc * (1 << state.hash_bits) + buckets)
+        state.count(per_review & ((1 << state.hash_bits) - 1))
+    state.reviews += len(rows)
+
+    for key in keys:
+        products[key].prune(max_terms)
+    return set(keys)
+
+
+def update(
+    batch_size: int = config.REVIEW_FEATURES_BATCH,
+    max_reviews: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Fold the reviews stored since the last run into the features in
+    MongoDB, ``batch_size`` at a time. Reviews younger than
+    ``REVIEW_FEATURES_LAG_SECONDS`` are left for the next run: writes still
+    in flight may commit with a lower ``_id``.
+    """
+    from bson import ObjectId
+
+    from backend.database import mongo_db
+
+    state = FeatureState.from_doc(*mongo_db.load_review_feature_state())
+    if state.hash_bits != config.REVIEW_FEATURES_HASH_BITS:
+        logger.warning(
+            "Keeping the stored %d hash bits (REVIEW_FEATURES_HASH_BITS=%d)",
+            state.hash_bits, config.REVIEW_FEATURES_HASH_BITS,
+        )
+    before = ObjectId.from_datetime(
+        datetime.now(timezone.utc) - timedelta(seconds=config.REVIEW_FEATURES_LAG_SECONDS)
+    )
+    stats = {"reviews": 0, "products": 0}
+    touched_total: Set[str] = set()
+    while max_reviews is None or stats["reviews"] < max_reviews:
+        limit = batch_size if max_reviews is None else min(batch_size, max_reviews - stats["reviews"])
+        docs = mongo_db.load_reviews_after(state.watermark, before, max(1, limit))
+        if not docs:
+            break
+        rows = [_row(d) for d in docs]
+        keys = list(dict.fromkeys(r[1] for r in rows))
+        products = {
+            doc["_id"]: ProductFeatures.from_doc(doc)
+            for doc in mongo_db.load_review_features(keys)
+        }
+        touched = apply(rows, products, state)
+        state.watermark = docs[-1]["_id"]
+        idf = state.idf()
+        # Products first: if the state write fails, the rerun skips what
+        # the products already include
+        mongo_db.save_review_features(
+            [products[k].to_doc(idf) for k in touched], state.to_doc(), state.df_blocks()
+        )
+        state.dirty.clear()
+        stats["reviews"] += len(docs)
+        touched_total |= touched
+    stats["products"] = len(touched_total)
+    with _cache_lock:
+        _cache.clear()
+    return stats
+
+
+# --- Lookup for scoring -------------------------------------------------------
+
+# product -> (loaded at, summary or None)
+_cache: "OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def lookup(products: Iterable[Mapping[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Review feature summaries of ``products`` that have any, keyed as in
+    ``backend.products.review_keys``. Summaries are read from MongoDB in
+    one query and cached for ``REVIEW_FEATURES_REFRESH_SECONDS``.
+    """
+    from backend.database import mongo_db
+
+    keys = list(dict.fromkeys(k for p in products for k in review_keys(p)))
+    now = time.monotonic()
+    found: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    with _cache_lock:
+        for key in keys:
+            entry = _cache.get(key)
+            if entry is None or now - entry[0] > config.REVIEW_FEATURES_REFRESH_SECONDS:
+                missing.append(key)
+            elif entry[1] is not None:
+                found[key] = entry[1]
+    if missing:
+        loaded = {
+            doc["_id"]: doc["summary"]
+            for doc in mongo_db.load_review_features(missing, ["summary"])
+        }
+        found.update(loaded)
+        with _cache_lock:
+            for key in missing:
+                _cache[key] = (now, loaded.get(key))
+                _cache.move_to_end(key)
+            while len(_cache) > config.REVIEW_FEATURES_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return found
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Update review features from stored reviews")
+    parser.add_argument("--batch", type=int, default=config.REVIEW_FEATURES_BATCH)
+    parser.add_argument("--max-reviews", type=int, default=None)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    stats = update(args.batch, args.max_reviews)
+    logger.info(
+        "Folded %d reviews into %d products in %.1fs",
+        stats["reviews"], stats["products"], time.perf_counter() - started,
+    )
+
+
+if __name__ == "__main__":
+    main()
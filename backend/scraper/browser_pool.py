@@ -0,0 +1,244 @@
+"""
+Bounded pool of long-lived headless Chrome instances for JS-rendered pages.
+
+Starting Chrome costs seconds and hundreds of MB, so browsers are kept warm
+and handed out with :meth:`BrowserPool.browser`. A browser is health-checked
+on checkout and recycled after ``BROWSER_MAX_PAGES`` pages or once its
+process tree grows past ``BROWSER_MAX_RSS_MB`` (measured with psutil; the
+limit is not enforced without it). When every browser is busy,
+callers queue for up to ``BROWSER_CHECKOUT_TIMEOUT`` seconds.
+"""
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Iterator, List, Optional
+
+from backend import config
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    # Selenium is imported on first use so API startup does not pay for it
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+class BrowserPoolTimeout(RuntimeError):
+    """Raised when no browser becomes free within the checkout timeout."""
+
+
+@lru_cache(maxsize=1)
+def resolve_driver_path() -> Optional[str]:
+    """
+    Locate (downloading if needed) the chromedriver binary once per process.
+    Returns None to let Selenium Manager resolve it when webdriver-manager
+    is unavailable or fails.
+    """
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        return ChromeDriverManager().install()
+    except Exception:
+        return None
+
+
+def _chrome_options() -> "Options":
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
+    return chrome_options
+
+
+@lru_cache(maxsize=1)
+def _psutil() -> Any:
+    """The psutil module, or None (warned about once) if it is not installed."""
+    try:
+        import psutil
+    except ImportError:
+        logger.warning("psutil is not installed; BROWSER_MAX_RSS_MB is not enforced")
+        return None
+    return psutil
+
+
+def _process_tree_rss_mb(pid: Optional[int]) -> Optional[float]:
+    """Resident memory of chromedriver plus its Chrome children (None if unknown)."""
+    psutil = _psutil()
+    if not pid or psutil is None:
+        return None
+    try:
+        root = psutil.Process(pid)
+        procs = [root] + root.children(recursive=True)
+        total = 0
+        for proc in procs:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+    except psutil.Error:
+        return None
+
+
+class _Worker:
+    def __init__(self, driver: "webdriver.Chrome"):
+        self.driver = driver
+        self.pages = 0
+
+    @property
+    def pid(self) -> Optional[int]:
+        process = getattr(self.driver.service, "process", None)
+        return process.pid if process else None
+
+    def healthy(self) -> bool:
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def quit(self) -> None:
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        size: int = config.BROWSER_POOL_SIZE,
+        max_pages: int = config.BROWSER_MAX_PAGES,
+        max_rss_mb: int = config.BROWSER_MAX_RSS_MB,
+        checkout_timeout: float = config.BROWSER_CHECKOUT_TIMEOUT,
+    ):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.checkout_timeout = checkout_timeout
+        # LIFO so the most recently used (warmest) browser is reused first
+        self._idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        # One permit per browser that may be checked out at the same time
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def _start_worker(self) -> _Worker:
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+
+        driver_path = resolve_driver_path()
+        service = Service(driver_path) if driver_path else Service()
+        return _Worker(webdriver.Chrome(service=service, options=_chrome_options()))
+
+    def _acquire(self, timeout: Optional[float]) -> _Worker:
+        if self._closed:
+            raise RuntimeError("Browser pool is shut down")
+
+        wait = self.checkout_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=wait):
+            raise BrowserPoolTimeout(f"No browser available within {wait}s")
+
+        try:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start_worker()
+
+            if worker.healthy():
+                return worker
+
+            # Crashed or hung browser: replace it
+            worker.quit()
+            return self._start_worker()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, worker: _Worker) -> None:
+        try:
+            worker.pages += 1
+            rss_mb = _process_tree_rss_mb(worker.pid)
+            if (
+                self._closed
+                or worker.pages >= self.max_pages
+                or (rss_mb is not None and rss_mb > self.max_rss_mb)
+            ):
+                worker.quit()
+                return
+
+            try:
+                # Drop the page and any session state before the next store
+                worker.driver.delete_all_cookies()
+                worker.driver.get("about:blank")
+            except Exception:
+                worker.quit()
+                return
+            self._idle.put(worker)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def browser(
+        self, timeout: Optional[float] = None
+    ) -> Iterator["webdriver.Chrome"]:
+        """Check out a browser for the duration of the ``with`` block."""
+        worker = self._acquire(timeout)
+        try:
+            yield worker.driver
+        finally:
+            self._release(worker)
+
+    def prewarm(self, count: int) -> None:
+        """Start up to ``count`` browsers ahead of the first request."""
+        for _ in range(min(count, self.size) - self._idle.qsize()):
+            self._idle.put(self._start_worker())
+
+    def shutdown(self) -> None:
+        self._closed = True
+        workers: List[_Worker] = []
+        while True:
+            try:
+                workers.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for worker in workers:
+            worker.quit()
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> BrowserPool:
+    """Return the process-wide browser pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
+
+
+def startup() -> None:
+    """Resolve the driver once and optionally start warm browsers."""
+    resolve_driver_path()
+    if config.BROWSER_POOL_PREWARM > 0:
+        get_pool().prewarm(config.BROWSER_POOL_PREWARM)
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
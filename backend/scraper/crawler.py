@@ -0,0 +1,332 @@
+"""
+Category pagination crawler.
+
+Starting from a category page, discover further pages of the same listing
+(``rel=next`` links, numbered ``?page=N`` / ``/page/N`` / ``page-N.html``
+links and "load more" endpoints), fetch them concurrently, and merge the
+products into a single deduplicated list.
+
+When the pagination follows a numeric pattern, pages are requested ahead of
+time in windows of ``CRAWL_CONCURRENCY`` instead of walking the ``next``
+chain one page at a time; a window stops extending once a page comes back
+missing or without new products.
+"""
+import asyncio
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote_plus, urljoin, urlsplit, urlunsplit
+
+import httpx
+
+from backend import config, metrics, pricing
+from backend.products import MISSING, Product, ProductBatch
+from backend.scraper.dom import parse_html
+from backend.scraper.fetcher import fetch_html_async
+from backend.scraper.parse_pool import parse_page_async
+from backend.scraper.generic_scraper import (
+    _needs_rendering,
+    _products_from_soup,
+    _scrape_rendered,
+)
+
+# Query parameters commonly used for the page number
+PAGE_QUERY_PARAMS = ("page", "p", "pg", "paged", "pagenum", "page_number")
+
+# Path-style page numbers: /page/3/, page-3.html
+_PATH_PAGE_PATTERNS = [
+    re.compile(r"/page/(\d+)(?=/|$)", re.IGNORECASE),
+    re.compile(r"page-(\d+)\.html?$", re.IGNORECASE),
+]
+
+NEXT_SELECTORS = (
+    "link[rel~='next'], a[rel~='next'], li.next a, a.next, "
+    "a[aria-label*='Next'], a[aria-label*='next']"
+)
+
+LOAD_MORE_SELECTORS = (
+    "[data-next-url], [data-load-more-url], "
+    "a[class*='load-more'], button[class*='load-more'], "
+    "a[class*='load_more'], button[class*='load_more']"
+)
+
+_LOAD_MORE_TEXT = re.compile(r"\b(load|show|view)\s+more\b", re.IGNORECASE)
+
+# Placeholder substituted with the page number when expanding a template
+_PAGE_TOKEN = "__PAGE__"
+
+
+def _normalize_url(url: str) -> str:
+    """
+    Canonical form of a page URL, used both for the set of seen pages and
+    for templates: lower-case scheme and host, no fragment, and the query
+    kept exactly as written so expanded URLs match the site's own links.
+    """
+    parts = urlsplit(url)
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, "")
+    )
+
+
+def _page_template(url: str) -> Optional[Tuple[str, int]]:
+    """
+    Split a paginated URL into ``(template, page_number)``, where the
+    template is the normalized URL with ``_PAGE_TOKEN`` in place of the
+    number.
+    """
+    parts = urlsplit(_normalize_url(url))
+
+    # Replace the value in the raw query rather than re-encoding it, so
+    # the other parameters keep their order and escaping
+    params = parts.query.split("&") if parts.query else []
+    for i, param in enumerate(params):
+        key, _, value = param.partition("=")
+        if unquote_plus(key).lower() in PAGE_QUERY_PARAMS and value.isdigit():
+            templated = params[:i] + [f"{key}={_PAGE_TOKEN}"] + params[i + 1:]
+            return urlunsplit(parts._replace(query="&".join(templated))), int(value)
+
+    for pattern in _PATH_PAGE_PATTERNS:
+        m = pattern.search(parts.path)
+        if m:
+            path = parts.path[: m.start(1)] + _PAGE_TOKEN + parts.path[m.end(1):]
+            return urlunsplit(parts._replace(path=path)), int(m.group(1))
+
+    return None
+
+
+def _expand(template: str, page: int) -> str:
+    return template.replace(_PAGE_TOKEN, str(page))
+
+
+def _missing_page(error: BaseException) -> bool:
+    # Read-ahead past the last page is expected to run into these
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code in (404, 410)
+
+
+class _PageNav:
+    """Pagination hints found on one page."""
+
+    def __init__(self):
+        self.links: List[str] = []
+        self.template: Optional[str] = None
+        self.highest: int = 0
+
+
+def _find_pagination(soup: Any, page_url: str) -> _PageNav:
+    nav = _PageNav()
+
+    def add_link(href: Optional[str]) -> Optional[str]:
+        if not href or href.startswith(("#", "javascript:")):
+            return None
+        link = urljoin(page_url, href)
+        if link not in nav.links:
+            nav.links.append(link)
+        return link
+
+    next_link = None
+    for el in soup.select(NEXT_SELECTORS):
+        next_link = add_link(el.get("href")) or next_link
+        if next_link:
+            break
+
+    for el in soup.select(LOAD_MORE_SELECTORS):
+        add_link(
+            el.get("data-next-url")
+            or el.get("data-load-more-url")
+            or el.get("data-url")
+            or el.get("href")
+        )
+    for el in soup.select("a, button"):
+        if _LOAD_MORE_TEXT.search(el.get_text(" ", strip=True)):
+            add_link(el.get("data-url") or el.get("href"))
+
+    # Numbered page links, grouped by URL shape
+    numbered: Dict[str, Set[int]] = {}
+    for a in soup.select("a[href]"):
+        split = _page_template(urljoin(page_url, a.get("href")))
+        if split:
+            numbered.setdefault(split[0], set()).add(split[1])
+
+    # The shape of the "next" link wins; otherwise the shape with most page
+    # links (a single match is too weak, e.g. "?p=123" product links).
+    next_split = _page_template(next_link) if next_link else None
+    if next_split:
+        nav.template = next_split[0]
+        nav.highest = max(numbered.get(nav.template, set()) | {next_split[1]})
+    elif numbered:
+        template, pages = max(numbered.items(), key=lambda kv: len(kv[1]))
+        if len(pages) >= 2:
+            nav.template, nav.highest = template, max(pages)
+
+    return nav
+
+
+def _parse_page(html: str, url: str) -> Tuple[List[Product], _PageNav]:
+    with metrics.stage("parse"), pricing.using_locale(pricing.page_locale(html)):
+        soup = parse_html(html)
+        return _products_from_soup(html, soup, url), _find_pagination(soup, url)
+
+
+def _dedupe_key(product: Product) -> Tuple[str, str]:
+    return (product.title.strip().lower(), (product.price_text or MISSING).strip())
+
+
+class _ProductCollector:
+    """Merge products across pages, dropping duplicates, up to a cap."""
+
+    def __init__(self, max_products: int):
+        self.max_products = max_products
+        self.count = 0
+        self._seen: Set[Tuple[str, str]] = set()
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.max_products
+
+    def add(self, products: List[Product]) -> List[Product]:
+        """Keep the products not seen before; returns them."""
+        added = []
+        for p in products:
+            if self.full:
+                break
+            key = _dedupe_key(p)
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            self.count += 1
+            added.append(p)
+        return added
+
+
+async def crawl_category(
+    url: str,
+    max_pages: Optional[int] = None,
+    max_products: Optional[int] = None,
+) -> ProductBatch:
+    """
+    Crawl a paginated category listing starting at ``url`` and return the
+    merged, deduplicated products of up to ``max_pages`` pages (capped at
+    ``max_products`` products), held column-wise. The batch is marked
+    ``complete`` when the crawl reached the end of the listing.
+    """
+    products = ProductBatch()
+    outcome: Dict[str, Any] = {}
+    async for page_products in crawl_category_pages(url, max_pages, max_products, outcome):
+        products.extend(page_products)
+    products.complete = outcome["complete"]
+    return products
+
+
+async def crawl_category_pages(
+    url: str,
+    max_pages: Optional[int] = None,
+    max_products: Optional[int] = None,
+    outcome: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[List[Product]]:
+    """
+    :func:`crawl_category` as a stream: yields the new (not yet seen)
+    products of each page as soon as that page is parsed.
+
+    ``outcome["complete"]``, if ``outcome`` is given, tells once the stream
+    ends whether the whole listing was crawled: no cap was hit and every
+    page that was linked or read ahead came back (or does not exist).
+    """
+    outcome = {} if outcome is None else outcome
+    outcome["complete"] = False
+    max_pages = max_pages or config.CRAWL_MAX_PAGES
+    max_products = max_products or config.CRAWL_MAX_PRODUCTS
+    window = max(1, config.CRAWL_CONCURRENCY)
+
+    if _needs_rendering(url):
+        # Known JS-rendered listing: skip the static attempt
+        products = await asyncio.to_thread(_scrape_rendered, url)
+        if products:
+            yield products[:max_products]
+            return
+
+    html = await fetch_html_async(url)
+    products, nav = await parse_page_async(html, url)
+    if not products:
+        # JS-rendered listing: nothing to paginate over statically
+        products = await asyncio.to_thread(_scrape_rendered, url)
+        if products:
+            yield products[:max_products]
+        return
+
+    collector = _ProductCollector(max_products)
+    yield collector.add(products)
+
+    seen: Set[str] = {_normalize_url(url)}
+    frontier: List[str] = []
+
+    def enqueue(link: str) -> None:
+        link = _normalize_url(link)
+        if link not in seen:
+            seen.add(link)
+            frontier.append(link)
+
+    template: Optional[str] = None
+    known_highest = 0
+    # Highest templated page that produced new products; drives read-ahead
+    productive_highest = 1
+    next_templated = 2
+
+    start_split = _page_template(url)
+    if start_split:
+        template, productive_highest = start_split
+        next_templated = productive_highest + 1
+
+    def discover(page_nav: _PageNav) -> None:
+        nonlocal template, known_highest
+        if template is None and page_nav.template:
+            template = page_nav.template
+            # The start URL is page 1 of this listing, whatever its form
+            seen.add(_expand(template, 1))
+        if template and page_nav.template == template:
+            known_highest = max(known_highest, page_nav.highest)
+        for link in page_nav.links:
+            enqueue(link)
+
+    discover(nav)
+
+    # A page that could not be fetched leaves the crawl incomplete
+    failed = False
+    pages_fetched = 1
+    while pages_fetched < max_pages and not collector.full:
+        if template:
+            horizon = max(known_highest, productive_highest + window)
+            for n in range(next_templated, horizon + 1):
+                enqueue(_expand(template, n))
+            next_templated = max(next_templated, horizon + 1)
+
+        batch = frontier[: min(window, max_pages - pages_fetched)]
+        if not batch:
+            outcome["complete"] = not failed
+            break
+        del frontier[: len(batch)]
+        pages_fetched += len(batch)
+
+        bodies = await asyncio.gather(
+            *(fetch_html_async(u) for u in batch), return_exceptions=True
+        )
+        fetched = [(u, b) for u, b in zip(batch, bodies) if isinstance(b, str)]
+        failed = failed or any(
+            isinstance(b, BaseException) and not _missing_page(b) for b in bodies
+        )
+        # Parsed concurrently, consumed in page order as each one finishes
+        parsing = [
+            asyncio.ensure_future(parse_page_async(b, u)) for u, b in fetched
+        ]
+        try:
+            for (page_url, _), task in zip(fetched, parsing):
+                page_products, page_nav = await task
+                added = collector.add(page_products)
+                if added:
+                    yield added
+                    if template:
+                        split = _page_template(page_url)
+                        if split and split[0] == template:
+                            productive_highest = max(productive_highest, split[1])
+                discover(page_nav)
+        finally:
+            for task in parsing:
+                task.cancel()
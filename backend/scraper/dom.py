@@ -0,0 +1,145 @@
+"""
+Pluggable HTML parser backends for product extraction.
+
+Extraction code only uses a small BeautifulSoup-compatible surface:
+``select``, ``select_one``, ``get``, ``has_attr``, ``[attr]`` and
+``get_text(separator, strip)``. :func:`parse_html` returns a document
+exposing that surface from one of:
+
+- ``"selectolax"`` -- lexbor, a C HTML parser and CSS engine (fastest),
+- ``"lxml"`` -- BeautifulSoup on top of the lxml tree builder,
+- ``"html.parser"`` -- BeautifulSoup's pure-Python parser (always available).
+
+``"auto"`` picks the first one installed, in that order.
+"""
+import re
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from backend import config
+
+BACKENDS = ("selectolax", "lxml", "html.parser")
+
+# Separator that cannot occur in parsed HTML text (NUL becomes U+FFFD)
+_SPLIT = "\x00"
+
+# bs4's get_text() skips the contents of these elements
+_NON_TEXT_TAGS = "script, style, template"
+
+# JSON-LD blocks, found without parsing the page. Script contents are raw
+# text in HTML, so the match is exactly what a DOM's get_text() would return.
+LD_SCRIPT_RE = re.compile(
+    r"<script\b[^>]*\btype\s*=\s*[\"']?application/ld\+json[\"']?[^>]*>"
+    r"(.*?)</script\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+@lru_cache(maxsize=1)
+def _installed_backends() -> Tuple[str, ...]:
+    # Import probing is done once per process; failed imports are not cached
+    # by Python and would be retried on every parse
+    found = []
+    for backend in BACKENDS:
+        try:
+            if backend == "selectolax":
+                import selectolax.lexbor  # noqa: F401
+            elif backend == "lxml":
+                import lxml  # noqa: F401
+        except ImportError:
+            continue
+        found.append(backend)
+    return tuple(found)
+
+
+def available_backends() -> List[str]:
+    return list(_installed_backends())
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    backend = backend or config.PARSER_BACKEND
+    installed = _installed_backends()
+    if backend == "auto":
+        return installed[0]
+    if backend not in installed:
+        raise ValueError(f"HTML parser backend {backend!r} is not available")
+    return backend
+
+
+class LexborNode:
+    """BeautifulSoup-style view over a selectolax (lexbor) node."""
+
+    __slots__ = ("_node",)
+
+    def __init__(self, node: Any):
+        self._node = node
+
+    @property
+    def name(self) -> str:
+        return self._node.tag
+
+    def select(self, selector: str) -> List["LexborNode"]:
+        return [LexborNode(n) for n in self._node.css(selector)]
+
+    def select_one(self, selector: str) -> Optional["LexborNode"]:
+        node = self._node.css_first(selector)
+        return LexborNode(node) if node is not None else None
+
+    def has_attr(self, name: str) -> bool:
+        return name in self._node.attributes
+
+    def get(self, name: str, default: Any = None) -> Any:
+        attrs = self._node.attributes
+        if name not in attrs:
+            return default
+        value = attrs[name] or ""
+        # Like bs4, "class" is a multi-valued attribute
+        return value.split() if name == "class" else value
+
+    def __getitem__(self, name: str) -> Any:
+        if not self.has_attr(name):
+            raise KeyError(name)
+        return self.get(name)
+
+    def get_text(self, separator: str = "", strip: bool = False) -> str:
+        node = self._node
+        if node.tag in ("script", "style", "template"):
+            return node.text(deep=True)
+        if node.css_first(_NON_TEXT_TAGS) is not None:
+            parts = [
+                n.text_content
+                for n in node.traverse(include_text=True)
+                if n.tag == "-text"
+                and n.parent is not None
+                and n.parent.tag not in ("script", "style", "template")
+            ]
+        else:
+            parts = node.text(deep=True, separator=_SPLIT).split(_SPLIT)
+        if strip:
+            parts = [p.strip() for p in parts]
+            parts = [p for p in parts if p]
+        return separator.join(parts)
+
+    @property
+    def text(self) -> str:
+        return self.get_text()
+
+
+def parse_html(html: str, backend: Optional[str] = None) -> Any:
+    """Parse ``html`` with the configured (or given) backend."""
+    backend = resolve_backend(backend)
+    if backend == "selectolax":
+        from selectolax.lexbor import LexborHTMLParser
+
+        return LexborNode(LexborHTMLParser(html).root)
+    return BeautifulSoup(html, backend)
+
+
+def text_or_none(element: Any) -> Optional[str]:
+    """Stripped text of a parsed element (any backend), or None if empty."""
+    if not element:
+        return None
+    text = element.get_text(strip=True)
+    return text or None
@@ -1,21 +1,18 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
 import time
 
+from backend.scraper.browser_pool import get_pool
+from backend.scraper.dom import parse_html
+
 def scrape_dynamic(url):
     try:
-        options = Options()
-        options.add_argument("--headless")
-        driver = webdriver.Chrome(options=options)
-
-        driver.get(url)
-        time.sleep(3)
+        with get_pool().browser() as driver:
+            driver.get(url)
+            time.sleep(3)
+            html = driver.page_source
 
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        driver.quit()
+        soup = parse_html(html)
 
-        titles = soup.find_all(["h1", "h2", "h3"])
+        titles = soup.select("h1, h2, h3")
         products = [{"product_name": t.get_text(strip=True)} for t in titles]
 
         return {"products": products}
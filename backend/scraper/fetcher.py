@@ -0,0 +1,259 @@
+"""
+Shared HTTP fetch engine for all scrapers.
+
+One long-lived client is kept per mode (sync / asyncio) so connections are
+reused across scrapes (keep-alive, HTTP/2 multiplexing where the server
+supports it) instead of opening a fresh TCP/TLS connection per request.
+Concurrency against a single host is capped separately from the global
+connection limit so one slow store cannot starve the others.
+"""
+import asyncio
+import contextvars
+import threading
+import weakref
+from typing import Any, Coroutine, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from backend import config, metrics
+from backend.scraper.http_cache import HttpCache, get_cache, parse_cache_control
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    )
+}
+
+
+def _http2_available() -> bool:
+    if not config.FETCH_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_kwargs() -> Dict:
+    return {
+        "headers": DEFAULT_HEADERS,
+        "timeout": config.FETCH_TIMEOUT,
+        "follow_redirects": True,
+        "http2": _http2_available(),
+        "limits": httpx.Limits(
+            max_connections=config.FETCH_MAX_CONNECTIONS,
+            max_keepalive_connections=config.FETCH_MAX_CONNECTIONS,
+            keepalive_expiry=config.FETCH_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+def _host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+# --- Sync path (used from FastAPI's threadpool and scripts) ---------------
+
+_sync_lock = threading.Lock()
+_sync_client: Optional[httpx.Client] = None
+_sync_host_limits: Dict[str, threading.BoundedSemaphore] = {}
+
+
+def get_client() -> httpx.Client:
+    """Return the process-wide pooled sync client, creating it on first use."""
+    global _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(**_client_kwargs())
+    return _sync_client
+
+
+def _sync_host_limit(host: str) -> threading.BoundedSemaphore:
+    with _sync_lock:
+        sem = _sync_host_limits.get(host)
+        if sem is None:
+            sem = threading.BoundedSemaphore(config.FETCH_MAX_PER_HOST)
+            _sync_host_limits[host] = sem
+        return sem
+
+
+def fetch(url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """GET ``url`` over the shared pool and return the response (any status)."""
+    with _sync_host_limit(_host_of(url)):
+        return get_client().get(url, headers=headers)
+
+
+def _store(cache: HttpCache, url: str, response: httpx.Response) -> None:
+    storable, ttl = parse_cache_control(response.headers.get("cache-control"))
+    if storable:
+        cache.store(
+            url,
+            response.text,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            ttl=ttl,
+        )
+
+
+def _revalidated(cache: HttpCache, url: str, response: httpx.Response) -> None:
+    cache.mark_revalidated(url, ttl=parse_cache_control(response.headers.get("cache-control"))[1])
+
+
+def _count_fetch(source: str, size: int) -> None:
+    metrics.inc("fetch_requests_total", source=source)
+    metrics.inc("fetch_bytes_total", size, source=source)
+
+
+def fetch_html(url: str) -> str:
+    """
+    GET ``url`` and return the decoded body, raising on HTTP errors.
+    Served from the on-disk cache while fresh, revalidated once stale.
+    """
+    with metrics.stage("fetch"):
+        body, source, size = _fetch_html(url)
+    _count_fetch(source, size)
+    return body
+
+
+def _fetch_html(url: str) -> Tuple[str, str, int]:
+    cache = get_cache()
+    entry = cache.lookup(url) if cache else None
+    if entry and entry.fresh:
+        return entry.body, "cache", len(entry.body)
+
+    response = fetch(url, headers=entry.conditional_headers() if entry else None)
+    if entry and response.status_code == 304:
+        _revalidated(cache, url, response)
+        return entry.body, "revalidated", len(entry.body)
+    response.raise_for_status()
+
+    if cache:
+        if entry:
+            cache.record_miss()
+        _store(cache, url, response)
+    return response.text, "network", len(response.content)
+
+
+# --- Async path (batch sweeps, crawls) ------------------------------------
+
+class _AsyncState:
+    """Client + per-host semaphores bound to one event loop."""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(**_client_kwargs())
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def host_limit(self, host: str) -> asyncio.Semaphore:
+        sem = self.host_limits.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(config.FETCH_MAX_PER_HOST)
+            self.host_limits[host] = sem
+        return sem
+
+
+# One state per event loop (uvicorn's loop, the background loop below, ...)
+_async_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _AsyncState]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_async_state() -> _AsyncState:
+    loop = asyncio.get_running_loop()
+    state = _async_states.get(loop)
+    if state is None:
+        # asyncio primitives and pooled connections cannot cross event loops
+        state = _AsyncState()
+        _async_states[loop] = state
+    return state
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async client for the running event loop."""
+    return _get_async_state().client
+
+
+async def fetch_async(
+    url: str, headers: Optional[Dict[str, str]] = None
+) -> httpx.Response:
+    """Async GET of ``url`` over the shared pool (any status)."""
+    state = _get_async_state()
+    async with state.host_limit(_host_of(url)):
+        return await state.client.get(url, headers=headers)
+
+
+async def fetch_html_async(url: str) -> str:
+    """Async variant of :func:`fetch_html`; cache I/O runs off the event loop."""
+    with metrics.stage("fetch"):
+        body, source, size = await _fetch_html_async(url)
+    _count_fetch(source, size)
+    return body
+
+
+async def _fetch_html_async(url: str) -> Tuple[str, str, int]:
+    cache = get_cache()
+    entry = await asyncio.to_thread(cache.lookup, url) if cache else None
+    if entry and entry.fresh:
+        return entry.body, "cache", len(entry.body)
+
+    response = await fetch_async(
+        url, headers=entry.conditional_headers() if entry else None
+    )
+    if entry and response.status_code == 304:
+        await asyncio.to_thread(_revalidated, cache, url, response)
+        return entry.body, "revalidated", len(entry.body)
+    response.raise_for_status()
+
+    if cache:
+        if entry:
+            cache.record_miss()
+        await asyncio.to_thread(_store, cache, url, response)
+    return response.text, "network", len(response.content)
+
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    with _sync_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="fetcher-loop", daemon=True
+            ).start()
+            _background_loop = loop
+    return _background_loop
+
+
+def run(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Run ``coro`` on the fetcher's background event loop and block until it
+    finishes. Lets sync callers use the async engine without spinning up a
+    new loop (and a new connection pool) per call. Runs in a copy of the
+    caller's context, so context variables (e.g. request metrics) carry over.
+    """
+    ctx = contextvars.copy_context()
+
+    async def in_caller_context() -> Any:
+        return await asyncio.get_running_loop().create_task(coro, context=ctx)
+
+    return asyncio.run_coroutine_threadsafe(
+        in_caller_context(), _get_background_loop()
+    ).result()
+
+
+async def aclose() -> None:
+    """Close pooled connections (call on application shutdown)."""
+    global _sync_client
+    state = _async_states.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.client.aclose()
+    with _sync_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
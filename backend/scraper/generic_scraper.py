@@ -1,45 +1,47 @@
+import asyncio
 import json
 import re
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, List, Dict, Optional, Sequence
+from urllib.parse import urljoin
 
-# Selenium imports for JS-rendered pages
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+from backend import metrics, pricing
+from backend.products import UNKNOWN_TITLE, Product
+from backend.scraper import browser_pool, fetcher, parse_pool
+from backend.scraper.dom import LD_SCRIPT_RE, parse_html, text_or_none
+from backend.scraper.http_cache import RENDERED, get_cache
+from backend.scraper.profiles import Profile, domain_of, get_store
 
 
-def _get_text_or_none(element) -> Optional[str]:
-    """Safely get stripped text from a BeautifulSoup element."""
-    if not element:
-        return None
-    text = element.get_text(strip=True)
-    return text or None
+_ITEM_LIST_RE = re.compile(r'"@type"\s*:\s*(?:\[[^\]]*)?"ItemList"')
+
+# Shopify markers visible in the raw page (see _is_shopify)
+_RAW_SHOPIFY_RE = re.compile(
+    r"cdn\.shopify\.com|name=[\"']?shopify-digital-wallet|\bShopify\.(?:shop|theme|routes)\b"
+)
 
 
-def _is_shopify(html: str, soup: BeautifulSoup) -> bool:
+def _is_shopify(html: str, soup: Any) -> bool:
     """Heuristic check whether a site is built on Shopify."""
     if "cdn.shopify.com" in html:
         return True
 
+    # Every marker below contains "shopify" somewhere in the raw page
+    if "shopify" not in html.lower():
+        return False
+
     # Common Shopify markers
-    if soup.find("meta", {"name": "shopify-digital-wallet"}):
+    if soup.select_one("meta[name='shopify-digital-wallet']"):
         return True
 
-    scripts_text = " ".join(
-        s.get_text(" ", strip=True)[:200].lower()
-        for s in soup.find_all("script")
+    return any(
+        "shopify" in s.get_text(" ", strip=True)[:200].lower()
+        for s in soup.select("script")
     )
-    if "shopify" in scripts_text:
-        return True
 
-    return False
 
-
-def _extract_products_from_ld(ld_obj) -> List[Dict]:
+def _extract_products_from_ld(ld_obj) -> List[Product]:
     """Extract product info (title/price/availability/rating/reviews) from JSON-LD objects."""
-    products: List[Dict] = []
+    products: List[Product] = []
 
     def handle(obj):
         if isinstance(obj, list):
@@ -69,6 +71,10 @@ def _extract_products_from_ld(ld_obj) -> List[Dict]:
                 offers.get("price")
                 or offers.get("priceSpecification", {}).get("price")
             )
+            currency = (
+                offers.get("priceCurrency")
+                or offers.get("priceSpecification", {}).get("priceCurrency")
+            )
             availability = None
             if "availability" in offers:
                 availability = str(offers.get("availability")).split("/")[-1]
@@ -107,6 +113,9 @@ def _extract_products_from_ld(ld_obj) -> List[Dict]:
                     or reviews
                 )
 
+            # The product's own page (made absolute by _resolve_links)
+            link = obj.get("url") or offers.get("url")
+
             # If explicit reviews list is present, use its length as count
             if reviews is None and isinstance(obj.get("review"), list):
                 reviews = len(obj["review"])
@@ -121,21 +130,22 @@ def _extract_products_from_ld(ld_obj) -> List[Dict]:
                         reviews = None
 
             if name or price:
-                # Fill missing fields with readable placeholders
+                # Numbers stay numbers; placeholders are filled in on output.
+                # schema.org prices use "." for decimals whatever the locale
+                price_text = str(price) if price is not None else None
+                parsed = pricing.parse_decimal(price_text) if price_text else pricing.NO_PRICE
                 products.append(
-                    {
-                        "title": (name or "Unknown title"),
-                        "price": str(price) if price is not None else "N/A",
-                        "availability": availability or "Unknown",
-                        "rating": (
-                            f"{rating:.1f}" if isinstance(rating, (int, float)) else "N/A"
-                        ),
-                        "reviews": (
-                            str(int(reviews))
-                            if isinstance(reviews, (int, float))
-                            else "N/A"
-                        ),
-                    }
+                    Product(
+                        name or UNKNOWN_TITLE,
+                        price_text,
+                        availability,
+                        parsed.amount,
+                        rating,
+                        int(reviews) if isinstance(reviews, (int, float)) else None,
+                        str(currency).upper() if currency else parsed.currency,
+                        parsed.list_price,
+                        link if isinstance(link, str) and link else None,
+                    )
                 )
 
         # ItemList with embedded products
@@ -145,6 +155,10 @@ def _extract_products_from_ld(ld_obj) -> List[Dict]:
                 item = el.get("item") if isinstance(el, dict) else el
                 handle(item)
 
+        # {"@context": ..., "@graph": [...]} bundles several nodes
+        if "@graph" in obj:
+            handle(obj["@graph"])
+
     handle(ld_obj)
     return products
 
@@ -152,277 +166,542 @@ def _extract_products_from_ld(ld_obj) -> List[Dict]:
 def _render_with_selenium(url: str, timeout: int = 15) -> str:
     """
     Use headless Chrome (Selenium) to render JavaScript-heavy pages and
-    return the final page source.
+    return the final page source. Browsers come from the shared warm pool;
+    rendered pages are cached on disk for the domain's TTL.
     """
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=new")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/120.0.0.0 Safari/537.36"
-    )
-
-    driver = webdriver.Chrome(ChromeDriverManager().install(), options=chrome_options)
-    try:
+    cache = get_cache()
+    if cache:
+        html = cache.get_fresh(url, namespace=RENDERED)
+        if html is not None:
+            return html
+
+    metrics.inc("scrape_selenium_renders_total")
+    with metrics.stage("render"), browser_pool.get_pool().browser() as driver:
         driver.set_page_load_timeout(timeout)
         driver.get(url)
         # simple wait; for complex sites you'd add explicit waits
         driver.implicitly_wait(5)
         html = driver.page_source
-    finally:
-        driver.quit()
 
+    if cache:
+        cache.store(url, html, namespace=RENDERED)
     return html
 
 
-def _parse_products_from_soup(soup: BeautifulSoup) -> List[Dict]:
-    """
-    Try to scrape product-like information from *any* e-commerce page.
+# Generic "product card" selectors that work on many sites, tried in order
+CONTAINER_SELECTORS = [
+    "[data-product-id]",
+    "[itemtype*='Product']",
+    ".product-card",
+    ".product-grid-item",
+    ".product-item",
+    ".product",
+    ".product_pod",  # books.toscrape.com
+    "li.product",
+    "article.product",
+]
+
+# Candidates for each field inside a card, in priority order. "@name" reads
+# an attribute of the card itself instead of selecting a child element.
+FIELD_SELECTORS: Dict[str, List[str]] = {
+    "title": [
+        "@data-name",
+        "@data-product-name",
+        "[itemprop='name']",
+        ".product-title",
+        ".product-name",
+        "h3",
+        "h2",
+    ],
+    "price": [
+        "[itemprop='price']",
+        ".price",
+        ".product-price",
+        "[class*='price']",
+    ],
+    "availability": [
+        "[itemprop='availability']",
+        ".availability",
+        "[class*='stock']",
+    ],
+    "rating": [
+        "[itemprop='ratingValue']",
+        "[class*='rating']",
+        "[class*='star']",
+    ],
+    "reviews": [
+        "[itemprop='reviewCount']",
+        "[class*='review']",
+        "[class*='reviews']",
+    ],
+}
+
+
+def _first_element(card, selectors: List[str], field: str, matched: Optional[Dict]):
+    """First element matching one of ``selectors``; records the winner in ``matched``."""
+    for sel in selectors:
+        el = card.select_one(sel)
+        if el:
+            if matched is not None:
+                matched[field].add(sel)
+            return el
+    return None
+
+
+def _card_title(card, selectors: List[str], matched: Optional[Dict]) -> Optional[str]:
+    for sel in selectors:
+        if sel.startswith("@"):
+            value = card.get(sel[1:])
+        else:
+            value = text_or_none(card.select_one(sel))
+        if value:
+            if matched is not None:
+                matched["title"].add(sel)
+            return value
+    return None
+
+
+def _parse_card(
+    card, fields: Dict[str, List[str]], matched: Optional[Dict] = None
+) -> Optional[Product]:
+    """Extract one product from a card element using the given field selectors."""
+    # Title candidates
+    title = _card_title(card, fields["title"], matched)
+
+    # Price candidates
+    price_el = _first_element(card, fields["price"], "price", matched)
+    price = None
+    parsed = None
+    if price_el:
+        # For complex price blocks (regular price, sale price, "you'll save"),
+        # the raw text can be very long: keep the sale price with its currency,
+        # and the regular price as the list price.
+        content = price_el.get("content")
+        if content:
+            # Microdata content is machine-readable, like JSON-LD
+            parsed = pricing.parse_decimal(content)
+        else:
+            parsed = pricing.parse(price_el.get_text(" ", strip=True))
+        price = parsed.text or text_or_none(price_el)
+
+    # Availability candidates
+    availability_el = _first_element(card, fields["availability"], "availability", matched)
+    availability = None
+    if availability_el:
+        availability = (
+            availability_el.get("content")
+            or text_or_none(availability_el)
+        )
 
-    Strategy:
-    1. Fetch the page HTML.
-    2. Try several common product container selectors (works for many themes).
-    3. Inside each container, try common patterns for title / price / availability.
-    4. If nothing product-like is found, fall back to the original books.toscrape.com logic.
-    """
+    # Rating candidates
+    rating_el = _first_element(card, fields["rating"], "rating", matched)
+    rating = None
+    if rating_el:
+        text = rating_el.get_text(" ", strip=True)
+        # Prefer patterns that explicitly mention "out of 5" or "/5"
+        m = re.search(
+            r"(\d+(\.\d+)?)\s*(?:/|out of)\s*5", text, flags=re.IGNORECASE
+        )
+        if m:
+            rating = m.group(1)
+        else:
+            # Fallback: any first number like "4.5" or "4"
+            m = re.search(r"\d+(\.\d+)?", text)
+            if m:
+                rating = m.group(0)
+
+    # Reviews count candidates
+    reviews_el = _first_element(card, fields["reviews"], "reviews", matched)
+    reviews = None
+    if reviews_el:
+        text = reviews_el.get_text(" ", strip=True)
+        # There may be multiple numbers (price + review count).
+        # When the word "review" appears, the LAST number is usually the count.
+        nums = re.findall(r"\d+", text)
+        if nums:
+            if "review" in text.lower():
+                reviews = nums[-1]
+            else:
+                reviews = nums[0]
+
+    # Build a product row if we have at least a title or price.
+    # Try extra fallbacks so cells are not blank.
+    if not (title or price):
+        return None
+
+    # Extra title fallbacks: aria-label, anchor title, image alt
+    if not title:
+        title = (
+            card.get("aria-label")
+            or text_or_none(card.select_one("a[title]"))
+            or card.select_one("img").get("alt")
+            if card.select_one("img")
+            else None
+        )
 
-    products: List[Dict] = []
-
-    # 1. Try a set of generic "product card" selectors that work on many sites
-    container_selectors = [
-        "[data-product-id]",
-        "[data-product-id]",
-        "[itemtype*='Product']",
-        ".product-card",
-        ".product-grid-item",
-        ".product-item",
-        ".product",
-        ".product_pod",  # books.toscrape.com
-        "li.product",
-        "article.product",
-    ]
+    # The product's page: the card's own link, else the first one in it
+    link_el = card if card.get("href") else card.select_one("a[href]")
+    url = link_el.get("href") if link_el else None
 
+    return Product.from_raw(title, price, availability, rating, reviews, parsed, url)
+
+
+def _parse_cards(
+    soup: Any,
+    containers: List[str],
+    fields: Dict[str, List[str]],
+    learned: Optional[Dict] = None,
+) -> List[Product]:
+    """
+    Parse the first container selector that matches. When ``learned`` is
+    given it is filled with the winning container, the selectors that
+    matched per field, and the number of cards seen.
+    """
     product_cards = []
-    for sel in container_selectors:
+    container = None
+    for sel in containers:
         product_cards = soup.select(sel)
         if product_cards:
+            container = sel
             break
 
-    # 2. If we found product-like containers, parse each one
-    if product_cards:
-        for card in product_cards:
-            # Title candidates
-            title = (
-                card.get("data-name")
-                or card.get("data-product-name")
-                or _get_text_or_none(card.select_one("[itemprop='name']"))
-                or _get_text_or_none(card.select_one(".product-title"))
-                or _get_text_or_none(card.select_one(".product-name"))
-                or _get_text_or_none(card.select_one("h3"))
-                or _get_text_or_none(card.select_one("h2"))
-            )
+    matched = {field: set() for field in fields} if learned is not None else None
+    products: List[Product] = []
+    for card in product_cards:
+        product = _parse_card(card, fields, matched)
+        if product:
+            products.append(product)
+
+    if learned is not None:
+        learned["container"] = container
+        learned["cards"] = len(product_cards)
+        # Keep the original cascade order so priorities are unchanged
+        learned["fields"] = {
+            field: [sel for sel in selectors if sel in matched[field]]
+            for field, selectors in fields.items()
+        }
+    return products
 
-            # Price candidates
-            price_el = (
-                card.select_one("[itemprop='price']")
-                or card.select_one(".price")
-                or card.select_one(".product-price")
-                or card.select_one("[class*='price']")
-            )
-            price = None
-            if price_el:
-                # For complex price blocks (regular price, sale price, "you'll save"),
-                # the raw text can be very long. Try to extract a single currency amount.
-                raw_price = price_el.get("content") or price_el.get_text(" ", strip=True)
-                m = re.search(r"₹\s*([\d,]+(?:\.\d+)?)", raw_price)
-                if m:
-                    price = f"₹{m.group(1)}"
-                else:
-                    # Fallback: first number, otherwise full text
-                    m = re.search(r"\d+(\.\d+)?", raw_price)
-                    if m:
-                        price = m.group(0)
-                    else:
-                        price = _get_text_or_none(price_el)
-
-            # Availability candidates
-            availability_el = (
-                card.select_one("[itemprop='availability']")
-                or card.select_one(".availability")
-                or card.select_one("[class*='stock']")
-            )
-            availability = None
-            if availability_el:
-                availability = (
-                    availability_el.get("content")
-                    or _get_text_or_none(availability_el)
-                )
 
-            # Rating candidates
-            rating_el = (
-                card.select_one("[itemprop='ratingValue']")
-                or card.select_one("[class*='rating']")
-                or card.select_one("[class*='star']")
+def _parse_books(soup: Any) -> List[Product]:
+    """Explicit books.toscrape.com logic."""
+    products: List[Product] = []
+    for book in soup.select("article.product_pod"):
+        heading = book.select_one("h3")
+        link = heading.select_one("a") if heading else None
+        title = link.get("title") if link else None
+        price_el = book.select_one(".price_color")
+        availability_el = book.select_one(".availability")
+
+        # Rating on books.toscrape.com is via classes like "star-rating Three"
+        rating_el = book.select_one("p.star-rating")
+        rating = None
+        if rating_el and rating_el.has_attr("class"):
+            rating_classes = [
+                cls for cls in rating_el["class"] if cls.lower() != "star-rating"
+            ]
+            if rating_classes:
+                word = rating_classes[0].lower()
+                mapping = {
+                    "one": 1,
+                    "two": 2,
+                    "three": 3,
+                    "four": 4,
+                    "five": 5,
+                }
+                if word in mapping:
+                    rating = mapping[word]
+
+        products.append(
+            Product.from_raw(
+                title or text_or_none(heading),
+                text_or_none(price_el),
+                text_or_none(availability_el),
+                rating,
+                url=link.get("href") if link else None,
             )
-            rating = None
-            if rating_el:
-                text = rating_el.get_text(" ", strip=True)
-                # Prefer patterns that explicitly mention "out of 5" or "/5"
-                m = re.search(
-                    r"(\d+(\.\d+)?)\s*(?:/|out of)\s*5", text, flags=re.IGNORECASE
-                )
-                if m:
-                    rating = m.group(1)
-                else:
-                    # Fallback: any first number like "4.5" or "4"
-                    m = re.search(r"\d+(\.\d+)?", text)
-                    if m:
-                        rating = m.group(0)
-
-            # Reviews count candidates
-            reviews_el = (
-                card.select_one("[itemprop='reviewCount']")
-                or card.select_one("[class*='review']")
-                or card.select_one("[class*='reviews']")
+        )
+    return products
+
+
+def _parse_products_from_soup(soup: Any, learned: Optional[Dict] = None) -> List[Product]:
+    """
+    Try to scrape product-like information from *any* e-commerce page.
+
+    Strategy:
+    1. Try several common product container selectors (works for many themes).
+    2. Inside each container, try common patterns for title / price / availability.
+    3. If nothing product-like is found, fall back to the original books.toscrape.com logic.
+
+    ``learned`` (optional) receives the extraction profile that worked.
+    """
+    cards: Dict = {}
+    products = _parse_cards(soup, CONTAINER_SELECTORS, FIELD_SELECTORS, cards)
+    if products:
+        if learned is not None:
+            learned.update(
+                path="cards", container=cards["container"], fields=cards["fields"]
             )
-            reviews = None
-            if reviews_el:
-                text = reviews_el.get_text(" ", strip=True)
-                # There may be multiple numbers (price + review count).
-                # When the word "review" appears, the LAST number is usually the count.
-                nums = re.findall(r"\d+", text)
-                if nums:
-                    if "review" in text.lower():
-                        reviews = nums[-1]
-                    else:
-                        reviews = nums[0]
-
-            # Build a product row if we have at least a title or price.
-            # Try extra fallbacks so cells are not blank.
-            if title or price:
-                # Extra title fallbacks: aria-label, anchor title, image alt
-                if not title:
-                    title = (
-                        card.get("aria-label")
-                        or _get_text_or_none(card.select_one("a[title]"))
-                        or card.select_one("img").get("alt")
-                        if card.select_one("img")
-                        else None
-                    )
+        return products
+
+    # Fallback: explicit books.toscrape.com logic if nothing found
+    products = _parse_books(soup)
+    if products and learned is not None:
+        learned.update(path="books")
+    return products
+
+
+def _resolve_links(products: List[Product], url: Optional[str]) -> List[Product]:
+    """Make the products' page links absolute, relative to the listing ``url``."""
+    for product in products:
+        if product.url and product.url.startswith(("#", "javascript:")):
+            product.url = None
+        elif product.url and url:
+            product.url = urljoin(url, product.url)
+    return products
+
+
+def _products_from_ld_scripts(soup: Any) -> List[Product]:
+    """Collect products from every JSON-LD block on the page."""
+    products: List[Product] = []
+    for script in soup.select("script[type='application/ld+json']"):
+        try:
+            ld = json.loads(script.get_text() or "{}")
+        except Exception:
+            continue
+        products.extend(_extract_products_from_ld(ld))
+    return products
+
+
+def _products_from_raw_ld(html: str, url: Optional[str], rendered: bool) -> List[Product]:
+    """
+    JSON-LD pre-pass over the raw page, before any DOM is built.
+
+    Its products are used when the page is a Shopify store (where the DOM
+    path would prefer JSON-LD anyway) or when the JSON-LD carries an
+    ItemList, i.e. describes the listing itself. Otherwise, or when a
+    learned profile points at the HTML cards, returns [] and the caller
+    parses the page as before.
+    """
+    store = get_store()
+    domain = domain_of(url) if store else None
+    profile = store.peek(domain) if store else None
+    if profile and (profile.get("path") != "jsonld" or profile.get("rendered") != rendered):
+        return []
+
+    products: List[Product] = []
+    item_list = False
+    for m in LD_SCRIPT_RE.finditer(html):
+        block = m.group(1)
+        try:
+            ld = json.loads(block or "{}")
+        except Exception:
+            continue
+        products.extend(_extract_products_from_ld(ld))
+        item_list = item_list or bool(_ITEM_LIST_RE.search(block))
+
+    if not products or not (item_list or _RAW_SHOPIFY_RE.search(html)):
+        return []
+
+    if store and profile is None:
+        store.save(domain, {"rendered": rendered, "path": "jsonld"})
+    _count_extraction("jsonld_raw", rendered)
+    return _resolve_links(products, url)
+
+
+def _apply_profile(soup: Any, profile: Profile) -> List[Product]:
+    """Extract products with a learned profile only; [] if it no longer matches."""
+    path = profile.get("path")
+    if path == "jsonld":
+        return _products_from_ld_scripts(soup)
+    if path == "books":
+        return _parse_books(soup)
+    if path == "cards" and profile.get("container"):
+        learned: Dict = {}
+        products = _parse_cards(soup, [profile["container"]], profile["fields"], learned)
+        # Most cards yielding nothing means the layout changed under us
+        if len(products) * 2 < learned["cards"]:
+            return []
+        return products
+    return []
 
-                products.append(
-                    {
-                        "title": title or "Unknown title",
-                        "price": price or "N/A",
-                        "availability": availability or "Unknown",
-                        "rating": rating or "N/A",
-                        "reviews": reviews or "N/A",
-                    }
-                )
 
-    # 3. Fallback: explicit books.toscrape.com logic if nothing found
+def _products_from_soup(
+    html: str, soup: Any, url: Optional[str] = None, rendered: bool = False
+) -> List[Product]:
+    """
+    Extract products from an already-parsed page:
+    1. If ``url``'s domain has a learned profile, use just its winning path
+       and selectors.
+    2. If this looks like a Shopify site, prefer JSON-LD Product data.
+    3. Otherwise (or if that yields nothing) use generic HTML-based parsing.
+    Whatever works is recorded as the domain's profile.
+    """
+    store = get_store()
+    domain = domain_of(url) if store else None
+    profile = store.get(domain) if store else None
+    if profile and profile.get("rendered") == rendered:
+        products = _apply_profile(soup, profile)
+        if products:
+            _count_extraction(f"profile_{profile.get('path')}", rendered)
+            return _resolve_links(products, url)
+        store.forget(domain)
+
+    learned: Dict = {"rendered": rendered}
+    products: List[Product] = []
+    if _is_shopify(html, soup):
+        products = _products_from_ld_scripts(soup)
+        if products:
+            learned["path"] = "jsonld"
+
     if not products:
-        for book in soup.select("article.product_pod"):
-            title = book.h3.a.get("title") if book.h3 and book.h3.a else None
-            price_el = book.select_one(".price_color")
-            availability_el = book.select_one(".availability")
+        products = _parse_products_from_soup(soup, learned)
+
+    if products:
+        _count_extraction(learned["path"], rendered)
+        if store:
+            store.save(domain, learned)
+    return _resolve_links(products, url)
 
-            # Rating on books.toscrape.com is via classes like "star-rating Three"
-            rating_el = book.select_one("p.star-rating")
-            rating = None
-            if rating_el and rating_el.has_attr("class"):
-                rating_classes = [
-                    cls for cls in rating_el["class"] if cls.lower() != "star-rating"
-                ]
-                if rating_classes:
-                    word = rating_classes[0].lower()
-                    mapping = {
-                        "one": 1,
-                        "two": 2,
-                        "three": 3,
-                        "four": 4,
-                        "five": 5,
-                    }
-                    if word in mapping:
-                        rating = mapping[word]
-
-            products.append(
-                {
-                    "title": title or _get_text_or_none(book.h3) or "Unknown title",
-                    "price": _get_text_or_none(price_el) or "N/A",
-                    "availability": _get_text_or_none(availability_el) or "Unknown",
-                    "rating": f"{rating:.1f}" if isinstance(rating, (int, float)) else "N/A",
-                    "reviews": "N/A",
-                }
-            )
 
+def _count_extraction(path: str, rendered: bool) -> None:
+    metrics.inc("scrape_extraction_total", path=path, rendered=rendered)
+
+
+def _products_from_html(
+    html: str, url: Optional[str] = None, rendered: bool = False
+) -> List[Product]:
+    """
+    Extract products from already-fetched HTML. Pages whose JSON-LD
+    describes the products are handled without building a DOM at all.
+    """
+    with metrics.stage("parse"), pricing.using_locale(pricing.page_locale(html)):
+        products = _products_from_raw_ld(html, url, rendered)
+        if products:
+            return products
+        return _products_from_soup(html, parse_html(html), url, rendered)
+
+
+def _scrape_rendered(url: str) -> List[Product]:
+    """Fallback to Selenium for JS-rendered content."""
+    try:
+        rendered_html = _render_with_selenium(url)
+        return _products_from_html(rendered_html, url, rendered=True)
+    except Exception:
+        # If Selenium fails (e.g., no browser on machine), there is nothing to return
+        return []
+
+
+def _needs_rendering(url: str) -> bool:
+    """The domain's profile says products only show up after JS rendering."""
+    store = get_store()
+    profile = store.get(domain_of(url)) if store else None
+    return bool(profile and profile.get("rendered"))
+
+
+def _count_scrape(entry: str, products: Sequence[Product]) -> Sequence[Product]:
+    metrics.inc("scrape_requests_total", entry=entry)
+    metrics.inc("scrape_products_total", len(products), entry=entry)
     return products
 
 
-def generic_scrape(url: str) -> List[Dict]:
+def generic_scrape(
+    url: str,
+    crawl: bool = False,
+    max_pages: Optional[int] = None,
+    max_products: Optional[int] = None,
+) -> Sequence[Product]:
     """
     High-level entry point:
-    1. Try static HTML with requests.
+    1. Try static HTML over the shared, connection-pooled HTTP client.
     2. If we don't find any products, try JS-rendered HTML via Selenium.
+
+    With ``crawl=True`` the page is treated as a category listing and its
+    pagination is followed (see ``backend.scraper.crawler``), up to
+    ``max_pages`` pages / ``max_products`` products, and the products come
+    back as a ``ProductBatch``; otherwise as a list of ``Product``.
     """
+    if crawl:
+        from backend.scraper.crawler import crawl_category
 
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
+        return _count_scrape(
+            "crawl", fetcher.run(crawl_category(url, max_pages, max_products))
         )
-    }
+
+    # 0. Known JS-rendered store: go straight to the browser
+    if _needs_rendering(url):
+        products = _scrape_rendered(url)
+        if products:
+            return _count_scrape("rendered", products)
 
     # 1. Try simple static HTML fetch
-    response = requests.get(url, headers=headers, timeout=15)
-    response.raise_for_status()
-    html = response.text
-    soup = BeautifulSoup(html, "html.parser")
+    html = fetcher.fetch_html(url)
+    products = parse_pool.parse_products(html, url)
+    if products:
+        return _count_scrape("static", products)
 
-    # 1a. If this looks like a Shopify site, prefer JSON-LD Product data
-    products: List[Dict] = []
-    if _is_shopify(html, soup):
-        for script in soup.find_all("script", type="application/ld+json"):
-            try:
-                ld = json.loads(script.string or script.text or "{}")
-            except Exception:
-                continue
-            products.extend(_extract_products_from_ld(ld))
+    # 2. Fallback to Selenium for JS-rendered content
+    metrics.inc("scrape_selenium_fallback_total")
+    return _count_scrape("fallback", _scrape_rendered(url))
+
+
+async def generic_scrape_async(
+    url: str,
+    crawl: bool = False,
+    max_pages: Optional[int] = None,
+    max_products: Optional[int] = None,
+) -> Sequence[Product]:
+    """
+    Asyncio variant of :func:`generic_scrape` for concurrent sweeps.
+
+    The fetch runs on the event loop; CPU-bound parsing (see ``parse_pool``)
+    and the blocking Selenium fallback are pushed to worker threads or
+    processes so they do not stall it.
+    """
+    if crawl:
+        from backend.scraper.crawler import crawl_category
 
+        return _count_scrape(
+            "crawl", await crawl_category(url, max_pages, max_products)
+        )
+
+    if _needs_rendering(url):
+        products = await asyncio.to_thread(_scrape_rendered, url)
         if products:
-            return products
+            return _count_scrape("rendered", products)
 
-    # 1b. Generic HTML-based parsing
-    products = _parse_products_from_soup(soup)
+    html = await fetcher.fetch_html_async(url)
+    products = await parse_pool.parse_products_async(html, url)
     if products:
-        return products
+        return _count_scrape("static", products)
 
-    # 2. Fallback to Selenium for JS-rendered content
-    try:
-        rendered_html = _render_with_selenium(url)
-        rendered_soup = BeautifulSoup(rendered_html, "html.parser")
+    metrics.inc("scrape_selenium_fallback_total")
+    return _count_scrape("fallback", await asyncio.to_thread(_scrape_rendered, url))
 
-        # 2a. Shopify JSON-LD on rendered page
-        if _is_shopify(rendered_html, rendered_soup):
-            for script in rendered_soup.find_all(
-                "script", type="application/ld+json"
-            ):
-                try:
-                    ld = json.loads(script.string or script.text or "{}")
-                except Exception:
-                    continue
-                products.extend(_extract_products_from_ld(ld))
 
-            if products:
-                return products
+async def generic_scrape_stream(
+    url: str,
+    crawl: bool = False,
+    max_pages: Optional[int] = None,
+    max_products: Optional[int] = None,
+    outcome: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[List[Product]]:
+    """
+    :func:`generic_scrape_async` as a stream of product lists: one per
+    crawled page as soon as it is parsed (a single one without ``crawl``).
+    ``outcome`` is passed on to ``crawl_category_pages``.
+    """
+    if not crawl:
+        products = await generic_scrape_async(url)
+        if products:
+            yield products
+        return
 
-        # 2b. Generic HTML-based parsing on rendered content
-        products = _parse_products_from_soup(rendered_soup)
-        return products
-    except Exception:
-        # If Selenium fails (e.g., no browser on machine), just return whatever we found
-        return products
+    from backend.scraper.crawler import crawl_category_pages
+
+    count = 0
+    async for products in crawl_category_pages(url, max_pages, max_products, outcome):
+        count += len(products)
+        yield products
+    metrics.inc("scrape_requests_total", entry="crawl")
+    metrics.inc("scrape_products_total", count, entry="crawl")
@@ -0,0 +1,278 @@
+"""
+On-disk cache for fetched (and browser-rendered) store pages.
+
+Bodies are zlib-compressed in a single SQLite file keyed by URL. Entries
+younger than their domain's TTL are served straight from disk; older ones
+are revalidated with ``If-None-Match`` / ``If-Modified-Since`` so an
+unchanged page costs a 304 instead of a full download. The origin's
+``Cache-Control`` is honoured: ``no-store`` responses are not cached,
+``no-cache`` ones are revalidated on every use, and ``max-age`` shortens
+the configured TTL. The file is kept under a byte budget by evicting the
+least recently used entries.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from backend import config
+
+# Namespaces: raw HTTP responses vs. HTML rendered by the browser pool
+HTTP = "http"
+RENDERED = "rendered"
+
+_MAX_AGE_RE = re.compile(r"(?:^|,)\s*max-age\s*=\s*\"?(\d+)", re.IGNORECASE)
+
+
+def parse_cache_control(header: Optional[str]) -> Tuple[bool, Optional[int]]:
+    """
+    ``(storable, ttl)`` from a ``Cache-Control`` header: ``no-store`` is
+    not storable, ``no-cache`` has a TTL of 0 (revalidate on every use),
+    ``max-age=N`` a TTL of N; otherwise the TTL is None (configured TTL).
+    """
+    directives = {d.strip().split("=", 1)[0].lower() for d in (header or "").split(",")}
+    if "no-store" in directives:
+        return False, None
+    if "no-cache" in directives:
+        return True, 0
+    m = _MAX_AGE_RE.search(header or "")
+    return True, int(m.group(1)) if m else None
+
+
+def _parse_domain_ttls(spec: str) -> Dict[str, int]:
+    ttls: Dict[str, int] = {}
+    for item in spec.split(","):
+        domain, _, ttl = item.partition("=")
+        domain = domain.strip().lower()
+        if domain and ttl.strip().isdigit():
+            ttls[domain] = int(ttl)
+    return ttls
+
+
+class CacheEntry:
+    def __init__(
+        self,
+        body: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        fresh: bool,
+    ):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Headers that turn a refetch into a revalidation request."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = config.HTTP_CACHE_MAX_BYTES,
+        default_ttl: int = config.HTTP_CACHE_TTL,
+        domain_ttls: Optional[Dict[str, int]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.domain_ttls = domain_ttls or {}
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                namespace TEXT NOT NULL,
+                url TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                ttl INTEGER,
+                PRIMARY KEY (namespace, url)
+            )
+            """
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(pages)")}
+        if "ttl" not in columns:
+            # Cache files written before Cache-Control was honoured
+            self._db.execute("ALTER TABLE pages ADD COLUMN ttl INTEGER")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)"
+        )
+        # Running total of the stored sizes, so stores need no table scan;
+        # resynchronized whenever it says the budget is exceeded
+        self._bytes = self._total_size()
+
+    def _total_size(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def ttl_for(self, url: str) -> int:
+        """TTL of the most specific configured domain (``a.b.com``, ``b.com``, ...)."""
+        host = (urlsplit(url).hostname or "").lower()
+        while host:
+            if host in self.domain_ttls:
+                return self.domain_ttls[host]
+            _, _, host = host.partition(".")
+        return self.default_ttl
+
+    def _effective_ttl(self, url: str, ttl: Optional[int]) -> int:
+        # The origin's max-age / no-cache may shorten the configured TTL
+        configured = self.ttl_for(url)
+        return configured if ttl is None else min(ttl, configured)
+
+    def lookup(self, url: str, namespace: str = HTTP) -> Optional[CacheEntry]:
+        """Return the cached entry for ``url`` (fresh or stale), or None."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, etag, last_modified, stored_at, ttl FROM pages "
+                "WHERE namespace = ? AND url = ?",
+                (namespace, url),
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._db.execute(
+                "UPDATE pages SET accessed_at = ? WHERE namespace = ? AND url = ?",
+                (now, namespace, url),
+            )
+            body, etag, last_modified, stored_at, ttl = row
+            fresh = now - stored_at < self._effective_ttl(url, ttl)
+            # Stale entries are counted once the revalidation outcome is known
+            if fresh:
+                self.stats["hits"] += 1
+
+        return CacheEntry(zlib.decompress(body).decode("utf-8"), etag, last_modified, fresh)
+
+    def get_fresh(self, url: str, namespace: str = HTTP) -> Optional[str]:
+        """Body of ``url`` if it is cached and within its TTL."""
+        entry = self.lookup(url, namespace)
+        if entry is None:
+            return None
+        if not entry.fresh:
+            self.record_miss()
+            return None
+        return entry.body
+
+    def record_miss(self) -> None:
+        """A stale entry had to be downloaded again."""
+        with self._lock:
+            self.stats["misses"] += 1
+
+    def mark_revalidated(
+        self, url: str, namespace: str = HTTP, ttl: Optional[int] = None
+    ) -> None:
+        """
+        The origin answered 304: restart the entry's TTL. ``ttl`` (as in
+        :meth:`store`) comes from the 304's ``Cache-Control``; None keeps the
+        stored one.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET stored_at = ?, ttl = COALESCE(?, ttl) "
+                "WHERE namespace = ? AND url = ?",
+                (time.time(), ttl, namespace, url),
+            )
+            self.stats["revalidated"] += 1
+
+    def store(
+        self,
+        url: str,
+        body: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        namespace: str = HTTP,
+        ttl: Optional[int] = None,
+    ) -> None:
+        """
+        Cache ``body``. ``ttl`` is the origin's freshness lifetime in
+        seconds (0 = revalidate on every use); None uses the configured TTL.
+        """
+        blob = zlib.compress(body.encode("utf-8"), 6)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._db.execute(
+                "SELECT size FROM pages WHERE namespace = ? AND url = ?", (namespace, url)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages "
+                "(namespace, url, body, etag, last_modified, stored_at, accessed_at, size, ttl) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (namespace, url, blob, etag, last_modified, now, now, len(blob), ttl),
+            )
+            self._bytes += len(blob) - (old[0] if old else 0)
+            self.stats["stores"] += 1
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Called with the lock held. Other processes may share the file, so
+        # the running total is only an estimate until recounted here
+        total = self._bytes = self._total_size()
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT namespace, url, size FROM pages ORDER BY accessed_at"
+        )
+        victims = []
+        for namespace, url, size in rows:
+            if total <= self.max_bytes:
+                break
+            victims.append((namespace, url))
+            total -= size
+        self._db.executemany(
+            "DELETE FROM pages WHERE namespace = ? AND url = ?", victims
+        )
+        self._bytes = total
+        self.stats["evictions"] += len(victims)
+
+    def summary(self) -> Dict[str, int]:
+        """Counters plus current entry count and on-disk size."""
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages"
+            ).fetchone()
+        return {**self.stats, "entries": entries, "bytes": size}
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[HttpCache]:
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _cache
+    if not config.HTTP_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache(
+                os.path.join(config.HTTP_CACHE_DIR, "pages.sqlite3"),
+                domain_ttls=_parse_domain_ttls(config.HTTP_CACHE_DOMAIN_TTLS),
+            )
+        return _cache
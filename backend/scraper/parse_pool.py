@@ -0,0 +1,292 @@
+"""
+HTML parsing off the API process.
+
+Parsing a listing (DOM build, selector matching, JSON-LD decoding) is CPU
+bound and holds the GIL, so with ``PARSE_MODE=thread`` concurrent crawls
+share one core no matter how many worker threads parse. With
+``PARSE_MODE=process`` pages of at least ``PARSE_PROCESS_MIN_BYTES`` are
+parsed in a pool of ``PARSE_WORKERS`` processes instead:
+
+- only the page text and URL go to a worker, and only plain data (products,
+  reviews, pagination links) comes back; soups never cross;
+- the parent's extraction profile for the page's domain is sent along, and
+  the profile the worker learned or dropped is applied to the parent's
+  store, which stays the only one writing the profile file;
+- the worker's metrics are captured and replayed in the parent, so parse
+  timings still reach ``/metrics`` and the request's Server-Timing;
+- workers are replaced after ``PARSE_MAX_TASKS_PER_CHILD`` pages, which
+  bounds memory growth from parser caches and fragmentation;
+- a page taking longer than ``PARSE_TIMEOUT`` raises :class:`ParseTimeout`
+  and the pool is restarted, killing the stuck worker; other pages that were
+  in flight on it are retried once on the new pool. Time spent queued
+  behind other pages is allowed for: a page's deadline grows by one
+  ``PARSE_TIMEOUT`` per full round of pages ahead of it in the pool, so
+  load alone does not time out healthy pages.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from backend import config, metrics
+from backend.products import Product
+from backend.scraper.profiles import Profile, domain_of, get_store, use_store
+
+logger = logging.getLogger(__name__)
+
+# Task kinds: a single page's products, a crawl page (products + nav), or
+# a page of reviews (reviews + next page)
+PRODUCTS = "products"
+PAGE = "page"
+REVIEWS = "reviews"
+
+
+class ParseTimeout(Exception):
+    """A page took longer than ``PARSE_TIMEOUT`` to parse."""
+
+
+class _WorkerLost(Exception):
+    # The pool was restarted while this task was in flight
+    pass
+
+
+class _TaskProfiles:
+    """
+    Stand-in for the profile store inside a worker: serves the profile the
+    parent holds for the page's domain and records what the task changes.
+    """
+
+    def __init__(self, domain: Optional[str], known: Optional[Profile], current: Optional[Profile]):
+        self.domain = domain
+        self.known = known  # what the parent's store.peek() returned
+        self.current = current  # what its store.get() returned (None = reprobe)
+        self.ops: List[Tuple[str, Optional[str], Optional[Profile]]] = []
+
+    def get(self, domain: Optional[str]) -> Optional[Profile]:
+        return self.current if domain == self.domain else None
+
+    def peek(self, domain: Optional[str]) -> Optional[Profile]:
+        return self.known if domain == self.domain else None
+
+    def save(self, domain: Optional[str], profile: Profile) -> None:
+        self.ops.append(("save", domain, profile))
+
+    def forget(self, domain: Optional[str]) -> None:
+        self.ops.append(("forget", domain, None))
+
+
+def _warm() -> None:
+    # Pool initializer: pay the parser imports before the first page
+    from backend.scraper import crawler  # noqa: F401
+
+
+def _task(kind: str, html: str, url: Optional[str], rendered: bool, profiles: Optional[_TaskProfiles]):
+    """Runs in a worker: parse one page, return plain data only."""
+    from backend.scraper import crawler, generic_scraper, review_scraper
+
+    with use_store(profiles), metrics.capture() as events:
+        if kind == PAGE:
+            result = crawler._parse_page(html, url)
+        elif kind == REVIEWS:
+            result = review_scraper.extract_reviews(html, url)
+        else:
+            result = generic_scraper._products_from_html(html, url, rendered)
+    return result, profiles.ops if profiles else [], events
+
+
+class _Pool:
+    """A ``multiprocessing.Pool`` that can be killed and replaced as a whole."""
+
+    def __init__(self, workers: int, max_tasks: int):
+        # Not fork: the API process runs threads (event loops, writers)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+        self.workers = workers
+        self.pool = context.Pool(
+            workers, initializer=_warm, maxtasksperchild=max_tasks or None
+        )
+        self._inflight: Set[Future] = set()
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def submit(self, args: Tuple) -> Tuple[Future, float]:
+        """
+        Queue a task; returns its future and how long to wait for it: the
+        parse timeout, plus one per round of tasks queued ahead of it.
+        """
+        future: Future = Future()
+
+        def done(result: Any) -> None:
+            with self._lock:
+                self._inflight.discard(future)
+            if not future.done():
+                future.set_result(result)
+
+        def failed(exc: BaseException) -> None:
+            with self._lock:
+                self._inflight.discard(future)
+            if not future.done():
+                future.set_exception(exc)
+
+        with self._lock:
+            if self.closed:
+                raise _WorkerLost()
+            rounds = 1 + len(self._inflight) // self.workers
+            self._inflight.add(future)
+        self.pool.apply_async(_task, args, callback=done, error_callback=failed)
+        return future, config.PARSE_TIMEOUT * rounds
+
+    def terminate(self) -> None:
+        with self._lock:
+            self.closed = True
+            inflight, self._inflight = self._inflight, set()
+        self.pool.terminate()
+        # Their results will never arrive
+        for future in inflight:
+            if not future.done():
+                future.set_exception(_WorkerLost())
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+        self.pool.close()
+        self.pool.join()
+
+
+_pool: Optional[_Pool] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> _Pool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _Pool(
+                config.PARSE_WORKERS or os.cpu_count() or 1,
+                config.PARSE_MAX_TASKS_PER_CHILD,
+            )
+        return _pool
+
+
+def _restart(pool: _Pool) -> None:
+    """Kill ``pool`` (if still current); the next task starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    logger.warning("Restarting the parse pool after a timed-out page")
+    pool.terminate()
+
+
+def shutdown() -> None:
+    """Stop the worker processes (they are started on first use)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def _offload(html: str) -> bool:
+    return config.PARSE_MODE == "process" and len(html) >= config.PARSE_PROCESS_MIN_BYTES
+
+
+def _task_args(kind: str, html: str, url: Optional[str], rendered: bool) -> Tuple:
+    store = get_store()
+    profiles = None
+    # Review extraction does not use the profiles
+    if store is not None and kind != REVIEWS:
+        domain = domain_of(url)
+        profiles = _TaskProfiles(domain, store.peek(domain), store.get(domain))
+    return (kind, html, url, rendered, profiles)
+
+
+def _apply(outcome: Tuple) -> Any:
+    result, ops, events = outcome
+    store = get_store()
+    for op, domain, profile in ops:
+        if store is None:
+            break
+        if op == "save":
+            store.save(domain, profile)
+        else:
+            store.forget(domain)
+    metrics.replay(events)
+    metrics.inc("parse_tasks_total", outcome="ok")
+    return result
+
+
+def _run(args: Tuple) -> Any:
+    for _ in range(2):
+        pool = _get_pool()
+        try:
+            future, timeout = pool.submit(args)
+            return _apply(future.result(timeout=timeout))
+        except FutureTimeout:
+            metrics.inc("parse_tasks_total", outcome="timeout")
+            _restart(pool)
+            raise ParseTimeout(f"parsing {args[2]} took over {config.PARSE_TIMEOUT}s")
+        except _WorkerLost:
+            metrics.inc("parse_tasks_total", outcome="retried")
+    raise ParseTimeout(f"parse workers were restarted twice while parsing {args[2]}")
+
+
+async def _run_async(args: Tuple) -> Any:
+    for _ in range(2):
+        pool = _get_pool()
+        try:
+            future, timeout = pool.submit(args)
+            outcome = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+            return _apply(outcome)
+        except asyncio.TimeoutError:
+            metrics.inc("parse_tasks_total", outcome="timeout")
+            _restart(pool)
+            raise ParseTimeout(f"parsing {args[2]} took over {config.PARSE_TIMEOUT}s")
+        except _WorkerLost:
+            metrics.inc("parse_tasks_total", outcome="retried")
+    raise ParseTimeout(f"parse workers were restarted twice while parsing {args[2]}")
+
+
+def parse_products(html: str, url: Optional[str] = None, rendered: bool = False) -> List[Product]:
+    """``generic_scraper._products_from_html``, in the pool when configured."""
+    if not _offload(html):
+        from backend.scraper.generic_scraper import _products_from_html
+
+        return _products_from_html(html, url, rendered)
+    return _run(_task_args(PRODUCTS, html, url, rendered))
+
+
+async def parse_products_async(
+    html: str, url: Optional[str] = None, rendered: bool = False
+) -> List[Product]:
+    """Like :func:`parse_products`, in a worker thread when not offloaded."""
+    if not _offload(html):
+        from backend.scraper.generic_scraper import _products_from_html
+
+        return await asyncio.to_thread(_products_from_html, html, url, rendered)
+    return await _run_async(_task_args(PRODUCTS, html, url, rendered))
+
+
+async def parse_page_async(html: str, url: str) -> Tuple[List[Product], Any]:
+    """``crawler._parse_page`` (products, pagination) off the event loop."""
+    from backend.scraper.crawler import _parse_page
+
+    if not _offload(html):
+        return await asyncio.to_thread(_parse_page, html, url)
+    return await _run_async(_task_args(PAGE, html, url, False))
+
+
+async def parse_reviews_async(html: str, url: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """``review_scraper.extract_reviews`` (reviews, next page) off the event loop."""
+    from backend.scraper.review_scraper import extract_reviews
+
+    if not _offload(html):
+        return await asyncio.to_thread(extract_reviews, html, url)
+    return await _run_async(_task_args(REVIEWS, html, url, False))
@@ -1,5 +1,6 @@
 import requests
-from bs4 import BeautifulSoup
+
+from backend.scraper.dom import parse_html
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0"
@@ -7,12 +8,12 @@ HEADERS = {
 
 def scrape_products(url):
     response = requests.get(url, headers=HEADERS)
-    soup = BeautifulSoup(response.text, "html.parser")
+    soup = parse_html(response.text)
 
     products = []
 
     for item in soup.select(".product_pod"):
-        title = item.h3.a["title"]
+        title = item.select_one("h3 a")["title"]
         price = item.select_one(".price_color").text
         availability = item.select_one(".availability").text.strip()
 
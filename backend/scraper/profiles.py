@@ -0,0 +1,149 @@
+"""
+Per-domain extraction profiles.
+
+A profile remembers how products were found on a domain last time so later
+scrapes can skip the selector probing cascade:
+
+    {
+      "rendered": false,          # products only appeared after Selenium
+      "path": "cards",            # "jsonld" | "cards" | "books"
+      "container": ".product-card",
+      "fields": {"title": ["h3"], "price": [".price"], ...}
+    }
+
+``fields`` lists, per field, the selectors that matched at least one card,
+in the original cascade order. Profiles are persisted as one JSON file.
+"""
+import contextvars
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+from backend import config
+
+Profile = Dict[str, Any]
+
+
+def domain_of(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host or None
+
+
+class ProfileStore:
+    def __init__(
+        self,
+        path: str,
+        reprobe_every: int = config.EXTRACTION_PROFILE_REPROBE_EVERY,
+    ):
+        self.path = path
+        self.reprobe_every = reprobe_every
+        self.stats = {"hits": 0, "misses": 0, "mismatches": 0, "learned": 0}
+        self._lock = threading.Lock()
+        self._uses: Dict[str, int] = {}
+        self._profiles: Dict[str, Profile] = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._profiles = json.load(f)
+        except (OSError, ValueError):
+            self._profiles = {}
+
+    def get(self, domain: Optional[str]) -> Optional[Profile]:
+        """Profile for ``domain``, or None when it should be (re)probed."""
+        if not domain:
+            return None
+        with self._lock:
+            profile = self._profiles.get(domain)
+            if profile is None:
+                self.stats["misses"] += 1
+                return None
+            uses = self._uses.get(domain, 0) + 1
+            if self.reprobe_every and uses > self.reprobe_every:
+                # Periodic full probe to refresh the profile
+                self._uses[domain] = 0
+                self.stats["misses"] += 1
+                return None
+            self._uses[domain] = uses
+            self.stats["hits"] += 1
+            return profile
+
+    def peek(self, domain: Optional[str]) -> Optional[Profile]:
+        """Profile for ``domain`` without counting a use."""
+        if not domain:
+            return None
+        with self._lock:
+            return self._profiles.get(domain)
+
+    def save(self, domain: Optional[str], profile: Profile) -> None:
+        if not domain:
+            return
+        with self._lock:
+            if self._profiles.get(domain) == profile:
+                return
+            self._profiles[domain] = profile
+            self.stats["learned"] += 1
+            self._flush()
+
+    def forget(self, domain: Optional[str]) -> None:
+        """The profile no longer matches the site."""
+        if not domain:
+            return
+        with self._lock:
+            self.stats["mismatches"] += 1
+            if self._profiles.pop(domain, None) is not None:
+                self._flush()
+
+    def _flush(self) -> None:
+        # Called with the lock held; write-then-rename so readers never
+        # see a half-written file
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._profiles, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            # Profiles are an optimization; keep working from memory
+            pass
+
+
+_store: Optional[ProfileStore] = None
+_store_lock = threading.Lock()
+
+# Store used instead of the process-wide one (see use_store)
+_override: "contextvars.ContextVar[Optional[Any]]" = contextvars.ContextVar(
+    "profile_store", default=None
+)
+
+
+@contextmanager
+def use_store(store: Any) -> Iterator[None]:
+    """
+    Make :func:`get_store` return ``store`` inside the ``with`` block, e.g.
+    a stand-in that records what a parse worker process learned.
+    """
+    token = _override.set(store)
+    try:
+        yield
+    finally:
+        _override.reset(token)
+
+
+def get_store() -> Optional[ProfileStore]:
+    """Process-wide profile store, or None when profiles are disabled."""
+    global _store
+    override = _override.get()
+    if override is not None:
+        return override
+    if not config.EXTRACTION_PROFILES_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ProfileStore(config.EXTRACTION_PROFILES_PATH)
+        return _store
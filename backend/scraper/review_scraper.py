@@ -1,23 +1,393 @@
-import requests
-from bs4 import BeautifulSoup
+"""
+Product review crawler.
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0"
-}
+:func:`crawl_reviews` collects the reviews of many products at once.
+``REVIEW_CONCURRENCY`` review pages are in flight across all products, and
+the fetcher's ``FETCH_MAX_PER_HOST`` cap keeps a store's products from
+all landing on it at the same moment. Each product's review pagination is
+followed up to ``REVIEW_MAX_PAGES`` pages: ``rel=next`` style links inside
+the reviews section or leading to review URLs, or a "see all reviews"
+link. Every page is given
+``REVIEW_PAGE_TIMEOUT`` seconds to download and parse.
 
-def scrape_reviews(product_url):
-    reviews = []
+Results are yielded page by page as they come in, so the caller can
+persist them while the crawl goes on (see
+``backend.pipeline.crawl_and_save_reviews``). A page that fails is
+reported as an ``error`` entry and ends that product's pagination only.
 
-    response = requests.get(product_url, headers=HEADERS)
-    soup = BeautifulSoup(response.text, "html.parser")
+Reviews are read from JSON-LD ``Review`` objects when the page has them,
+otherwise from review markup. Each one becomes a dict with ``rating``
+(0-5, None if absent), ``date`` (ISO ``YYYY-MM-DD`` when recognizable,
+otherwise the text shown), ``text`` and ``author``. :func:`scrape_reviews`
+still returns only the texts of one product's reviews.
+"""
+import asyncio
+import json
+import re
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin
 
-    review_blocks = soup.find_all("div", class_="review")
+from backend import config, metrics
+from backend.scraper import fetcher
+from backend.scraper.crawler import NEXT_SELECTORS
+from backend.scraper.dom import LD_SCRIPT_RE, parse_html, text_or_none
+from backend.scraper.parse_pool import parse_reviews_async
 
-    for block in review_blocks:
+# One element per review, most specific first; the first that matches wins
+REVIEW_SELECTORS = [
+    "[itemprop='review']",
+    "[data-review-id]",
+    "[data-hook='review']",
+    "div.review",
+    "li.review",
+    "article.review",
+    "[class*='review-item']",
+    "[class*='review-card']",
+    "[class*='ReviewItem']",
+]
+
+REVIEW_TEXT_SELECTORS = [
+    "[itemprop='reviewBody']",
+    "[itemprop='description']",
+    "[data-hook='review-body']",
+    "[class*='review-text']",
+    "[class*='review-body']",
+    "[class*='review-content']",
+    "p",
+]
+
+REVIEW_RATING_SELECTORS = [
+    "[itemprop='ratingValue']",
+    "[data-rating]",
+    "[data-score]",
+    "[class*='star']",
+    "[class*='rating']",
+]
+
+REVIEW_DATE_SELECTORS = [
+    "[itemprop='datePublished']",
+    "time",
+    "[data-hook='review-date']",
+    "[class*='date']",
+]
+
+REVIEW_AUTHOR_SELECTORS = [
+    "[itemprop='author'] [itemprop='name']",
+    "[itemprop='author']",
+    "[data-hook='review-author']",
+    "[class*='author']",
+]
+
+# The reviews section of a product page (pagination is looked for in it)
+REVIEW_SECTION_SELECTORS = (
+    "#reviews, #customer-reviews, [id*='review'], [class*='reviews'], "
+    "[data-hook*='review'], [itemprop='review']"
+)
+
+_ALL_REVIEWS_TEXT = re.compile(
+    r"\b(?:see|read|show|view)\s+(?:all|more)\b.*\breviews?\b", re.IGNORECASE
+)
+# "4.5 out of 5", "9/10"; a bare "of" is too loose ("4 of 12 people found this helpful")
+_OUT_OF_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:/|out\s+of)\s*(\d+)\b", re.IGNORECASE)
+_SCALES = ("5", "10", "100")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+# "star-rating Four", "stars-4", "rating-45" (4.5)
+_RATING_CLASS_RE = re.compile(r"(?:star|rating)s?[-_]?(\d{1,2})$", re.IGNORECASE)
+_RATING_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+_ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_DATE_FORMATS = (
+    "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y", "%B %d %Y",
+    "%m/%d/%Y", "%d.%m.%Y", "%Y/%m/%d",
+)
+# "Reviewed in the United States on March 3, 2024"
+_DATE_PREFIX_RE = re.compile(r"^.*\b(?:on|posted|reviewed|published)\b\s*:?\s*", re.IGNORECASE)
+
+Review = Dict[str, Any]
+
+
+def _rating(value: Any, best: Any = None) -> Optional[float]:
+    """A rating on a 0-5 scale; ``best`` is the top of the scale if not 5."""
+    try:
+        rating = float(str(value).replace(",", "."))
+        scale = float(str(best).replace(",", ".")) if best not in (None, "") else 5.0
+    except (TypeError, ValueError):
+        return None
+    if scale > 0 and scale != 5:
+        rating = rating / scale * 5
+    return round(rating, 2) if 0 <= rating <= 5 else None
+
+
+def _date(value: Optional[str]) -> Optional[str]:
+    """ISO date of a review date text when it can be read, else the text."""
+    if not value:
+        return None
+    value = " ".join(value.split())
+    m = _ISO_DATE_RE.search(value)
+    if m:
+        return m.group(0)
+    candidate = _DATE_PREFIX_RE.sub("", value).rstrip(".")
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(candidate, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+def _review(rating: Optional[float], date: Optional[str], text: Optional[str], author: Optional[str]) -> Review:
+    return {
+        "rating": rating,
+        "date": _date(date),
+        "text": " ".join(text.split()) if text else None,
+        "author": author or None,
+    }
+
+
+def _ld_author(author: Any) -> Optional[str]:
+    if isinstance(author, list):
+        author = author[0] if author else None
+    if isinstance(author, dict):
+        author = author.get("name")
+    return str(author) if author else None
+
+
+def _reviews_from_ld(html: str) -> List[Review]:
+    """Reviews in the page's JSON-LD (``Review`` nodes, ``Product.review``)."""
+    reviews: List[Review] = []
+
+    def handle(obj: Any) -> None:
+        if isinstance(obj, list):
+            for item in obj:
+                handle(item)
+            return
+        if not isinstance(obj, dict):
+            return
+        types = obj.get("@type")
+        types = [t.lower() for t in types if isinstance(t, str)] if isinstance(types, list) else [str(types).lower()]
+        if "review" in types:
+            rating = obj.get("reviewRating") or {}
+            if isinstance(rating, dict):
+                rating = _rating(rating.get("ratingValue"), rating.get("bestRating"))
+            else:
+                rating = _rating(rating)
+            text = obj.get("reviewBody") or obj.get("description")
+            if text or rating is not None:
+                reviews.append(_review(
+                    rating, obj.get("datePublished"), str(text) if text else None, _ld_author(obj.get("author"))
+                ))
+            return
+        for key in ("review", "reviews", "@graph", "itemListElement", "item"):
+            if key in obj:
+                handle(obj[key])
+
+    for m in LD_SCRIPT_RE.finditer(html):
+        if "review" not in m.group(1).lower():
+            continue
         try:
-            review_text = block.find("p").text.strip()
-            reviews.append(review_text)
-        except:
+            handle(json.loads(m.group(1)))
+        except ValueError:
             continue
+    return reviews
+
 
+def _first(block: Any, selectors: List[str]) -> Optional[Any]:
+    for sel in selectors:
+        el = block.select_one(sel)
+        if el is not None:
+            return el
+    return None
+
+
+def _out_of(text: str) -> Optional[float]:
+    """Rating written against its scale ("4 out of 5", "8/10"), if any."""
+    for m in _OUT_OF_RE.finditer(text):
+        if m.group(2) in _SCALES:
+            return _rating(m.group(1), m.group(2))
+    return None
+
+
+def _rating_of(block: Any) -> Optional[float]:
+    for sel in REVIEW_RATING_SELECTORS:
+        for el in block.select(sel):
+            for attr in ("content", "data-rating", "data-score", "aria-label", "title"):
+                value = el.get(attr)
+                if not value:
+                    continue
+                rating = _out_of(value)
+                if rating is None and _NUMBER_RE.fullmatch(value.strip()):
+                    rating = _rating(value.strip())
+                if rating is not None:
+                    return rating
+            classes = el.get("class") or []
+            for cls in classes if isinstance(classes, list) else classes.split():
+                if cls.lower() in _RATING_WORDS:
+                    return float(_RATING_WORDS[cls.lower()])
+                m = _RATING_CLASS_RE.search(cls)
+                if m:
+                    # "rating-45" means 4.5
+                    value = int(m.group(1))
+                    rating = _rating(value / 10 if value > 5 else value)
+                    if rating is not None:
+                        return rating
+            text = el.get_text(" ", strip=True)
+            rating = _out_of(text)
+            if rating is not None:
+                return rating
+            if _NUMBER_RE.fullmatch(text):
+                rating = _rating(text)
+                if rating is not None:
+                    return rating
+    return None
+
+
+def _reviews_from_markup(soup: Any) -> List[Review]:
+    blocks: List[Any] = []
+    for sel in REVIEW_SELECTORS:
+        blocks = soup.select(sel)
+        if blocks:
+            break
+
+    reviews: List[Review] = []
+    for block in blocks:
+        text_el = _first(block, REVIEW_TEXT_SELECTORS)
+        text = text_el.get("content") or text_or_none(text_el) if text_el else None
+        rating = _rating_of(block)
+        if not text and rating is None:
+            continue
+        date_el = _first(block, REVIEW_DATE_SELECTORS)
+        date = (
+            date_el.get("datetime") or date_el.get("content") or text_or_none(date_el)
+            if date_el else None
+        )
+        author_el = _first(block, REVIEW_AUTHOR_SELECTORS)
+        author = author_el.get("content") or text_or_none(author_el) if author_el else None
+        reviews.append(_review(rating, date, text, author))
     return reviews
+
+
+def _next_page(soup: Any, url: str) -> Optional[str]:
+    """The next page of this product's reviews, if the page links one."""
+    candidates: List[Any] = []
+    for section in soup.select(REVIEW_SECTION_SELECTORS):
+        candidates.extend(section.select(NEXT_SELECTORS))
+    # Elsewhere, only links that lead to reviews: a page-level rel=next is
+    # usually the category's
+    candidates.extend(
+        el for el in soup.select(NEXT_SELECTORS)
+        if "review" in (el.get("href") or "").lower()
+    )
+    candidates.extend(
+        el for el in soup.select("a[href]")
+        if _ALL_REVIEWS_TEXT.search(el.get_text(" ", strip=True))
+    )
+    for el in candidates:
+        href = el.get("href")
+        if href and not href.startswith(("#", "javascript:")):
+            link = urljoin(url, href)
+            if link.split("#")[0] != url.split("#")[0]:
+                return link
+    return None
+
+
+def extract_reviews(html: str, url: str) -> Tuple[List[Review], Optional[str]]:
+    """Reviews on one page, and the URL of the next page of them (or None)."""
+    with metrics.stage("parse_reviews"):
+        soup = parse_html(html)
+        reviews = _reviews_from_ld(html) or _reviews_from_markup(soup)
+        return reviews, _next_page(soup, url)
+
+
+async def _fetch_page(url: str) -> Tuple[List[Review], Optional[str]]:
+    html = await fetcher.fetch_html_async(url)
+    return await parse_reviews_async(html, url)
+
+
+async def crawl_reviews(
+    urls: List[str],
+    max_pages: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Crawl the reviews of the products at ``urls``. Yields, as each page
+    comes in, ``{"product_url", "page_url", "page", "reviews", "next"}`` or
+    ``{"product_url", "page_url", "page", "error"}``.
+    """
+    max_pages = max(1, max_pages or config.REVIEW_MAX_PAGES)
+    concurrency = max(1, concurrency or config.REVIEW_CONCURRENCY)
+
+    # (product_url, page_url, page number); next pages go to the back
+    jobs: "asyncio.Queue[Tuple[str, str, int]]" = asyncio.Queue()
+    # Bounded: a slow consumer (e.g. the database) slows the crawl down
+    done: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=2 * concurrency)
+    seen: Dict[str, Set[str]] = {}
+    for url in dict.fromkeys(urls):
+        seen[url] = {url}
+        jobs.put_nowait((url, url, 1))
+
+    async def worker() -> None:
+        while True:
+            product_url, page_url, page = await jobs.get()
+            try:
+                event: Dict[str, Any] = {"product_url": product_url, "page_url": page_url, "page": page}
+                try:
+                    reviews, next_url = await asyncio.wait_for(
+                        _fetch_page(page_url), config.REVIEW_PAGE_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    metrics.inc("review_pages_total", outcome="timeout")
+                    event["error"] = f"timed out after {config.REVIEW_PAGE_TIMEOUT}s"
+                except Exception as e:
+                    metrics.inc("review_pages_total", outcome="error")
+                    event["error"] = str(e) or type(e).__name__
+                else:
+                    metrics.inc("review_pages_total", outcome="ok")
+                    metrics.inc("reviews_scraped_total", len(reviews))
+                    visited = seen[product_url]
+                    # An empty page ends the pagination, and so does a loop
+                    if not reviews or page >= max_pages or next_url in visited:
+                        next_url = None
+                    if next_url:
+                        visited.add(next_url)
+                        jobs.put_nowait((product_url, next_url, page + 1))
+                    event["reviews"] = reviews
+                    event["next"] = next_url
+                await done.put(event)
+            finally:
+                jobs.task_done()
+
+    async def finish() -> None:
+        await jobs.join()
+        await done.put(None)
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    tasks.append(asyncio.ensure_future(finish()))
+    try:
+        while True:
+            event = await done.get()
+            if event is None:
+                return
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def scrape_reviews(product_url: str, max_pages: Optional[int] = None) -> List[str]:
+    """
+    Review texts of one product (blocking; raises if its first page fails).
+    Ratings, dates and authors come with :func:`crawl_reviews`.
+    """
+
+    async def collect() -> List[str]:
+        texts: List[str] = []
+        async for event in crawl_reviews([product_url], max_pages, concurrency=1):
+            if "error" in event:
+                if event["page"] == 1:
+                    raise RuntimeError(event["error"])
+                break
+            texts.extend(r["text"] for r in event["reviews"] if r["text"])
+        return texts
+
+    return fetcher.run(collect())
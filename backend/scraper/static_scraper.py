@@ -1,17 +1,18 @@
 import requests
-from bs4 import BeautifulSoup
+
+from backend.scraper.dom import parse_html
 
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 
 def scrape_static(url):
     response = requests.get(url, headers=HEADERS, timeout=10)
-    soup = BeautifulSoup(response.text, "html.parser")
+    soup = parse_html(response.text)
 
     products = []
 
     for item in soup.select(".product, .thumbnail, .item"):
-        name = item.find("h2") or item.find("h3")
-        price = item.find(class_="price")
+        name = item.select_one("h2") or item.select_one("h3")
+        price = item.select_one(".price")
 
         products.append({
             "name": name.text.strip() if name else "N/A",
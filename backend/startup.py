@@ -0,0 +1,41 @@
+"""
+Cold-start timing for the API process.
+
+``backend.main`` imports this module first, so the clock starts before the
+API's own dependencies load. Startup phases are recorded in milliseconds
+since then and served by ``GET /startup``.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+_STARTED = time.perf_counter()
+
+timings: Dict[str, float] = {}
+
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+def mark(name: str) -> None:
+    """Record that startup reached ``name``."""
+    timings[f"{name}_ms"] = _elapsed_ms(_STARTED)
+    logger.info("startup: %s after %.1f ms", name, timings[f"{name}_ms"])
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Record how long the ``with`` block took."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[f"{name}_ms"] = _elapsed_ms(started)
+
+
+def report() -> Dict[str, float]:
+    return dict(timings)
@@ -0,0 +1,69 @@
+"""
+Compare HTML parser backends on product extraction.
+
+Times parse + extraction (``_products_from_soup``) for every installed
+backend on the same pages and checks that each backend extracts the same
+products as the reference ``html.parser`` backend.
+
+Usage:
+    python -m benchmarks.bench_parsers                 # synthetic page
+    python -m benchmarks.bench_parsers page1.html ...  # saved store pages
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+from backend.scraper.dom import available_backends, parse_html
+from backend.scraper.generic_scraper import _products_from_soup
+from benchmarks.synthetic import LAYOUTS, store_page
+
+
+def _time_backend(html: str, backend: str, repeat: int) -> Tuple[List[float], List[Dict]]:
+    timings = []
+    products: List[Dict] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        products = _products_from_soup(html, parse_html(html, backend))
+        timings.append(time.perf_counter() - start)
+    return timings, products
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("pages", nargs="*", help="HTML files to parse")
+    parser.add_argument("--products", type=int, default=5000,
+                        help="products per synthetic page (default: 5000)")
+    parser.add_argument("--layout", choices=LAYOUTS, default="cards",
+                        help="synthetic page layout (default: cards)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = {}
+        for path in args.pages:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages[path] = f.read()
+    else:
+        pages = {
+            f"synthetic {args.layout} x{args.products}": store_page(args.layout, args.products)
+        }
+
+    backends = available_backends()
+    for name, html in pages.items():
+        print(f"\n{name} ({len(html) / 1e6:.2f} MB)")
+        _, reference = _time_backend(html, "html.parser", 1)
+        baseline = None
+        for backend in reversed(backends):
+            timings, products = _time_backend(html, backend, args.repeat)
+            median = statistics.median(timings)
+            baseline = baseline or median
+            same = "same output" if products == reference else "OUTPUT DIFFERS"
+            print(
+                f"  {backend:12s} {median * 1000:9.1f} ms/page  "
+                f"{baseline / median:5.1f}x  {len(products)} products, {same}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Benchmark suite for the scrape -> analyze path.
+
+Benchmarks (``--only`` takes a regex over these names):
+
+- ``soup/<layout>``      -- parse_html + ``_parse_products_from_soup``
+- ``html/<layout>``      -- ``_products_from_html`` (JSON-LD pre-pass included)
+- ``ld/shopify``         -- ``_extract_products_from_ld`` on decoded JSON-LD
+- ``analyze/<mode>/<n>`` -- ``analyze_products`` (rows / columnar, uncached)
+- ``e2e/<layout>``       -- ``POST /scrape`` against the local store server
+- ``e2e-crawl/<layout>`` -- the same with ``crawl`` over every page
+
+Each reports mean / p50 / p90 / p99 latency, throughput (products per
+second) and peak Python heap (tracemalloc, one extra run; memory held by C
+extensions such as lexbor is not included). Results are written as JSON
+and can be compared between versions:
+
+    python -m benchmarks.run                       # full run, saves results
+    python -m benchmarks.run --quick --only soup   # smaller inputs
+    python -m benchmarks.run --compare OLD.json NEW.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Isolate the backend from the user's caches before it is imported
+_SCRATCH = tempfile.mkdtemp(prefix="bench-")
+os.environ.setdefault("HTTP_CACHE_ENABLED", "0")
+os.environ.setdefault("HTTP_CACHE_DIR", _SCRATCH)
+os.environ.setdefault("MONGO_SERVER_TIMEOUT_MS", "200")
+
+from backend.recommender import analyze_products  # noqa: E402
+from backend.scraper.dom import parse_html, resolve_backend  # noqa: E402
+from backend.scraper.generic_scraper import (  # noqa: E402
+    _extract_products_from_ld,
+    _parse_products_from_soup,
+    _products_from_html,
+)
+from benchmarks import synthetic  # noqa: E402
+from benchmarks.server import StoreServer  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Benchmark name -> (function, products handled per call)
+Case = Tuple[Callable[[], Any], int]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile of already sorted values."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def measure(
+    fn: Callable[[], Any], items: int, repeat: int, warmup: int = 1
+) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    return {
+        "items": items,
+        "runs": len(timings),
+        "mean_ms": round(mean * 1000, 3),
+        "p50_ms": round(_percentile(timings, 0.50) * 1000, 3),
+        "p90_ms": round(_percentile(timings, 0.90) * 1000, 3),
+        "p99_ms": round(_percentile(timings, 0.99) * 1000, 3),
+        "items_per_s": round(items / mean, 1) if mean else None,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def _extraction_cases(per_page: int) -> Dict[str, Case]:
+    cases: Dict[str, Case] = {}
+    for layout in synthetic.LAYOUTS:
+        html = synthetic.store_page(layout, per_page)
+        if layout != "shopify":
+            # The card cascade does not read JSON-LD
+            cases[f"soup/{layout}"] = (
+                lambda html=html: _parse_products_from_soup(parse_html(html)),
+                per_page,
+            )
+        cases[f"html/{layout}"] = (lambda html=html: _products_from_html(html), per_page)
+
+    ld = json.loads(synthetic._shopify_ld(synthetic.products(per_page), 0))
+    cases["ld/shopify"] = (lambda: _extract_products_from_ld(ld), per_page)
+    return cases
+
+
+def _analyze_cases(sizes: List[int]) -> Dict[str, Case]:
+    cases: Dict[str, Case] = {}
+    for n in sizes:
+        rows = synthetic.products(n)
+        for mode in ("rows", "columnar"):
+            cases[f"analyze/{mode}/{n}"] = (
+                lambda rows=rows, mode=mode: analyze_products(
+                    rows, "https://bench.example", use_cache=False, mode=mode
+                ),
+                n,
+            )
+    return cases
+
+
+def _e2e_cases(
+    client: Any, server: StoreServer, per_page: int, pages: int
+) -> Dict[str, Case]:
+    def scrape(body: Dict[str, Any]) -> Dict[str, Any]:
+        result = client.post("/scrape", json=body).json()
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
+
+    cases: Dict[str, Case] = {}
+    for layout in synthetic.LAYOUTS:
+        url = server.url(f"/{layout}")
+        cases[f"e2e/{layout}"] = (lambda url=url: scrape({"url": url}), per_page)
+        cases[f"e2e-crawl/{layout}"] = (
+            lambda url=url: scrape({"url": url, "crawl": True, "max_pages": pages}),
+            per_page * pages,
+        )
+    return cases
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    per_page = 50 if args.quick else 500
+    pages = 3 if args.quick else 10
+    sizes = [1000, 20000] if args.quick else [1000, 20000, 200000]
+    selected = re.compile(args.only) if args.only else None
+
+    results: Dict[str, Any] = {}
+
+    def run_cases(cases: Dict[str, Case]) -> None:
+        for name, (fn, items) in cases.items():
+            if selected and not selected.search(name):
+                continue
+            results[name] = measure(fn, items, args.repeat)
+            r = results[name]
+            print(
+                f"{name:28s} p50 {r['p50_ms']:9.2f} ms  p99 {r['p99_ms']:9.2f} ms  "
+                f"{r['items_per_s']:>12,.0f} items/s  peak {r['peak_kb']:>9,.0f} KB"
+            )
+
+    run_cases(_extraction_cases(per_page))
+    run_cases(_analyze_cases(sizes))
+
+    e2e_names = [
+        f"{kind}/{layout}" for kind in ("e2e", "e2e-crawl") for layout in synthetic.LAYOUTS
+    ]
+    if not selected or any(selected.search(name) for name in e2e_names):
+        from fastapi.testclient import TestClient
+
+        from backend.main import app
+
+        site: Dict[str, str] = {}
+        for layout in synthetic.LAYOUTS:
+            site.update(synthetic.store_site(layout, per_page, pages))
+        with StoreServer(site) as server, TestClient(app) as client:
+            run_cases(_e2e_cases(client, server, per_page, pages))
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parser_backend": resolve_backend(),
+        "quick": args.quick,
+        "results": results,
+    }
+
+
+def compare(base_path: str, new_path: str, threshold: float) -> int:
+    """Print p50 changes between two result files; 1 if anything regressed."""
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"base {base.get('revision')} ({base['created_at']}) -> "
+          f"new {new.get('revision')} ({new['created_at']})")
+
+    regressed = False
+    for name, result in new["results"].items():
+        old = base["results"].get(name)
+        if old is None:
+            print(f"{name:28s} {result['p50_ms']:9.2f} ms  (new)")
+            continue
+        change = result["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag, regressed = "  REGRESSION", True
+        elif change < -threshold:
+            flag = "  faster"
+        print(
+            f"{name:28s} {old['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} ms "
+            f"({change:+.0%})  peak {old['peak_kb']:,.0f} -> {result['peak_kb']:,.0f} KB{flag}"
+        )
+    return 1 if regressed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quick", action="store_true", help="smaller inputs")
+    parser.add_argument("--only", help="regex selecting benchmark names")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--out", help="results file (default: benchmarks/results/...)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="p50 slowdown reported as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    report = run(args)
+    out = args.out or os.path.join(
+        RESULTS_DIR,
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['revision'] or 'local'}.json",
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Local HTTP stand-in for real stores.
+
+Serves synthetic (or any in-memory) pages from a background thread so
+end-to-end benchmarks exercise the real fetch path without the network.
+
+Usage:
+    python -m benchmarks.server --per-page 100 --pages 5   # serve every layout
+"""
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from benchmarks.synthetic import LAYOUTS, store_site
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, Nagle plus delayed
+    # ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+    pages: Dict[str, bytes] = {}
+
+    def do_GET(self) -> None:
+        body = self.pages.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class StoreServer:
+    """Serve ``pages`` (``{path: html}``) on localhost; use as a context manager."""
+
+    def __init__(self, pages: Dict[str, str], port: int = 0):
+        handler = type("Handler", (_Handler,), {
+            "pages": {path: html.encode("utf-8") for path, html in pages.items()},
+        })
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def start(self) -> "StoreServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StoreServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve synthetic stores")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=5)
+    args = parser.parse_args()
+
+    pages: Dict[str, str] = {}
+    for layout in LAYOUTS:
+        pages.update(store_site(layout, args.per_page, args.pages))
+    server = StoreServer(pages, args.port)
+    for layout in LAYOUTS:
+        print(f"{layout:10s} {server.url('/' + layout)}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
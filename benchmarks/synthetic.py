@@ -0,0 +1,166 @@
+"""
+Synthetic storefronts for benchmarks.
+
+Generates deterministic store pages in each layout the scraper understands:
+
+- ``cards``     -- generic product-card grid (``.product-card``),
+- ``microdata`` -- ``itemprop`` / ``itemtype=Product`` markup,
+- ``shopify``   -- Shopify theme with a JSON-LD ``ItemList`` of products,
+- ``books``     -- books.toscrape.com ``article.product_pod``.
+
+Pages of a multi-page listing link to each other with ``?page=N`` URLs so
+the category crawler can follow them.
+"""
+import json
+import random
+from typing import Any, Dict, List
+
+LAYOUTS = ("cards", "microdata", "shopify", "books")
+
+_STARS = ("One", "Two", "Three", "Four", "Five")
+
+
+def products(count: int, seed: int = 0, start: int = 0) -> List[Dict[str, Any]]:
+    """Product rows as the scrapers return them (string fields)."""
+    rnd = random.Random(seed * 1_000_003 + start)
+    rows = []
+    for i in range(start, start + count):
+        rows.append(
+            {
+                "title": f"Item {i}",
+                "price": f"{rnd.randint(100, 99999) / 100:.2f}",
+                "availability": rnd.choice(("In stock", "Out of stock")),
+                "rating": f"{rnd.randint(10, 50) / 10:.1f}",
+                "reviews": str(rnd.randint(0, 900)),
+            }
+        )
+    return rows
+
+
+def _card(p: Dict[str, Any], i: int) -> str:
+    return (
+        f'<div class="product-card" data-product-id="{i}">'
+        f'<a href="/p/{i}"><img src="/i/{i}.jpg" alt="{p["title"]}"></a>'
+        f'<h3 class="product-title">{p["title"]} <span>new</span></h3>'
+        f'<div class="price"><span class="sale">${p["price"]}</span></div>'
+        f'<div class="rating">{p["rating"]} out of 5 stars</div>'
+        f'<span class="reviews-count">({p["reviews"]} reviews)</span>'
+        f'<p class="stock">{p["availability"]}</p>'
+        "</div>"
+    )
+
+
+def _microdata(p: Dict[str, Any], i: int) -> str:
+    return (
+        f'<li itemscope itemtype="https://schema.org/Product">'
+        f'<a href="/p/{i}"><span itemprop="name">{p["title"]}</span></a>'
+        f'<div itemprop="offers" itemscope itemtype="https://schema.org/Offer">'
+        f'<meta itemprop="price" content="{p["price"]}">${p["price"]}'
+        f'<link itemprop="availability" href="https://schema.org/InStock">'
+        f'<span itemprop="availability">{p["availability"]}</span></div>'
+        f'<div itemprop="aggregateRating" itemscope>'
+        f'<span itemprop="ratingValue">{p["rating"]}</span>'
+        f'<span itemprop="reviewCount">{p["reviews"]}</span></div>'
+        "</li>"
+    )
+
+
+def _book(p: Dict[str, Any], i: int) -> str:
+    stars = _STARS[max(0, min(4, round(float(p["rating"])) - 1))]
+    return (
+        '<article class="product_pod">'
+        f'<div class="image_container"><a href="/p/{i}"><img src="/i/{i}.jpg"></a></div>'
+        f'<p class="star-rating {stars}"></p>'
+        f'<h3><a href="/p/{i}" title="{p["title"]}">{p["title"][:20]}</a></h3>'
+        f'<div class="product_price"><p class="price_color">£{p["price"]}</p>'
+        f'<p class="instock availability">{p["availability"]}</p></div>'
+        "</article>"
+    )
+
+
+def _shopify_ld(rows: List[Dict[str, Any]], start: int) -> str:
+    items = []
+    for n, p in enumerate(rows):
+        items.append(
+            {
+                "@type": "ListItem",
+                "position": start + n + 1,
+                "item": {
+                    "@type": "Product",
+                    "name": p["title"],
+                    "offers": {
+                        "@type": "Offer",
+                        "price": p["price"],
+                        "availability": "https://schema.org/InStock",
+                    },
+                    "aggregateRating": {
+                        "@type": "AggregateRating",
+                        "ratingValue": p["rating"],
+                        "reviewCount": p["reviews"],
+                    },
+                },
+            }
+        )
+    return json.dumps(
+        {"@context": "https://schema.org", "@type": "ItemList", "itemListElement": items}
+    )
+
+
+def _pagination(page: int, pages: int) -> str:
+    if pages <= 1:
+        return ""
+    links = "".join(f'<a href="?page={n}">{n}</a>' for n in range(1, pages + 1))
+    if page < pages:
+        links += f'<a rel="next" href="?page={page + 1}">Next</a>'
+    return f'<nav class="pagination">{links}</nav>'
+
+
+def store_page(
+    layout: str, count: int, seed: int = 0, page: int = 1, pages: int = 1
+) -> str:
+    """One listing page of ``count`` products in ``layout``."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"unknown layout {layout!r} (expected one of {LAYOUTS})")
+    start = (page - 1) * count
+    rows = products(count, seed, start)
+    head = "<title>Synthetic store</title>"
+    nav = "".join(f'<a href="/c/{i}">Category {i}</a>' for i in range(30))
+
+    if layout == "cards":
+        body = '<main class="grid">' + "".join(
+            _card(p, start + n) for n, p in enumerate(rows)
+        ) + "</main>"
+    elif layout == "microdata":
+        body = '<ul class="listing">' + "".join(
+            _microdata(p, start + n) for n, p in enumerate(rows)
+        ) + "</ul>"
+    elif layout == "books":
+        body = '<ol class="row">' + "".join(
+            f"<li>{_book(p, start + n)}</li>" for n, p in enumerate(rows)
+        ) + "</ol>"
+    else:
+        head += (
+            '<meta name="shopify-digital-wallet" content="/1/digital_wallets">'
+            '<script src="https://cdn.shopify.com/s/files/theme.js"></script>'
+            '<script type="application/ld+json">' + _shopify_ld(rows, start) + "</script>"
+        )
+        # Themes render the grid client-side; keep a little markup around
+        body = '<div id="collection" data-count="%d"></div>' % count
+
+    return (
+        f"<!doctype html><html><head>{head}</head><body><header>{nav}</header>"
+        f"{body}{_pagination(page, pages)}<footer>© Store</footer></body></html>"
+    )
+
+
+def store_site(
+    layout: str, per_page: int, pages: int = 1, seed: int = 0
+) -> Dict[str, str]:
+    """``{path: html}`` for a paginated category at ``/<layout>``."""
+    site = {}
+    for page in range(1, pages + 1):
+        html = store_page(layout, per_page, seed, page, pages)
+        site[f"/{layout}?page={page}"] = html
+        if page == 1:
+            site[f"/{layout}"] = html
+    return site
@@ -0,0 +1,48 @@
+"""
+Backend calls shared by the Streamlit pages.
+
+Scrape results stay on the server; the session only keeps the result id
+and pages fetch the insights or the slice of products they show. Responses
+are cached per argument set, so paging back and forth or switching pages
+does not hit the API again.
+"""
+import requests
+import streamlit as st
+
+API_URL = "http://127.0.0.1:8000"
+
+# Seconds a fetched result / product page is reused
+CACHE_TTL = 600
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def load_result(result_id):
+    """Metadata and insights of a stored result, or None if it expired."""
+    response = requests.get(f"{API_URL}/results/{result_id}", timeout=10)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False, max_entries=200)
+def load_products(result_id, sort="position", order="asc", limit=100, cursor=None, **filters):
+    """One page of products: ``{"items", "next_cursor"[, "matched"]}``."""
+    params = {"sort": sort, "order": order, "limit": limit}
+    params.update({k: v for k, v in filters.items() if v is not None})
+    if cursor:
+        params["cursor"] = cursor
+    response = requests.get(
+        f"{API_URL}/results/{result_id}/products", params=params, timeout=30
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def current_insights():
+    """Insights of the result scraped on the Home page, or {}."""
+    result_id = st.session_state.get("result_id")
+    if not result_id:
+        return {}
+    result = load_result(result_id)
+    return (result or {}).get("insights") or {}
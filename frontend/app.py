@@ -1,49 +1,84 @@
+import json
+
 import streamlit as st
 import requests
 import pandas as pd
 
+from api_client import API_URL
+
 st.set_page_config(page_title="AI Marketing Campaign Scraper", layout="centered")
 
 st.title("AI-Based Marketing Campaign Recommendation System")
 st.subheader("Enter E-Commerce Store URL")
 
-# Keep scraped data in session so the user can navigate to other pages
-if "scraped_results" not in st.session_state:
-    st.session_state["scraped_results"] = None
-if "scraped_insights" not in st.session_state:
-    st.session_state["scraped_insights"] = None
+# Only the id of the scrape is kept in the session; the other pages fetch
+# what they show from the backend (see api_client)
+if "result_id" not in st.session_state:
+    st.session_state["result_id"] = None
 
 url = st.text_input("Website URL", "Enter your website URL")
 
+# Give up if the backend sends nothing for this many seconds
+STREAM_READ_TIMEOUT = 600
+# Products shown while a scrape is still running
+PREVIEW_ROWS = 200
+
+
+def run_scrape_stream(url):
+    """
+    Scrape through ``/scrape/stream``, showing products as they arrive.
+    Returns the final ``insights`` record (with ``result_id``) or ``{"error"}``.
+    """
+    found = 0
+    preview_rows = []
+    status = st.empty()
+    preview = st.empty()
+    with requests.post(
+        f"{API_URL}/scrape/stream",
+        json={"url": url},
+        stream=True,
+        timeout=(10, STREAM_READ_TIMEOUT),
+    ) as response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            record = json.loads(line)
+            if "error" in record:
+                status.empty()
+                return {"error": record["error"]}
+            if record["event"] == "products":
+                found += len(record["products"])
+                status.info(f"{found} products found, still scraping...")
+                if len(preview_rows) < PREVIEW_ROWS:
+                    preview_rows.extend(record["products"][:PREVIEW_ROWS - len(preview_rows)])
+                    preview.dataframe(pd.DataFrame(preview_rows), use_container_width=True)
+            elif record["event"] == "insights":
+                status.empty()
+                preview.empty()
+                return record
+    status.empty()
+    return {"error": "Stream ended before the analysis finished"}
+
+
 if st.button("Scrape Data"):
     with st.spinner("Scraping website..."):
         try:
-            response = requests.post(
-                "http://127.0.0.1:8000/scrape",
-                json={"url": url},
-                timeout=60,
-            )
-
-            data = response.json()
+            data = run_scrape_stream(url)
 
             # Show detailed feedback based on backend response
             if "error" in data:
                 st.error(f"Backend error: {data['error']}")
-                st.session_state["scraped_results"] = None
-                st.session_state["scraped_insights"] = None
-            elif "results" in data and len(data["results"]) > 0:
-                st.session_state["scraped_results"] = data["results"]
-                st.session_state["scraped_insights"] = data.get("insights", {})
+                st.session_state["result_id"] = None
+            elif data.get("product_count") and data.get("result_id"):
+                st.session_state["result_id"] = data["result_id"]
                 st.success(
-                    "Scraping and analysis successful."
+                    f"Scraping and analysis successful ({data['product_count']} products)."
                 )
             else:
-                st.session_state["scraped_results"] = None
-                st.session_state["scraped_insights"] = None
+                st.session_state["result_id"] = None
                 st.error("No data found or website not supported")
 
         except Exception as e:
-            st.session_state["scraped_results"] = None
-            st.session_state["scraped_insights"] = None
+            st.session_state["result_id"] = None
             st.error(f"Backend not running or invalid URL\n{e}")
 
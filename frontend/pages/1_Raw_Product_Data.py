@@ -1,15 +1,54 @@
 import streamlit as st
 import pandas as pd
 
+from api_client import load_products, load_result
+
 st.set_page_config(page_title="Raw Product Data", layout="wide")
 
 st.title("Raw Product Data")
 
-results = st.session_state.get("scraped_results")
+PAGE_SIZES = [50, 100, 250, 500]
+
+result_id = st.session_state.get("result_id")
+result = load_result(result_id) if result_id else None
 
-if not results:
+if not result:
     st.info("Go to the Home page, enter a store URL, and click 'Scrape Data' first.")
 else:
-    df = pd.DataFrame(results)
-    st.dataframe(df, use_container_width=True)
+    with st.sidebar:
+        sort = st.selectbox("Sort by", ["position", "price", "rating", "reviews"])
+        order = st.radio("Order", ["asc", "desc"], horizontal=True)
+        use_price = st.checkbox("Filter by price")
+        min_price, max_price = (
+            st.slider("Price range", 0.0, 5000.0, (0.0, 500.0)) if use_price else (None, None)
+        )
+        min_rating = st.slider("Minimum rating", 0.0, 5.0, 0.0, 0.5) or None
+        stock = st.selectbox("Availability", ["Any", "In stock", "Out of stock"])
+        in_stock = None if stock == "Any" else stock == "In stock"
+        limit = st.selectbox("Rows per page", PAGE_SIZES, index=1)
+
+    query = dict(
+        sort=sort, order=order, limit=limit,
+        min_price=min_price, max_price=max_price, min_rating=min_rating, in_stock=in_stock,
+    )
+    # Cursors of the pages visited so far; reset whenever the query changes
+    if st.session_state.get("products_query") != (result_id, query):
+        st.session_state["products_query"] = (result_id, query)
+        st.session_state["products_cursors"] = [None]
+    cursors = st.session_state["products_cursors"]
+
+    page = load_products(result_id, cursor=cursors[-1], **query)
+    first = load_products(result_id, cursor=None, **query)
+    st.caption(
+        f"{first.get('matched', 0)} of {result['product_count']} products match - "
+        f"page {len(cursors)}"
+    )
+    st.dataframe(pd.DataFrame(page["items"]), use_container_width=True)
 
+    prev_col, next_col = st.columns(2)
+    if prev_col.button("Previous page", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if next_col.button("Next page", disabled=not page["next_cursor"]):
+        cursors.append(page["next_cursor"])
+        st.rerun()
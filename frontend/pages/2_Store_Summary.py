@@ -1,10 +1,12 @@
 import streamlit as st
 
+from api_client import current_insights
+
 st.set_page_config(page_title="Store Summary", layout="centered")
 
 st.title("Store Summary")
 
-insights = st.session_state.get("scraped_insights") or {}
+insights = current_insights()
 summary = insights.get("summary")
 
 if not summary:
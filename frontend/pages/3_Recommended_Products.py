@@ -1,11 +1,13 @@
 import streamlit as st
 import pandas as pd
 
+from api_client import current_insights
+
 st.set_page_config(page_title="Recommended Products", layout="wide")
 
 st.title("Recommended Products to Promote")
 
-insights = st.session_state.get("scraped_insights") or {}
+insights = current_insights()
 top_products = insights.get("top_products") or []
 
 if not top_products:
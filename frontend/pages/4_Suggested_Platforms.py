@@ -1,10 +1,12 @@
 import streamlit as st
 
+from api_client import current_insights
+
 st.set_page_config(page_title="Suggested Marketing Platforms", layout="centered")
 
 st.title("Suggested Marketing Platforms")
 
-insights = st.session_state.get("scraped_insights") or {}
+insights = current_insights()
 platforms = insights.get("platform_recommendations") or []
 
 if not platforms:
@@ -1,10 +1,12 @@
 import streamlit as st
 
+from api_client import current_insights
+
 st.set_page_config(page_title="Discount & Campaign Suggestions", layout="centered")
 
 st.title("Discount & Campaign Suggestions")
 
-insights = st.session_state.get("scraped_insights") or {}
+insights = current_insights()
 discounts = insights.get("discount_suggestions") or []
 
 if not discounts:
@@ -1,10 +1,12 @@
 import streamlit as st
 
+from api_client import current_insights
+
 st.set_page_config(page_title="AI-Generated Ad Captions", layout="centered")
 
 st.title("AI-Generated Ad Captions")
 
-insights = st.session_state.get("scraped_insights") or {}
+insights = current_insights()
 captions = insights.get("ad_captions") or []
 
 if not captions:
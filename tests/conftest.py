@@ -0,0 +1,9 @@
+import pytest
+
+from backend import config
+
+
+@pytest.fixture(autouse=True)
+def no_extraction_profiles(monkeypatch):
+    # Profiles learned by one test (and saved to disk) would steer another
+    monkeypatch.setattr(config, "EXTRACTION_PROFILES_ENABLED", False)
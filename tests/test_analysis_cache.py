@@ -0,0 +1,47 @@
+from backend import analysis_cache
+from backend.analysis_cache import make_key
+from backend.products import Product, ProductBatch
+
+URL = "https://shop.example/c/shoes"
+
+
+def _products():
+    return [
+        Product.from_raw("A", "$10", "In stock", "4.5", "12", url="https://shop.example/p/a"),
+        Product.from_raw("B", None, None, None, None),
+    ]
+
+
+def test_list_and_batch_share_a_key():
+    assert make_key(_products(), URL, "v1") == make_key(ProductBatch(_products()), URL, "v1")
+
+
+def test_key_depends_on_inputs():
+    key = make_key(_products(), URL, "v1")
+    assert make_key(_products(), URL, "v2") != key
+    assert make_key(_products(), URL + "?page=2", "v1") != key
+    assert make_key(list(reversed(_products())), URL, "v1") != key
+    changed = _products()
+    changed[1].reviews = 3
+    assert make_key(changed, URL, "v1") != key
+
+
+def test_text_boundaries_are_unambiguous():
+    a = [Product.from_raw("ab", None), Product.from_raw("c", None)]
+    b = [Product.from_raw("a", None), Product.from_raw("bc", None)]
+    c = [Product.from_raw("abc", None), Product.from_raw(None, None)]
+    assert len({make_key(p, URL, "v1") for p in (a, b, c)}) == 3
+
+
+def test_dict_rows_ignore_other_fields():
+    rows = [{**p.to_dict(), "_id": i, "source_url": URL} for i, p in enumerate(_products())]
+    plain = [p.to_dict() for p in _products()]
+    assert make_key(rows, URL, "v1") == make_key(plain, URL, "v1")
+
+
+def test_cached_results_are_private_copies(monkeypatch):
+    monkeypatch.setattr(analysis_cache.config, "ANALYSIS_CACHE_MONGO", False)
+    analysis_cache.put("k", {"top_products": [{"title": "A"}]})
+    first = analysis_cache.get("k")
+    first["top_products"].append({"title": "B"})
+    assert analysis_cache.get("k") == {"top_products": [{"title": "A"}]}
@@ -0,0 +1,48 @@
+import pytest
+
+from backend.comparison import percentile, percentile_rank, profile_store, relative_config
+from backend.recommender import SCORING_CONFIG
+
+
+def test_percentile_interpolates():
+    values = [10.0, 20.0, 30.0, 40.0]
+    assert percentile(values, 0) == 10.0
+    assert percentile(values, 100) == 40.0
+    assert percentile(values, 50) == 25.0
+    assert percentile(values, 90) == pytest.approx(37.0)
+
+
+def test_percentile_of_few_values():
+    assert percentile([], 50) == 0.0
+    assert percentile([7.0], 90) == 7.0
+
+
+def test_percentile_rank():
+    assert percentile_rank([1.0, 2.0, 2.0, 3.0], 2.0) == 75.0
+    assert percentile_rank([], 1.0) == 0.0
+
+
+def _profile(url, prices, rating, reviews):
+    products = [
+        {"title": f"{url} {i}", "price": f"${p}", "rating": str(rating), "reviews": str(reviews)}
+        for i, p in enumerate(prices)
+    ]
+    return profile_store(url, products)
+
+
+def test_relative_config_follows_the_set():
+    profiles = [
+        _profile("a", [10, 20], 3.0, 2),
+        _profile("b", [30, 40], 4.0, 10),
+        _profile("c", [50, 60], 5.0, 40),
+    ]
+    cfg = relative_config(profiles, 50)
+    assert cfg["high_avg_price"] == 35.0
+    assert cfg["strong_avg_rating"] == 4.0
+    assert cfg["traction_reviews"] == 10
+    # Everything else is the regular scoring
+    assert cfg["review_weight"] == SCORING_CONFIG["review_weight"]
+
+
+def test_relative_config_without_products():
+    assert relative_config([_profile("empty", [], 0, 0)], 75) == SCORING_CONFIG
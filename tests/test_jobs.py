@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from backend import jobs
+
+
+@pytest.fixture
+def scrapes(monkeypatch):
+    """Scrapes block until released; the URL "fail" raises."""
+    release = {}
+
+    async def scrape(url, progress=None, **options):
+        if url == "fail":
+            raise RuntimeError("boom")
+        release[url] = asyncio.Event()
+        await release[url].wait()
+        return {"result_id": url, "insights": {}}
+
+    monkeypatch.setattr(jobs, "scrape_and_analyze_async", scrape)
+    return release
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_retry_defers_to_an_active_identical_job(scrapes):
+    async def run():
+        manager = jobs.JobManager(workers=2)
+        first, _ = manager.submit("fail", {})
+        await _settle()
+        assert first.status == jobs.FAILED
+
+        # An identical scrape starts while the first one is failed
+        second, deduplicated = manager.submit("fail", {})
+        assert not deduplicated and second is not first
+        assert manager.retry(first) is second
+        assert first.status == jobs.FAILED
+        assert manager.submit("fail", {}) == (second, True)
+        await manager.shutdown()
+
+    asyncio.run(run())
+
+
+def test_pending_jobs_are_bounded(scrapes):
+    async def run():
+        manager = jobs.JobManager(workers=1, max_pending=2)
+        manager.submit("a", {})
+        manager.submit("b", {})
+        with pytest.raises(jobs.JobQueueFull):
+            manager.submit("c", {})
+        # Identical submissions are still answered
+        assert manager.submit("a", {})[1]
+
+        await _settle()
+        scrapes["a"].set()
+        await _settle()
+        job, deduplicated = manager.submit("c", {})
+        assert not deduplicated and job.status in (jobs.QUEUED, jobs.RUNNING)
+        await manager.shutdown()
+
+    asyncio.run(run())
@@ -0,0 +1,17 @@
+from backend import metrics
+
+
+def _line(prefix):
+    return next(l for l in metrics.render().splitlines() if l.startswith(prefix))
+
+
+def test_values_keep_full_precision():
+    metrics.inc("fetch_bytes_total", 1234567, source="test")
+    assert _line('fetch_bytes_total{source="test"}').endswith(" 1234567.0")
+
+
+def test_histogram_sum_keeps_full_precision_and_short_bounds():
+    name = next(n for n, (kind, _) in metrics.HELP.items() if kind == "histogram")
+    metrics.observe(name, 1234.56789, case="precision")
+    assert _line(f'{name}_sum{{case="precision"').endswith(" 1234.56789")
+    assert f'{name}_bucket{{case="precision",le="0.005"}} 0' in metrics.render()
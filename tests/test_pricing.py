@@ -0,0 +1,94 @@
+import pytest
+
+from backend import pricing
+from backend.pricing import Price, parse
+
+
+@pytest.mark.parametrize("text, amount, currency", [
+    ("19.99", 19.99, None),
+    ("$1,299.00", 1299.0, "USD"),
+    ("1.299,00 €", 1299.0, "EUR"),
+    ("19,99 €", 19.99, "EUR"),
+    ("Rs. 1,29,999", 129999.0, "INR"),
+    ("1 299,00 €", 1299.0, "EUR"),
+    ("1'299.50", 1299.5, None),
+    ("€2.000", 2.0, "EUR"),
+    ("KD 1.299", 1.299, "KWD"),
+    ("2.000", 2.0, None),
+])
+def test_amount_and_currency(text, amount, currency):
+    price = parse(text)
+    assert price.amount == pytest.approx(amount)
+    assert price.currency == currency
+
+
+@pytest.mark.parametrize("text", ["1.2.3", "1,2,3", "10.05.2024", "", "N/A"])
+def test_ambiguous_or_missing_is_no_price(text):
+    assert parse(text) == pricing.NO_PRICE
+
+
+def test_sale_and_list_price():
+    assert parse("Sale $19.99 Regular $29.99") == Price(19.99, "USD", 29.99, "$19.99")
+
+
+def test_savings_are_skipped():
+    assert parse("$49.99 Save $10").amount == 49.99
+    assert parse("20% off $30.00").amount == 30.0
+
+
+def test_range_keeps_whole_span():
+    price = parse("1,299 - 1,599 ₹")
+    assert price == Price(1299.0, "INR", 1599.0, "1,299 - 1,599 ₹")
+
+
+def test_locale_resolves_ambiguous_symbols():
+    assert parse("$10", "en-ca").currency == "CAD"
+    assert parse("¥500", "zh-cn").currency == "CNY"
+    with pricing.using_locale("de-de"):
+        assert parse("2.000") == Price(2000.0, "EUR", None, "2.000")
+
+
+@pytest.mark.parametrize("locale, amount", [
+    ("en-us", 12.5), ("en", 12.5), ("ja", 12.5), ("de-de", 12500.0), ("fr", 12500.0),
+    ("de-ch", 12.5), (None, 12.5),
+])
+def test_locale_picks_the_decimal_separator(locale, amount):
+    assert parse("12.500", locale).amount == amount
+    assert parse("$12.500", locale).amount == amount
+
+
+def test_grouping_is_not_the_locale_decimal():
+    assert parse("1,299", "en-us").amount == 1299.0
+    assert parse("1,299", "de-de").amount == 1.299
+    assert parse("1.299,00 €", "en-us").amount == 1299.0
+
+
+def test_machine_readable_prices_ignore_the_locale():
+    assert pricing.parse_decimal("12.500", "de-de") == Price(12.5, "EUR", None, "12.500")
+    assert pricing.parse_decimal(" 1299 ").amount == 1299.0
+    assert pricing.parse_decimal("$1,299.00").amount == 1299.0
+    assert pricing.parse_decimal(None) == pricing.NO_PRICE
+
+
+def test_page_locale():
+    assert pricing.page_locale('<html lang="en_CA"><body>') == "en-ca"
+    assert pricing.page_locale("<html><body>") is None
+
+
+def test_numbers_and_columns():
+    assert parse(12) == Price(12.0)
+    assert parse(float("nan")) == pricing.NO_PRICE
+    assert list(pricing.amounts(["$1.50", None, "$1.50", "x"])) == [1.5, 0.0, 1.5, 0.0]
+
+
+def test_json_ld_price_is_a_plain_decimal():
+    from backend.scraper.generic_scraper import _products_from_html
+
+    html = (
+        '<html lang="de-DE"><script type="application/ld+json">'
+        '{"@type": "ItemList", "itemListElement": [{"@type": "ListItem", "item":'
+        ' {"@type": "Product", "name": "A", "offers": {"price": "12.500", "priceCurrency": "EUR"}}}]}'
+        "</script></html>"
+    )
+    [product] = _products_from_html(html, "https://shop.example/c/")
+    assert (product.price, product.currency) == (12.5, "EUR")
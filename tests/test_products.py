@@ -0,0 +1,69 @@
+import math
+import pickle
+
+from backend.products import MISSING, Product, ProductBatch, review_keys, to_dicts
+
+
+def _product(**overrides):
+    values = dict(title="Trail Runner", price="Sale $79.99 Regular $99.99", availability="In stock",
+                  rating="4.5", reviews="120", url="https://shop.example/p/trail")
+    values.update(overrides)
+    parsed = values.pop("price")
+    return Product.from_raw(price=parsed, **values)
+
+
+def test_from_raw_parses_numbers():
+    p = _product()
+    assert (p.price, p.currency, p.list_price) == (79.99, "USD", 99.99)
+    assert p.numbers() == (4.5, 120, 79.99)
+    assert p.url == "https://shop.example/p/trail"
+
+
+def test_missing_values_use_placeholders():
+    p = Product.from_raw(None, None, None, "N/A", "not a number")
+    assert p.to_dict() == {
+        "title": "Unknown title", "price": MISSING, "availability": "Unknown",
+        "rating": MISSING, "reviews": MISSING, "currency": MISSING,
+        "list_price": MISSING, "url": MISSING,
+    }
+    assert p.numbers() == (0.0, 0, 0.0)
+
+
+def test_dict_round_trip():
+    p = _product()
+    assert dict(p) == p.to_dict()
+    back = Product.from_dict(p.to_dict())
+    assert back.to_dict() == p.to_dict()
+    assert back.numbers() == p.numbers()
+
+
+def test_stored_currency_wins_and_link_is_url():
+    p = Product.from_dict({"title": "x", "price": "19.99", "currency": "GBP", "link": "/p/x"})
+    assert p.currency == "GBP"
+    assert p.url == "/p/x"
+
+
+def test_batch_round_trip():
+    products = [_product(), _product(title="Road", rating=None, reviews=None, url=None)]
+    batch = ProductBatch(products)
+    assert len(batch) == 2 and batch
+    assert math.isnan(batch.ratings[1]) and batch.reviews[1] == -1
+    assert batch.to_dicts() == to_dicts(products)
+    assert [p.to_dict() for p in batch[1:]] == [products[1].to_dict()]
+    assert batch[-1].to_dict() == products[1].to_dict()
+    assert not batch.complete
+
+
+def test_batch_interns_repeated_texts():
+    batch = ProductBatch([_product(availability="In " + "stock") for _ in range(3)])
+    assert batch.availability[0] is batch.availability[2]
+
+
+def test_pickles_for_the_parse_pool():
+    p = _product()
+    assert pickle.loads(pickle.dumps(p)).to_dict() == p.to_dict()
+
+
+def test_review_keys_prefer_url():
+    assert review_keys(_product()) == ["https://shop.example/p/trail", "Trail Runner"]
+    assert review_keys(Product.from_raw(None, "1")) == []
@@ -0,0 +1,69 @@
+import pytest
+
+from backend import results
+from backend.results import Filters, decode_cursor, encode_cursor
+
+URL = "https://shop.example/c/shoes"
+
+
+@pytest.fixture
+def result_id(monkeypatch):
+    monkeypatch.setattr(results.config, "RESULTS_MONGO", False)
+    products = [
+        {"title": f"P{i}", "price": f"${10 + i % 4}", "rating": str(i % 5),
+         "reviews": str(i), "availability": "Out of stock" if i % 3 == 0 else "In stock"}
+        for i in range(10)
+    ]
+    return results.save(URL, products, {"summary": {}})
+
+
+def _pages(result_id, **kwargs):
+    pages, cursor = [], None
+    while True:
+        page = results.query(result_id, cursor=cursor, **kwargs)
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(12.5, 7)) == (12.5, 7)
+    assert decode_cursor(encode_cursor(None, 0)) == (None, 0)
+
+
+@pytest.mark.parametrize("cursor", ["e30=", "not base64!", encode_cursor(1, 2)[:-4]])
+def test_bad_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_the_result_once(result_id):
+    pages = _pages(result_id, limit=3)
+    titles = [item["title"] for page in pages for item in page["items"]]
+    assert titles == [f"P{i}" for i in range(10)]
+    assert pages[0]["matched"] == 10
+    assert all("matched" not in page for page in pages[1:])
+
+
+def test_sorted_pages_break_ties_by_position(result_id):
+    pages = _pages(result_id, sort="price", descending=True, limit=4)
+    items = [item for page in pages for item in page["items"]]
+    prices = [float(item["price"][1:]) for item in items]
+    assert prices == sorted(prices, reverse=True)
+    # Equal prices keep scrape order reversed, as the descending key says
+    thirteens = [item["title"] for item in items if item["price"] == "$13"]
+    assert thirteens == ["P7", "P3"]
+
+
+def test_filters_apply_across_pages(result_id):
+    pages = _pages(result_id, filters=Filters(available=True, min_rating=2), limit=2)
+    titles = [item["title"] for page in pages for item in page["items"]]
+    assert titles == ["P2", "P4", "P7", "P8"]
+    assert pages[0]["matched"] == 4
+
+
+def test_unknown_result_and_bad_sort(result_id):
+    assert results.query("missing") is None
+    with pytest.raises(ValueError):
+        results.query(result_id, sort="colour")
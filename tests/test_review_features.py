@@ -0,0 +1,98 @@
+import asyncio
+
+from backend import config, pipeline, review_features
+from backend.database import mongo_db
+from backend.recommender import analyze_products
+from backend.scraper import fetcher
+from backend.scraper.generic_scraper import _products_from_html
+
+LISTING_URL = "https://shop.example/c/shoes"
+
+LISTING = """
+<html lang="en-us"><body>
+<div class="product-card">
+  <a href="/p/trail"><h3>Trail Runner</h3></a>
+  <span class="price">$80.00</span><span class="rating">4.0 out of 5</span>
+</div>
+<div class="product-card">
+  <a href="/p/road"><h3>Road Runner</h3></a>
+  <span class="price">$80.00</span><span class="rating">4.0 out of 5</span>
+</div>
+</body></html>
+"""
+
+
+def _review_page(*texts):
+    reviews = "".join(
+        f'<div class="review"><span data-rating="5"></span><p>{t}</p>'
+        f'<time datetime="2026-01-0{i + 1}"></time></div>'
+        for i, t in enumerate(texts)
+    )
+    return f'<html><body><section id="reviews">{reviews}</section></body></html>'
+
+
+PAGES = {
+    "https://shop.example/p/trail": _review_page("Terrible, broke after a week", "Awful fit"),
+    "https://shop.example/p/road": _review_page("Great shoes, love them", "Perfect and comfortable"),
+}
+
+
+def test_products_carry_absolute_urls():
+    products = _products_from_html(LISTING, LISTING_URL)
+    assert [p.url for p in products] == list(PAGES)
+    assert products[0]["url"] == "https://shop.example/p/trail"
+
+
+def test_crawled_reviews_change_scoring(monkeypatch):
+    products = _products_from_html(LISTING, LISTING_URL)
+    baseline = analyze_products(products, LISTING_URL, use_cache=False)
+    assert baseline["top_products"][0]["title"] == "Trail Runner"
+
+    # Crawl the reviews; they are filed under the product URL
+    stored = []
+
+    async def fetch(url, *args, **kwargs):
+        return PAGES[url]
+
+    def save_reviews(product, reviews):
+        stored.extend(
+            {"_id": len(stored) + i, "product": product, "review": r, "first_seen": 0.0}
+            for i, r in enumerate(reviews)
+        )
+
+    monkeypatch.setattr(fetcher, "fetch_html_async", fetch)
+    monkeypatch.setattr(pipeline, "save_reviews", save_reviews)
+    monkeypatch.setattr(config, "MONGO_WRITE_BEHIND", False)
+    summary = asyncio.run(pipeline.crawl_and_save_reviews([p.url for p in products], max_pages=1))
+    assert summary["reviews"] == 4
+
+    # Fold them into features, then look them up for the listing's products
+    features = {}
+    state = review_features.FeatureState(hash_bits=10)
+    review_features.apply([review_features._row(d) for d in stored], features, state)
+    docs = {key: f.to_doc(state.idf()) for key, f in features.items()}
+    monkeypatch.setattr(
+        mongo_db, "load_review_features",
+        lambda keys, fields=None: [docs[k] for k in keys if k in docs],
+    )
+    review_features._cache.clear()
+    found = review_features.lookup(products)
+    assert set(found) == set(PAGES)
+
+    scored = analyze_products(products, LISTING_URL, use_cache=False, review_features=found)
+    top = scored["top_products"][0]
+    assert top["title"] == "Road Runner"
+    assert top["review_features"]["sentiment"] > 0
+
+
+def test_feature_state_saves_only_changed_blocks():
+    state = review_features.FeatureState(hash_bits=14)
+    row = (1, "https://shop.example/p/road", "great comfortable shoes", 0.0, 5.0)
+    review_features.apply([row], {}, state)
+    blocks = state.df_blocks()
+    assert 0 < len(blocks) < len(state.df) >> state.block_bits
+
+    state.dirty.clear()
+    restored = review_features.FeatureState.from_doc(state.to_doc(), blocks)
+    assert (restored.df == state.df).all()
+    assert restored.reviews == 1 and not restored.dirty
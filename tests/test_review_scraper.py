@@ -0,0 +1,20 @@
+import pytest
+
+from backend.scraper.review_scraper import extract_reviews
+
+
+def _page(rating_el):
+    return f'<html><body><div class="review">{rating_el}<p>Fits well</p></div></body></html>'
+
+
+@pytest.mark.parametrize("rating_el, rating", [
+    ('<span class="rating" aria-label="4.5 out of 5 stars"></span>', 4.5),
+    ('<span class="rating">8/10</span>', 4.0),
+    ('<span class="rating" aria-label="4 of 12 people found this helpful"></span>', None),
+    ('<span class="rating">3 / 12</span>', None),
+    ('<span data-rating="4"></span>', 4.0),
+])
+def test_rating_needs_a_plausible_scale(rating_el, rating):
+    [review], _ = extract_reviews(_page(rating_el), "https://shop.example/p/a")
+    assert review["rating"] == rating
+    assert review["text"] == "Fits well"
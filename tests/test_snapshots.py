@@ -0,0 +1,58 @@
+from backend.database import mongo_db, snapshots
+
+URL = "https://shop.example/c/shoes"
+
+
+def _docs(*products):
+    return mongo_db._product_docs(
+        {"source_url": URL, "title": title, "price": price, "rating": "4.0"}
+        for title, price in products
+    )
+
+
+def _kinds(records):
+    return sorted(r["_kind"] for r in records)
+
+
+def test_first_scrape_writes_everything():
+    records, snapshot = snapshots.diff(URL, None, _docs(("A", "$10"), ("B", "$20")), 1.0)
+    assert _kinds(records) == ["price", "price", "product", "product"]
+    assert set(snapshot) == {"title:a", "title:b"}
+
+
+def test_unchanged_products_write_nothing():
+    docs = _docs(("A", "$10"))
+    _, snapshot = snapshots.diff(URL, None, docs, 1.0)
+    records, again = snapshots.diff(URL, snapshot, _docs(("A", "$10")), 2.0)
+    assert records == []
+    assert again == snapshot
+
+
+def test_price_change_adds_a_price_point():
+    _, snapshot = snapshots.diff(URL, None, _docs(("A", "$10")), 1.0)
+    records, _ = snapshots.diff(URL, snapshot, _docs(("A", "$12")), 2.0)
+    assert _kinds(records) == ["price", "product"]
+    point = next(r for r in records if r["_kind"] == "price")
+    assert point["price"] == 12.0
+    assert point["meta"] == {"source_url": URL, "product_key": "title:a"}
+
+
+def test_only_complete_scrapes_remove_products():
+    _, snapshot = snapshots.diff(URL, None, _docs(("A", "$10"), ("B", "$20")), 1.0)
+
+    records, partial = snapshots.diff(URL, snapshot, _docs(("A", "$10")), 2.0)
+    assert records == []
+    assert set(partial) == {"title:a", "title:b"}
+
+    records, complete = snapshots.diff(URL, snapshot, _docs(("A", "$10")), 3.0, complete=True)
+    assert records == [
+        {"_kind": "removed", "source_url": URL, "product_key": "title:b", "removed_at": 3.0}
+    ]
+    assert set(complete) == {"title:a"}
+
+
+def test_fingerprint_tracks_its_own_fields():
+    product = {"title": "A", "price": "$10", "availability": "In stock", "rating": "4", "reviews": "2"}
+    fp = snapshots.fingerprint(product)
+    assert snapshots.fingerprint({**product, "url": "https://shop.example/p/a"}) == fp
+    assert snapshots.fingerprint({**product, "availability": "Sold out"}) != fp